@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measure the false positive rate, size and speed of Bloom filters
+at several target false positive rates.
+
+Usage: # python -m benchmarks.bench_bloom --hashes 1000000 --rates 0.1 0.01 0.001
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+import timeit
+
+from passpwnedcheck.bloom import BloomFilter, bloom_size, build_bloom_filter
+
+# Approximate number of hashes in the full Pwned Passwords corpus.
+CORPUS_HASHES = 10 ** 9
+SAMPLES = 100000
+
+
+def random_digests(count, seed):
+    rng = random.Random(seed)
+    return [rng.getrandbits(160).to_bytes(20, 'big') for _ in range(count)]
+
+def measure(digests, others, rate, path):
+    start = time.perf_counter()
+    size = build_bloom_filter(digests, len(digests), path, rate)
+    build_seconds = time.perf_counter() - start
+
+    with BloomFilter(path) as prefilter:
+        false_positives = sum(map(prefilter.might_contain, others))
+        lookup_seconds = timeit.timeit(lambda: prefilter.might_contain(others[0]), number=SAMPLES)
+        hashes = prefilter.hashes
+
+    full_bits, _ = bloom_size(CORPUS_HASHES, rate)
+
+    return {
+        'target_rate': rate,
+        'observed_rate': false_positives / len(others),
+        'hashes': hashes,
+        'bits_per_hash': size * 8 / len(digests),
+        'build_seconds': build_seconds,
+        'lookup_us': lookup_seconds / SAMPLES * 1e6,
+        'full_corpus_mb': full_bits / 8 / 2 ** 20
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark Bloom filters of random hashes.')
+    parser.add_argument('--hashes', type=int, default=1000000, help='Number of hashes in the filter')
+    parser.add_argument('--samples', type=int, default=SAMPLES, help='Number of other hashes looked up')
+    parser.add_argument('--rates', type=float, nargs='+', default=[0.1, 0.01, 0.001])
+    args = parser.parse_args()
+
+    digests = random_digests(args.hashes, 0)
+    others = random_digests(args.samples, 1)
+
+    header = '{:>10}{:>12}{:>8}{:>12}{:>10}{:>12}{:>16}'
+    row = '{:>10}{:>12.5f}{:>8}{:>12.2f}{:>10.2f}{:>12.2f}{:>16.0f}'
+    print(header.format('target', 'observed', 'hashes', 'bits/hash', 'build s', 'lookup us', 'full corpus MB'))
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for rate in args.rates:
+            r = measure(digests, others, rate, os.path.join(tmp_dir, 'bench.bloom'))
+            print(row.format(r['target_rate'], r['observed_rate'], r['hashes'], r['bits_per_hash'],
+                                r['build_seconds'], r['lookup_us'], r['full_corpus_mb']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Compare the cost of looking up one suffix in a range response.
+
+Usage: # python -m benchmarks.bench_parse
+"""
+
+import random
+import timeit
+import tracemalloc
+
+from passpwnedcheck.ranges import CompactRange
+from passpwnedcheck.utils import find_suffix_count, response_to_dict
+
+RANGE_SIZE = 900
+NUMBER = 2000
+
+
+def make_range(size, seed=0):
+    '''
+    Return a synthetic range response with size sorted lines.
+    '''
+
+    rng = random.Random(seed)
+    suffixes = sorted('{:035X}'.format(rng.getrandbits(140)) for _ in range(size))
+    return '\r\n'.join('{}:{}'.format(suffix, rng.randint(1, 10000)) for suffix in suffixes), suffixes
+
+def measure(func):
+    '''
+    Return time per call in microseconds and peak memory allocated in bytes.
+    '''
+
+    seconds = timeit.timeit(func, number=NUMBER)
+
+    tracemalloc.start()
+    func()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return seconds / NUMBER * 1e6, peak
+
+def main():
+    text, suffixes = make_range(RANGE_SIZE)
+    body = text.encode('ascii')
+    suffix = suffixes[RANGE_SIZE // 2]
+
+    compact_range = CompactRange.from_response(body)
+
+    cases = [
+        ('response_to_dict', lambda: response_to_dict(body.decode('ascii')).get(suffix)),
+        ('find_suffix_count', lambda: find_suffix_count(body, suffix)),
+        ('find_suffix_count (miss)', lambda: find_suffix_count(body, 'F' * 35)),
+        ('CompactRange.from_response', lambda: CompactRange.from_response(body)),
+        ('CompactRange lookup', lambda: compact_range.get(suffix)),
+    ]
+
+    print('{:<30}{:>12}{:>14}'.format('operation', 'us/call', 'peak bytes'))
+    for name, func in cases:
+        micros, peak = measure(func)
+        print('{:<30}{:>12.2f}{:>14}'.format(name, micros, peak))
+
+    # Memory held by a cached range.
+    tracemalloc.start()
+    response_dict = response_to_dict(text)
+    dict_bytes, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    print()
+    print('{:<30}{:>14}'.format('cached range', 'bytes'))
+    print('{:<30}{:>14}'.format('dict', dict_bytes))
+    print('{:<30}{:>14}'.format('CompactRange', compact_range.nbytes()))
+
+
+if __name__ == '__main__':
+    main()
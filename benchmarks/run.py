@@ -0,0 +1,201 @@
+# -*- coding: utf-8 -*-
+
+"""
+Measure throughput, latency, CPU and memory of the checkers
+against a local stub server.
+
+Usage: # python -m benchmarks.run --passwords 2000 --concurrency 1 10 50 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import multiprocessing
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+from unittest import mock
+
+import aiohttp
+
+from benchmarks.stub_server import StubServer
+from passpwnedcheck import cli, pass_checker
+from passpwnedcheck.pass_checker import PassChecker
+from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from passpwnedcheck.rate_control import AdaptiveRateController
+
+
+def make_passwords(count):
+    return ['benchmark-password-{}'.format(i) for i in range(count)]
+
+def percentile(values, percent):
+    if not values:
+        return float('nan')
+
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+def timed(func, latencies):
+    '''
+    Wrap a range fetch so that the latency of each call is recorded.
+    '''
+
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+def timed_async(func, latencies):
+    async def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            latencies.append(time.perf_counter() - start)
+
+    return wrapper
+
+def isolated(bench, *args):
+    '''
+    Run a benchmark in a fresh process, so that the peak memory
+    it reports is not inherited from the scenarios run before it.
+    '''
+
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+        return executor.submit(bench, *args).result()
+
+def measure(name, concurrency, count, run):
+    '''
+    Run a scenario and return its metrics. run takes a list
+    in which it records the latency of each range fetch.
+    Peak memory is only meaningful when run through isolated.
+    '''
+
+    latencies = []
+    wall_start = time.perf_counter()
+    cpu_start = time.process_time()
+
+    run(latencies)
+
+    wall = time.perf_counter() - wall_start
+    cpu = time.process_time() - cpu_start
+
+    return {
+        'scenario': name,
+        'concurrency': concurrency,
+        'operations': count,
+        'seconds': wall,
+        'throughput': count / wall,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p99_ms': percentile(latencies, 99) * 1000,
+        'cpu_seconds': cpu,
+        'max_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    }
+
+def bench_sync_single(url, passwords):
+    def run(latencies):
+        with PassChecker(url=url) as pc:
+            pc._fetch_range = timed(pc._fetch_range, latencies)
+            for password in passwords:
+                pc.is_password_compromised(password)
+
+    return measure('PassChecker.is_password_compromised', 1, len(passwords), run)
+
+def bench_sync_bulk(url, passwords, concurrency):
+    def run(latencies):
+        with PassChecker(url=url, pool_size=concurrency) as pc:
+            pc._fetch_range = timed(pc._fetch_range, latencies)
+            pc.is_passwords_compromised(passwords, max_workers=concurrency)
+
+    return measure('PassChecker.is_passwords_compromised', concurrency, len(passwords), run)
+
+def bench_async_bulk(url, passwords, concurrency, retry):
+    async def check(latencies):
+        # Errors are only retried by the async checker when it has a rate controller.
+        controller = AdaptiveRateController(max_concurrency=concurrency, initial_concurrency=concurrency) \
+                        if retry else None
+
+        connector = aiohttp.TCPConnector(limit=concurrency)
+        async with aiohttp.ClientSession(connector=connector) as session:
+            pc = PassCheckerAsync(session, rate_controller=controller, url=url)
+            pc._fetch_range = timed_async(pc._fetch_range, latencies)
+            await pc.is_passwords_compromised(passwords, batch_size=concurrency)
+
+    return measure('PassCheckerAsync.is_passwords_compromised', concurrency, len(passwords),
+                    lambda latencies: asyncio.run(check(latencies)))
+
+def bench_cli(url, passwords):
+    def run(latencies):
+        with mock.patch.object(pass_checker, 'PassChecker', partial(PassChecker, url=url)), \
+                contextlib.redirect_stdout(io.StringIO()):
+            for password in passwords:
+                with mock.patch.object(sys, 'argv', ['pass_checker.py', password]):
+                    timed(pass_checker.main, latencies)()
+
+    return measure('pass_checker.main', 1, len(passwords), run)
+
+def bench_cli_batch(url, passwords, concurrency):
+    def run(latencies):
+        with tempfile.NamedTemporaryFile('w', suffix='.txt') as source:
+            source.write('\n'.join(passwords))
+            source.flush()
+
+            get_range = timed_async(PassCheckerAsync.get_range, latencies)
+            with mock.patch.object(PassCheckerAsync, 'get_range', get_range), \
+                    contextlib.redirect_stdout(io.StringIO()):
+                cli.main([source.name, '--url', url, '--concurrency', str(concurrency), '--quiet'])
+
+    return measure('python -m passpwnedcheck', concurrency, len(passwords), run)
+
+def print_results(results):
+    header = '{:<44}{:>6}{:>8}{:>10}{:>10}{:>10}{:>9}{:>9}'
+    row = '{:<44}{:>6}{:>8}{:>10.1f}{:>10.2f}{:>10.2f}{:>9.2f}{:>9.1f}'
+
+    print(header.format('scenario', 'conc', 'ops', 'ops/s', 'p50 ms', 'p99 ms', 'cpu s', 'rss MB'))
+    for r in results:
+        print(row.format(r['scenario'], r['concurrency'], r['operations'], r['throughput'],
+                            r['p50_ms'], r['p99_ms'], r['cpu_seconds'], r['max_rss_mb']))
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark passpwnedcheck against a local stub server.')
+    parser.add_argument('--passwords', type=int, default=1000, help='Number of passwords for bulk scenarios')
+    parser.add_argument('--single', type=int, default=200, help='Number of passwords for one-by-one scenarios')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50])
+    parser.add_argument('--latency', type=float, default=0.02, help='Stub server latency in seconds')
+    parser.add_argument('--jitter', type=float, default=0.01, help='Stub server jitter in seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='Fraction of 503 responses')
+    parser.add_argument('--json', help='Also write results to this file, to compare runs')
+    args = parser.parse_args()
+
+    passwords = make_passwords(args.passwords)
+    single = make_passwords(args.single)
+    results = []
+
+    with StubServer(args.latency, args.jitter, args.error_rate, seed=0) as server:
+        results.append(isolated(bench_sync_single, server.url, single))
+        results.append(isolated(bench_cli, server.url, single))
+
+        for concurrency in args.concurrency:
+            results.append(isolated(bench_sync_bulk, server.url, passwords, concurrency))
+            results.append(isolated(bench_async_bulk, server.url, passwords, concurrency, args.error_rate > 0))
+            results.append(isolated(bench_cli_batch, server.url, passwords, concurrency))
+
+    print_results(results)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
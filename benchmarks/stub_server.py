@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+
+"""
+Local stub of the Pwned Passwords range API, serving synthetic ranges
+with configurable latency, jitter and error rate.
+
+Usage: # python -m benchmarks.stub_server --port 8080 --latency 0.02
+"""
+
+import argparse
+import asyncio
+import multiprocessing
+import random
+import socket
+import time
+from functools import lru_cache
+
+from aiohttp import web
+
+MIN_RANGE_SIZE = 800
+MAX_RANGE_SIZE = 1000
+
+
+@lru_cache(maxsize=4096)
+def make_range(prefix):
+    '''
+    Return a synthetic range for prefix, in bytes.
+    The same prefix always gets the same range.
+    '''
+
+    rng = random.Random(prefix)
+    size = rng.randint(MIN_RANGE_SIZE, MAX_RANGE_SIZE)
+    suffixes = sorted('{:035X}'.format(rng.getrandbits(140)) for _ in range(size))
+    lines = ('{}:{}'.format(suffix, rng.randint(1, 10000)) for suffix in suffixes)
+
+    return '\r\n'.join(lines).encode('ascii')
+
+def create_app(latency=0, jitter=0, error_rate=0, seed=None):
+    '''
+    Create an application serving /range/{prefix}.
+
+    Each response is delayed by latency seconds, plus or minus up to
+    jitter seconds. A fraction error_rate of responses are 503 errors.
+    '''
+
+    rng = random.Random(seed)
+
+    async def handle(request):
+        delay = latency + rng.uniform(-jitter, jitter)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        if rng.random() < error_rate:
+            return web.Response(status=503, text='Service Unavailable')
+
+        return web.Response(body=make_range(request.match_info['prefix'].upper()),
+                                content_type='text/plain')
+
+    app = web.Application()
+    app.router.add_get('/range/{prefix}', handle)
+    return app
+
+
+class StubServer:
+    '''
+    Run the stub server in a separate process, so that its CPU
+    and memory are not counted against the code being measured.
+
+    Usage:
+    with StubServer(latency=0.02) as server:
+        pass_checker = PassChecker(url=server.url)
+    '''
+
+    def __init__(self, latency=0, jitter=0, error_rate=0, seed=None):
+        self._options = dict(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed)
+        self._process = None
+        self.port = None
+
+    @property
+    def url(self):
+        return 'http://127.0.0.1:{}/range/'.format(self.port)
+
+    def __enter__(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            self.port = sock.getsockname()[1]
+
+        self._process = multiprocessing.Process(target=_serve, args=(self.port, self._options), daemon=True)
+        self._process.start()
+        _wait_for_port(self.port)
+        return self
+
+    def __exit__(self, *err):
+        self._process.terminate()
+        self._process.join()
+
+def _serve(port, options):
+    web.run_app(create_app(**options), host='127.0.0.1', port=port, print=None)
+
+def _wait_for_port(port, timeout=10):
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=1).close()
+            return
+        except OSError:
+            if time.monotonic() > deadline:
+                raise
+            time.sleep(0.05)
+
+def main():
+    parser = argparse.ArgumentParser(description='Stub of the Pwned Passwords range API.')
+    parser.add_argument('--port', type=int, default=8080)
+    parser.add_argument('--latency', type=float, default=0)
+    parser.add_argument('--jitter', type=float, default=0)
+    parser.add_argument('--error-rate', type=float, default=0)
+    args = parser.parse_args()
+
+    web.run_app(create_app(args.latency, args.jitter, args.error_rate), host='127.0.0.1', port=args.port)
+
+
+if __name__ == '__main__':
+    main()
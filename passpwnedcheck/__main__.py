@@ -0,0 +1,11 @@
+# -*- coding: utf-8 -*-
+
+"""
+Run batch mode with: # python -m passpwnedcheck
+"""
+
+import sys
+
+from passpwnedcheck.cli import main
+
+sys.exit(main())
@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module audits large numbers of records at once,
+using a sort-merge join against the corpus.
+"""
+
+import itertools
+from operator import itemgetter
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.utils import ExternalSorter, get_hash_digest, get_password_digest
+
+
+def audit(records, source, is_hash=False, chunk_size=constants.AUDIT_CHUNK_SIZE):
+    '''
+    Find which records have been compromised.
+
+    records is an iterable of (record_id, value) pairs, where value is
+    either a password or, if is_hash is True, a SHA-1 hash in hex.
+    source is either a LocalCorpus, or a PassChecker to fetch ranges from.
+
+    Records are hashed and sorted by hash, then joined with the corpus
+    in a single ordered pass. At most chunk_size records are kept in memory,
+    larger inputs are sorted in chunks on disk and merged.
+
+    Yield (record_id, count) for every compromised record, in hash order.
+    '''
+
+    hashed = ((_to_digest(value, is_hash), record_id) for record_id, value in records)
+
+    # Records sharing a hash must not be compared by record_id, which may not be comparable.
+    with ExternalSorter(chunk_size, key=itemgetter(0)) as sorter:
+        sorted_records = sorter.sort(hashed)
+
+        if isinstance(source, LocalCorpus):
+            yield from _join_corpus(sorted_records, source)
+        else:
+            yield from _join_ranges(sorted_records, source)
+
+def _to_digest(value, is_hash):
+    return get_hash_digest(value) if is_hash else get_password_digest(value)
+
+def _join_corpus(sorted_records, corpus):
+    '''
+    Merge sorted records with the local corpus. The search for each hash
+    starts where the previous one stopped, so the corpus is read in order.
+    '''
+
+    index = 0
+    for digest, record_id in sorted_records:
+        index, count = corpus.search(digest, index)
+        if count:
+            yield record_id, count
+
+def _join_ranges(sorted_records, pass_checker):
+    '''
+    Merge sorted records with ranges fetched in prefix order.
+    Each prefix is fetched once, for all records sharing it.
+    '''
+
+    def prefix_of(record):
+        return record[0].hex()[:5].upper()
+
+    for prefix, group in itertools.groupby(sorted_records, key=prefix_of):
+        prefix_range = pass_checker.get_range(prefix)
+
+        for digest, record_id in group:
+            count = prefix_range.get(digest.hex()[5:].upper())
+            if count:
+                yield record_id, count
+
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module builds a Bloom filter of the corpus, which answers
+"definitely not compromised" without any remote call or corpus lookup.
+Building is much faster with NumPy: pip install passpwnedcheck[numpy]
+"""
+
+import itertools
+import math
+import mmap
+import os
+import tempfile
+
+import passpwnedcheck.constants as constants
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+_MASK = (1 << 64) - 1
+
+
+def bloom_size(count, false_positive_rate=constants.BLOOM_FALSE_POSITIVE_RATE):
+    '''
+    Return the number of bits and hashes of a Bloom filter
+    holding count hashes with the given false positive rate.
+    Each hash takes -log2(rate) / ln(2) bits, about 9.6 bits at 1%.
+    '''
+
+    if not 0 < false_positive_rate < 1:
+        raise ValueError(constants.BLOOM_RATE_ERROR_MSG)
+
+    bits = max(8, math.ceil(-max(count, 1) * math.log(false_positive_rate) / math.log(2) ** 2))
+    hashes = round(bits / max(count, 1) * math.log(2))
+
+    return bits, min(max(hashes, 1), constants.BLOOM_MAX_HASHES)
+
+def build_bloom_filter(digests, count, dest_path, false_positive_rate=constants.BLOOM_FALSE_POSITIVE_RATE):
+    '''
+    Write a Bloom filter of raw 20-byte SHA-1 hashes into a file
+    which can be opened by BloomFilter.
+
+    count is the number of hashes, or an upper bound of it. Use
+    LocalCorpus.digests and len(corpus), or RangeStore.digests and
+    RangeStore.count_records. Return the size of the filter in bytes.
+    '''
+
+    bits, hashes = bloom_size(count, false_positive_rate)
+    array = bytearray((bits + 7) // 8)
+    add = _add_numpy if np is not None else _add
+
+    digests = iter(digests)
+    while True:
+        chunk = list(itertools.islice(digests, constants.BLOOM_CHUNK_SIZE))
+        if not chunk:
+            break
+        add(array, chunk, bits, hashes)
+
+    dest_dir = os.path.dirname(os.path.abspath(dest_path))
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir)
+
+    try:
+        with os.fdopen(fd, 'wb') as dest:
+            dest.write(constants.BLOOM_MAGIC)
+            dest.write(constants.BLOOM_HEADER_STRUCT.pack(bits, hashes))
+            dest.write(array)
+
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return len(array)
+
+def _indexes(digest, bits, hashes):
+    '''
+    Yield the bits of a hash, using double hashing. SHA-1 hashes
+    are already uniformly distributed, so their bytes are used directly.
+    '''
+
+    first = int.from_bytes(digest[:8], 'big')
+    step = int.from_bytes(digest[8:16], 'big') | 1
+
+    for i in range(hashes):
+        yield ((first + i * step) & _MASK) % bits
+
+def _add(array, digests, bits, hashes):
+    for digest in digests:
+        for index in _indexes(digest, bits, hashes):
+            array[index >> 3] |= 1 << (index & 7)
+
+def _add_numpy(array, digests, bits, hashes):
+    words = np.frombuffer(b''.join(digests), dtype=np.uint8).reshape(-1, constants.DIGEST_SIZE)
+    words = np.ascontiguousarray(words[:, :16]).view('>u8').astype(np.uint64)
+    first = words[:, 0]
+    step = words[:, 1] | np.uint64(1)
+    target = np.frombuffer(array, dtype=np.uint8)
+
+    for i in range(hashes):
+        # Overflow wraps around 2**64, like _MASK in _indexes.
+        indexes = (first + np.uint64(i) * step) % np.uint64(bits)
+        masks = np.left_shift(np.uint8(1), (indexes & np.uint64(7)).astype(np.uint8))
+        np.bitwise_or.at(target, indexes >> np.uint64(3), masks)
+
+
+class BloomFilter:
+    '''
+    Memory-mapped Bloom filter created by build_bloom_filter.
+
+    might_contain never returns False for a hash in the corpus,
+    and returns True for other hashes at about the false positive rate
+    chosen when building the filter.
+
+    Usage:
+    with BloomFilter('pwned.bloom') as prefilter:
+        pass_checker = PassChecker(prefilter=prefilter)
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        header_size = len(constants.BLOOM_MAGIC) + constants.BLOOM_HEADER_STRUCT.size
+        if len(self._mmap) < header_size or self._mmap[:len(constants.BLOOM_MAGIC)] != constants.BLOOM_MAGIC:
+            self._mmap.close()
+            raise ValueError(constants.BLOOM_FORMAT_ERROR_MSG + str(path))
+
+        self.bits, self.hashes = constants.BLOOM_HEADER_STRUCT.unpack_from(self._mmap, len(constants.BLOOM_MAGIC))
+        if len(self._mmap) != header_size + (self.bits + 7) // 8:
+            self._mmap.close()
+            raise ValueError(constants.BLOOM_FORMAT_ERROR_MSG + str(path))
+
+        self._offset = header_size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def might_contain(self, digest):
+        '''
+        Return False if a raw 20-byte SHA-1 hash is definitely not in the corpus.
+        '''
+
+        for index in _indexes(digest, self.bits, self.hashes):
+            if not self._mmap[self._offset + (index >> 3)] >> (index & 7) & 1:
+                return False
+
+        return True
+
+    def split_groups(self, groups):
+        '''
+        Split prefix groups created by group_by_prefix into the groups
+        which might be in the corpus, and a dictionary of keys which
+        are definitely not in it, with a count of 0.
+        '''
+
+        candidates = {}
+        misses = {}
+
+        for prefix, group in groups.items():
+            kept = []
+            for key, suffix in group:
+                if self.might_contain(bytes.fromhex(prefix + suffix)):
+                    kept.append((key, suffix))
+                else:
+                    misses[key] = 0
+
+            if kept:
+                candidates[prefix] = kept
+
+        return candidates, misses
@@ -0,0 +1,379 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module caches range responses so that the same prefix
+is not sent to pwnedpasswords API over and over again.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.ranges import CompactRange, RawRange
+from passpwnedcheck.utils import dict_to_response
+
+# zlib streams always start with this byte, range responses never do.
+_ZLIB_HEADER = b'x'
+
+
+class CacheBackend(ABC):
+    '''
+    Interface of range caches used by PassChecker and PassCheckerAsync.
+
+    Subclasses must implement get and set. get_many looks up one prefix at a time
+    by default, backends which can fetch several keys in one round trip
+    should override it, as batch calls use it.
+    '''
+
+    @abstractmethod
+    def get(self, prefix):
+        '''
+        Return the cached range of a prefix, or None if it is missing or expired.
+        '''
+
+    @abstractmethod
+    def set(self, prefix, value):
+        '''
+        Store the range of a prefix.
+        '''
+
+    def get_many(self, prefixes):
+        '''
+        Return a dictionary of the cached ranges of prefixes.
+        Missing or expired prefixes are left out.
+        '''
+
+        ranges = {}
+        for prefix in prefixes:
+            value = self.get(prefix)
+            if value is not None:
+                ranges[prefix] = value
+
+        return ranges
+
+
+class AsyncCacheBackend(ABC):
+    '''
+    Same as CacheBackend, for backends which are accessed asynchronously.
+    Only PassCheckerAsync can use them.
+    '''
+
+    @abstractmethod
+    async def get(self, prefix):
+        pass
+
+    @abstractmethod
+    async def set(self, prefix, value):
+        pass
+
+    async def get_many(self, prefixes):
+        ranges = {}
+        for prefix in prefixes:
+            value = await self.get(prefix)
+            if value is not None:
+                ranges[prefix] = value
+
+        return ranges
+
+
+class RangeCache(CacheBackend):
+    '''
+    In-memory cache of range responses, keyed by password prefix.
+
+    Entries expire after ttl seconds (never if ttl is None).
+    When the cache holds more than max_size entries,
+    the least recently used entry is evicted.
+
+    The same cache can be shared by PassChecker and PassCheckerAsync,
+    and is safe to use from multiple threads.
+
+    Usage:
+    cache = RangeCache(max_size=1000, ttl=600)
+    pass_checker = PassChecker(cache=cache)
+    '''
+
+    def __init__(self, max_size=constants.CACHE_MAX_SIZE, ttl=constants.CACHE_TTL, clock=time.monotonic):
+        if max_size < 1:
+            raise ValueError(constants.CACHE_SIZE_ERROR_MSG)
+
+        self._max_size = max_size
+        self._ttl = ttl
+        self._clock = clock
+        self._ranges = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._ranges)
+
+    def get(self, prefix):
+        '''
+        Return the cached range of a prefix, or None if it is missing or expired.
+        '''
+
+        with self._lock:
+            entry = self._ranges.get(prefix)
+
+            if entry is not None:
+                value, expires = entry
+
+                if expires is None or expires > self._clock():
+                    self._ranges.move_to_end(prefix)
+                    self.hits += 1
+                    return value
+
+                del self._ranges[prefix]
+
+            self.misses += 1
+            return None
+
+    def set(self, prefix, value):
+        '''
+        Store the range of a prefix, evicting the least recently used entry if needed.
+        '''
+
+        expires = None if self._ttl is None else self._clock() + self._ttl
+
+        with self._lock:
+            self._ranges[prefix] = (value, expires)
+            self._ranges.move_to_end(prefix)
+
+            while len(self._ranges) > self._max_size:
+                self._ranges.popitem(last=False)
+
+    def clear(self):
+        '''
+        Remove all entries and reset hit/miss counters.
+        '''
+
+        with self._lock:
+            self._ranges.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+class DiskRangeCache(CacheBackend):
+    '''
+    Persistent cache of range responses stored in a SQLite file.
+
+    Ranges are compressed with zlib and are considered fresh for ttl seconds
+    (forever if ttl is None). The file survives process restarts and can be
+    shared by several processes on the same host, so that each range only
+    needs to be fetched once per host.
+
+    Usage:
+    cache = DiskRangeCache('/var/cache/passpwnedcheck.db', ttl=86400)
+    pass_checker = PassChecker(cache=cache)
+    '''
+
+    def __init__(self, path, ttl=constants.DISK_CACHE_TTL, clock=time.time):
+        self._path = path
+        self._ttl = ttl
+        self._clock = clock
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+
+        with self._connect() as conn:
+            conn.execute(constants.DISK_CACHE_CREATE_SQL)
+
+    def __len__(self):
+        return self._connect().execute('SELECT COUNT(*) FROM ranges').fetchone()[0]
+
+    def get(self, prefix):
+        '''
+        Return the cached range of a prefix, or None if it is missing or expired.
+        '''
+
+        row = self._connect().execute(
+            'SELECT body, fetched_at FROM ranges WHERE prefix = ?', (prefix,)).fetchone()
+
+        if row is not None:
+            body, fetched_at = row
+
+            if self._ttl is None or fetched_at + self._ttl > self._clock():
+                self.hits += 1
+                return decode_range(body)
+
+        self.misses += 1
+        return None
+
+    def get_many(self, prefixes):
+        '''
+        Return a dictionary of the cached ranges of prefixes,
+        looking up up to DISK_CACHE_BATCH_SIZE prefixes per query.
+        '''
+
+        prefixes = list(prefixes)
+        ranges = {}
+        conn = self._connect()
+
+        for start in range(0, len(prefixes), constants.DISK_CACHE_BATCH_SIZE):
+            batch = prefixes[start:start+constants.DISK_CACHE_BATCH_SIZE]
+            query = 'SELECT prefix, body, fetched_at FROM ranges WHERE prefix IN ({})'.format(
+                        ', '.join('?' * len(batch)))
+
+            for prefix, body, fetched_at in conn.execute(query, batch):
+                if self._ttl is None or fetched_at + self._ttl > self._clock():
+                    ranges[prefix] = decode_range(body)
+
+        self.hits += len(ranges)
+        self.misses += len(prefixes) - len(ranges)
+
+        return ranges
+
+    def set(self, prefix, value):
+        '''
+        Store the range of a prefix, replacing any previous entry.
+        '''
+
+        body = encode_range(value)
+
+        with self._connect() as conn:
+            conn.execute('INSERT OR REPLACE INTO ranges VALUES (?, ?, ?)',
+                            (prefix, body, self._clock()))
+
+    def clear(self):
+        '''
+        Remove all entries and reset hit/miss counters.
+        '''
+
+        with self._connect() as conn:
+            conn.execute('DELETE FROM ranges')
+
+        self.hits = 0
+        self.misses = 0
+
+    def close(self):
+        '''
+        Close the connection opened by the current thread.
+        '''
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _connect(self):
+        '''
+        Return the connection of the current thread and process.
+
+        SQLite connections cannot be shared between threads,
+        nor survive a fork, so each one gets its own.
+        '''
+
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self._path, timeout=constants.DISK_CACHE_TIMEOUT)
+            conn.execute('PRAGMA journal_mode=WAL')
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+
+        return conn
+
+
+class RedisRangeCache(CacheBackend):
+    '''
+    Cache of range responses in a networked key-value store such as Redis,
+    shared by every host running a checker.
+
+    client can be a redis.Redis, or any client with get, mget and
+    set(key, value, ex=seconds). Ranges are compressed with zlib unless
+    compress is False, and expire after ttl seconds (never if ttl is None).
+    Batch calls look up all their prefixes with one MGET.
+
+    Usage:
+    cache = RedisRangeCache(redis.Redis(host='cache.internal'), ttl=86400)
+    pass_checker = PassChecker(cache=cache)
+    '''
+
+    def __init__(self, client, ttl=constants.SHARED_CACHE_TTL, compress=True,
+                    key_prefix=constants.SHARED_CACHE_KEY_PREFIX):
+        self._client = client
+        self._ttl = ttl
+        self._compress = compress
+        self._key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, prefix):
+        return self.get_many([prefix]).get(prefix)
+
+    def get_many(self, prefixes):
+        prefixes = list(prefixes)
+        if not prefixes:
+            return {}
+
+        bodies = self._client.mget([self._key_prefix + prefix for prefix in prefixes])
+        return _collect(self, prefixes, bodies)
+
+    def set(self, prefix, value):
+        self._client.set(self._key_prefix + prefix, encode_range(value, self._compress), ex=self._ttl)
+
+
+class AsyncRedisRangeCache(AsyncCacheBackend):
+    '''
+    Same as RedisRangeCache, with an asynchronous client such as
+    redis.asyncio.Redis. Only PassCheckerAsync can use it.
+    '''
+
+    def __init__(self, client, ttl=constants.SHARED_CACHE_TTL, compress=True,
+                    key_prefix=constants.SHARED_CACHE_KEY_PREFIX):
+        self._client = client
+        self._ttl = ttl
+        self._compress = compress
+        self._key_prefix = key_prefix
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, prefix):
+        return (await self.get_many([prefix])).get(prefix)
+
+    async def get_many(self, prefixes):
+        prefixes = list(prefixes)
+        if not prefixes:
+            return {}
+
+        bodies = await self._client.mget([self._key_prefix + prefix for prefix in prefixes])
+        return _collect(self, prefixes, bodies)
+
+    async def set(self, prefix, value):
+        await self._client.set(self._key_prefix + prefix, encode_range(value, self._compress), ex=self._ttl)
+
+
+def encode_range(value, compress=True):
+    '''
+    Convert a range into bytes in the format of the API,
+    compressed with zlib unless compress is False.
+    A RawRange is already in that format, and is used as is.
+    '''
+
+    if isinstance(value, RawRange):
+        body = value.body
+    else:
+        body = dict_to_response(value).encode('ascii')
+    return zlib.compress(body) if compress else body
+
+def decode_range(body):
+    '''
+    Convert bytes created by encode_range back into a CompactRange.
+    '''
+
+    if body[:1] == _ZLIB_HEADER:
+        body = zlib.decompress(body)
+
+    return CompactRange.from_response(body)
+
+def _collect(cache, prefixes, bodies):
+    ranges = {prefix: decode_range(body) for prefix, body in zip(prefixes, bodies) if body is not None}
+
+    cache.hits += len(ranges)
+    cache.misses += len(prefixes) - len(ranges)
+
+    return ranges
@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module checks passwords or SHA-1 hashes in bulk from the command line.
+Input is read from a file or stdin, one value per line,
+so that passwords never appear in the shell history or process list.
+
+Usage: # python -m passpwnedcheck passwords.txt --format jsonl --concurrency 50 > results.jsonl
+"""
+
+import argparse
+import asyncio
+import csv
+import itertools
+import json
+import sys
+import time
+
+import aiohttp
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.bloom import BloomFilter
+from passpwnedcheck.cache import DiskRangeCache
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from passpwnedcheck.pass_checker_offline import PassCheckerOffline
+from passpwnedcheck.rate_control import AdaptiveRateController
+from passpwnedcheck.scheduler import iter_bounded
+from passpwnedcheck.session_manager import SessionManager
+from passpwnedcheck.utils import get_hash_prefix_suffix, get_password_prefix_suffix, group_by_prefix
+
+
+class Progress:
+    '''
+    Show how many values were checked and how fast, on one line
+    which is rewritten at most once every interval seconds.
+    '''
+
+    def __init__(self, stream, interval=constants.PROGRESS_INTERVAL, clock=time.monotonic):
+        self._stream = stream
+        self._interval = interval
+        self._clock = clock
+        self._start = self._last = clock()
+        self.checked = 0
+        self.compromised = 0
+
+    def update(self, count):
+        self.checked += 1
+        if count > 0:
+            self.compromised += 1
+
+        now = self._clock()
+        if now - self._last >= self._interval:
+            self._last = now
+            self._show(now)
+
+    def finish(self):
+        self._show(self._clock())
+        self._stream.write('\n')
+        self._stream.flush()
+
+    def _show(self, now):
+        rate = self.checked / max(now - self._start, 1e-9)
+        self._stream.write(constants.PROGRESS_MSG.format(self.checked, rate, self.compromised))
+        self._stream.flush()
+
+
+def read_hashes(lines, is_hash, on_error):
+    '''
+    Yield (line number, SHA-1 hash in hex) for each non empty line.
+    Passwords are hashed as soon as they are read.
+    Invalid hashes are passed to on_error with their line number and skipped.
+    '''
+
+    for number, line in enumerate(lines, 1):
+        value = line.rstrip('\r\n')
+        if not value:
+            continue
+
+        if not is_hash:
+            prefix, suffix = get_password_prefix_suffix(value)
+        else:
+            try:
+                prefix, suffix = get_hash_prefix_suffix(value)
+            except ValueError as ve:
+                on_error(number, ve)
+                continue
+
+        yield number, prefix + suffix
+
+
+def create_writer(output, format, with_hash=False):
+    '''
+    Return a function writing one result to output,
+    either as a CSV row or as a JSON line.
+
+    The hash is only written if with_hash is True. The unsalted hash
+    of a weak password is easy to reverse, so it is only written back
+    when the input already was hashes.
+    '''
+
+    fields = constants.CLI_FIELDS if with_hash else constants.CLI_PASSWORD_FIELDS
+
+    def row(number, hash, count):
+        return (number, hash, count) if with_hash else (number, count)
+
+    if format == 'jsonl':
+        def write(number, hash, count):
+            output.write(json.dumps(dict(zip(fields, row(number, hash, count)))) + '\n')
+
+        return write
+
+    writer = csv.writer(output, lineterminator='\n')
+    writer.writerow(fields)
+
+    def write(number, hash, count):
+        writer.writerow(row(number, hash, count))
+
+    return write
+
+
+def check_offline(items, corpus_path, on_result):
+    '''
+    Look up each item in a local corpus.
+    '''
+
+    with LocalCorpus(corpus_path) as corpus:
+        pass_checker = PassCheckerOffline(corpus)
+
+        for number, hash in items:
+            on_result(number, hash, pass_checker.is_hash_compromised(hash)[1])
+
+
+async def check_online(items, args, on_result):
+    '''
+    Check items against the API, chunk_size items at a time.
+    Items in a chunk are grouped by prefix so that each prefix is only
+    fetched once, up to args.concurrency prefixes are fetched at once,
+    and throttled requests are retried. Results are passed to on_result
+    as soon as their range is ready, not in input order.
+    Items which args.prefilter rules out are answered without a request.
+    '''
+
+    prefilter = BloomFilter(args.prefilter) if args.prefilter else None
+    cache = DiskRangeCache(args.cache) if args.cache else None
+    controller = AdaptiveRateController(max_concurrency=args.concurrency,
+                                        initial_concurrency=args.concurrency)
+    items = iter(items)
+
+    try:
+        async with SessionManager() as manager:
+            pass_checker = PassCheckerAsync(manager.get_session(), cache=cache,
+                                            rate_controller=controller, url=args.url)
+
+            while True:
+                chunk = list(itertools.islice(items, args.chunk_size))
+                if not chunk:
+                    break
+
+                groups = group_by_prefix(chunk, _split_item)
+                if prefilter is not None:
+                    groups, misses = prefilter.split_groups(groups)
+                    for number, hash in misses:
+                        on_result(number, hash, 0)
+
+                ranges = iter_bounded(pass_checker.get_range, groups, args.concurrency, args.rate_limit)
+
+                async for prefix, prefix_range in ranges:
+                    for (number, hash), suffix in groups[prefix]:
+                        on_result(number, hash, prefix_range.get(suffix, 0))
+    finally:
+        if cache is not None:
+            cache.close()
+        if prefilter is not None:
+            prefilter.close()
+
+
+def _split_item(item):
+    hash = item[1]
+    return hash[:5], hash[5:]
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        prog='python -m passpwnedcheck',
+        description='Check passwords or SHA-1 hashes read from a file or stdin, one per line. '
+                    'Results are written as soon as they are ready, with the input line number.')
+    parser.add_argument('input', nargs='?', default='-', help='Input file, stdin if missing or -')
+    parser.add_argument('-o', '--output', help='Output file, stdout if missing')
+    parser.add_argument('--hashes', action='store_true', help='Input contains SHA-1 hashes in hex instead of passwords')
+    parser.add_argument('--format', choices=constants.CLI_FORMATS, default='csv', help='Output format')
+    parser.add_argument('--concurrency', type=int, default=constants.BATCH_SIZE,
+                        help='Maximum number of requests in flight')
+    parser.add_argument('--chunk-size', type=int, default=constants.CLI_CHUNK_SIZE,
+                        help='Number of values grouped by prefix at a time')
+    parser.add_argument('--rate-limit', type=float, help='Maximum number of requests per second')
+    parser.add_argument('--cache', help='Keep fetched ranges in this SQLite file, to reuse them between runs')
+    parser.add_argument('--corpus', help='Check against this local corpus instead of the API')
+    parser.add_argument('--prefilter', help='Skip requests for values this Bloom filter rules out')
+    parser.add_argument('--url', default=constants.URL, help='Range API url')
+    parser.add_argument('-q', '--quiet', action='store_true', help='Do not show progress')
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    '''
+    Entry point of batch mode. Return the exit status,
+    1 if some lines were skipped or the API could not be reached.
+    '''
+
+    args = parse_args(argv)
+
+    source = sys.stdin if args.input == '-' else open(args.input, encoding='utf-8')
+    output = sys.stdout if args.output is None else open(args.output, 'w', encoding='utf-8', newline='')
+    progress = None if args.quiet else Progress(sys.stderr)
+    skipped = []
+
+    write = create_writer(output, args.format, with_hash=args.hashes)
+
+    def on_error(number, error):
+        skipped.append(number)
+        sys.stderr.write(constants.INPUT_LINE_ERROR_MSG.format(number, error) + '\n')
+
+    def on_result(number, hash, count):
+        write(number, hash, count)
+        if progress is not None:
+            progress.update(count)
+
+    try:
+        items = read_hashes(source, args.hashes, on_error)
+
+        if args.corpus:
+            check_offline(items, args.corpus, on_result)
+        else:
+            asyncio.run(check_online(items, args, on_result))
+
+    except (ConnectionError, aiohttp.ClientError) as ce:
+        sys.stderr.write(constants.CONNECTION_ERROR_MSG + '\n' + str(ce) + '\n')
+        return 1
+
+    finally:
+        if progress is not None:
+            progress.finish()
+        if source is not sys.stdin:
+            source.close()
+        if output is not sys.stdout:
+            output.close()
+
+    return 1 if skipped else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
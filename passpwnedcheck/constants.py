@@ -4,12 +4,106 @@
 Constants for pass_checker.
 """
 
+import struct
+
 # Constants for pass_checker.
 LINE_BREAK = '\r\n'
 DELIMITER = ':'
+DELIMITER_BYTES = b':'
+NEWLINE_BYTE = ord('\n')
 URL = 'https://api.pwnedpasswords.com/range/'
 STATUS_CODE_OK = 200
+STATUS_CODE_NOT_MODIFIED = 304
 BATCH_SIZE = 10
+POOL_SIZE = 10
+RETRIES = 3
+RETRY_BACKOFF_FACTOR = 0.5
+RETRY_STATUS_CODES = (429, 500, 502, 503, 504)
+TIMEOUT = 10
+READ_CHUNK_SIZE = 16384
+
+# Constants for rate_control.
+THROTTLE_STATUS_CODES = (429, 503)
+RATE_MAX_CONCURRENCY = 100
+RATE_DECREASE_FACTOR = 0.5
+RATE_COOLDOWN = 1
+RATE_BACKOFF_MAX = 30
+
+# Constants for deadline.
+HEDGE_MIN_SAMPLES = 20
+HEDGE_WINDOW = 200
+
+# Constants for local_corpus.
+CORPUS_MAGIC = b'PPWNDB01'
+DIGEST_SIZE = 20
+COUNT_STRUCT = struct.Struct('>I')
+RECORD_SIZE = DIGEST_SIZE + COUNT_STRUCT.size
+RECORD_STRUCT = struct.Struct('>{}sI'.format(DIGEST_SIZE))
+CORPUS_SORT_CHUNK_SIZE = 1000000
+
+# Constants for vectorized.
+DIGEST_DTYPE = 'S20'
+RECORD_DTYPE = [('digest', DIGEST_DTYPE), ('count', '>u4')]
+
+# Constants for downloader.
+PREFIX_COUNT = 16 ** 5
+PREFIX_FORMAT = '{:05X}'
+DOWNLOAD_CONCURRENCY = 64
+RANGE_STORE_CREATE_SQL = 'CREATE TABLE IF NOT EXISTS ranges ' + \
+                        '(prefix TEXT PRIMARY KEY, body BLOB NOT NULL, etag TEXT, checked_at REAL NOT NULL)'
+
+# Constants for bloom.
+BLOOM_MAGIC = b'PPWNBF01'
+BLOOM_HEADER_STRUCT = struct.Struct('>QI')
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+BLOOM_CHUNK_SIZE = 1000000
+BLOOM_MAX_HASHES = 32
+
+# Constants for audit.
+AUDIT_CHUNK_SIZE = 1000000
+
+# Constants for parallel.
+PARALLEL_CHUNK_SIZE = 10000
+
+# Constants for ranges.
+SUFFIX_LENGTH = 35
+COMPACT_SUFFIX_SIZE = 18
+COMPACT_COUNT_TYPECODE = 'I'
+
+# Constants for cache.
+CACHE_MAX_SIZE = 10000
+CACHE_TTL = 3600
+DISK_CACHE_TTL = 86400
+DISK_CACHE_TIMEOUT = 30
+DISK_CACHE_BATCH_SIZE = 500
+SHARED_CACHE_TTL = 86400
+SHARED_CACHE_KEY_PREFIX = 'passpwnedcheck:range:'
+DISK_CACHE_CREATE_SQL = 'CREATE TABLE IF NOT EXISTS ranges ' + \
+                        '(prefix TEXT PRIMARY KEY, body BLOB NOT NULL, fetched_at REAL NOT NULL)'
+
+# Constants for instrumentation.
+STAGE_HASH = 'hash'
+STAGE_DNS = 'dns'
+STAGE_CONNECT = 'connect'
+STAGE_WAIT = 'wait'
+STAGE_DOWNLOAD = 'download'
+STAGE_PARSE = 'parse'
+STAGE_LOOKUP = 'lookup'
+
+# Constants for cli.
+CLI_FORMATS = ('csv', 'jsonl')
+CLI_FIELDS = ('line', 'hash', 'count')
+CLI_PASSWORD_FIELDS = ('line', 'count')
+CLI_CHUNK_SIZE = 100000
+PROGRESS_INTERVAL = 0.5
+PROGRESS_MSG = '\rChecked {} ({:.0f}/s), {} compromised'
+
+# Constants for server.
+SERVER_HOST = 'localhost'
+SERVER_PORT = 8080
+STATUS_CODE_BAD_REQUEST = 400
+STATUS_CODE_BAD_GATEWAY = 502
+SERVER_STARTED_MSG = 'Serving ranges on http://{}:{}/range/'
 
 
 # Error messages for pass_checker.
@@ -21,10 +115,25 @@ PASSWORD_NOT_COMPROMISED_MSG = 'Your password has not been compromised (yet)'
 INPUT_FORMAT_ERROR_MSG = 'Input parameter or response text from server was in wrong format'
 CONNECTION_ERROR_MSG = 'An error occurred while connecting to pwn server: '
 UNKNOWN_ERROR_MSG = 'An unknown error occurred while checking password'
+CORPUS_LINE_ERROR_MSG = 'Corpus line must be in the format HASH:COUNT: '
+CORPUS_FORMAT_ERROR_MSG = 'File is not a valid corpus: '
+CACHE_SIZE_ERROR_MSG = 'Cache size must be at least 1'
+DEADLINE_ERROR_MSG = 'Deadline exceeded while checking password'
+HASH_FORMAT_ERROR_MSG = 'Hash must be 40 hex characters: '
+SUFFIX_FORMAT_ERROR_MSG = 'Suffix must be 35 hex characters: '
+DIGEST_ARRAY_ERROR_MSG = 'Hashes must be 20-byte strings or an (n, 20) array of uint8'
+NUMPY_MISSING_ERROR_MSG = 'NumPy is required, install it with: pip install passpwnedcheck[numpy]'
+INPUT_LINE_ERROR_MSG = 'Skipping line {}: {}'
+PREFIX_FORMAT_ERROR_MSG = 'Prefix must be 5 hex characters: '
+BLOOM_FORMAT_ERROR_MSG = 'File is not a valid Bloom filter: '
+BLOOM_RATE_ERROR_MSG = 'False positive rate must be between 0 and 1, exclusive'
+ASYNC_CACHE_ERROR_MSG = 'An asynchronous cache can only be used with PassCheckerAsync: '
 
 # Help message for pass_checker.
 HELP_MSG = '\n' + \
             'Input parameter was incorrect\n' + \
             'Usage: # python pass_checker.py [password]' + \
             '\n' + \
-            'password : (Required) Password you want to check\n'
+            'password : (Required) Password you want to check\n' + \
+            '\n' + \
+            'To check passwords from a file or stdin, use: # python -m passpwnedcheck --help\n'
@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module bounds how long a check can take,
+and decides when to hedge a slow request.
+"""
+
+import math
+from collections import deque
+
+import passpwnedcheck.constants as constants
+
+
+class DeadlinePolicy:
+    '''
+    Time limits for fetching ranges.
+
+      +  timeout: seconds allowed for each request.
+      +  deadline: seconds allowed for fetching a range, including hedged requests
+      and retries. Once it passes, either an empty range is used as if no
+      password was compromised (fail_open), or TimeoutError is raised.
+      +  hedge_percentile: if a request takes longer than this percentile
+      of recent latencies, send a second identical request and use whichever
+      finishes first. Hedging starts after min_samples requests have succeeded.
+
+    Usage:
+    policy = DeadlinePolicy(timeout=2, deadline=3, hedge_percentile=95, fail_open=True)
+    pass_checker = PassCheckerAsync(session, deadline_policy=policy)
+    '''
+
+    def __init__(self, timeout=None, deadline=None, hedge_percentile=None, fail_open=False,
+                    min_samples=constants.HEDGE_MIN_SAMPLES, window=constants.HEDGE_WINDOW):
+        self.timeout = timeout
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.fail_open = fail_open
+        self._min_samples = min_samples
+        self._latencies = deque(maxlen=window)
+
+    def record(self, latency):
+        '''
+        Record the latency in seconds of a successful request.
+        '''
+
+        self._latencies.append(latency)
+
+    def hedge_delay(self):
+        '''
+        Return how long to wait before sending a hedged request,
+        or None if hedging is disabled or there are not enough samples yet.
+        '''
+
+        if self.hedge_percentile is None or len(self._latencies) < self._min_samples:
+            return None
+
+        latencies = sorted(self._latencies)
+        index = math.ceil(self.hedge_percentile / 100 * len(latencies)) - 1
+        return latencies[min(max(index, 0), len(latencies) - 1)]
+
+    def on_deadline(self):
+        '''
+        Return the range to use once the deadline has passed,
+        or raise TimeoutError if the policy is to fail closed.
+        '''
+
+        if self.fail_open:
+            return {}
+
+        raise TimeoutError(constants.DEADLINE_ERROR_MSG)
@@ -0,0 +1,256 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module downloads every range from pwnedpasswords API
+into a local store, which can then be exported as a corpus.
+All remote calls are non-blocking.
+"""
+
+import asyncio
+import itertools
+import os
+import sqlite3
+import tempfile
+import time
+import zlib
+
+import aiohttp
+from requests.compat import urljoin
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.local_corpus import parse_corpus_line
+from passpwnedcheck.rate_control import AdaptiveRateController, parse_retry_after
+from passpwnedcheck.scheduler import iter_bounded
+
+
+def all_prefixes():
+    '''
+    Return a generator of all 1,048,576 prefixes, in order.
+    '''
+
+    return (constants.PREFIX_FORMAT.format(i) for i in range(constants.PREFIX_COUNT))
+
+
+class RangeStore:
+    '''
+    SQLite file holding downloaded ranges and their ETag.
+
+    Each range is committed as soon as it is stored, so the store
+    doubles as a checkpoint for interrupted downloads.
+    '''
+
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, timeout=constants.DISK_CACHE_TIMEOUT)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        with self._conn:
+            self._conn.execute(constants.RANGE_STORE_CREATE_SQL)
+
+    def __len__(self):
+        return self._conn.execute('SELECT COUNT(*) FROM ranges').fetchone()[0]
+
+    def __contains__(self, prefix):
+        return self._conn.execute(
+            'SELECT 1 FROM ranges WHERE prefix = ?', (prefix,)).fetchone() is not None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
+
+    def close(self):
+        self._conn.close()
+
+    def get(self, prefix):
+        '''
+        Return the body of a range in bytes, or None if it is not stored.
+        '''
+
+        row = self._conn.execute('SELECT body FROM ranges WHERE prefix = ?', (prefix,)).fetchone()
+        return None if row is None else zlib.decompress(row[0])
+
+    def get_etag(self, prefix):
+        row = self._conn.execute('SELECT etag FROM ranges WHERE prefix = ?', (prefix,)).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, prefix, body, etag):
+        with self._conn:
+            self._conn.execute('INSERT OR REPLACE INTO ranges VALUES (?, ?, ?, ?)',
+                                (prefix, zlib.compress(body), etag, time.time()))
+
+    def touch(self, prefix):
+        '''
+        Mark a range as checked without changing its body.
+        '''
+
+        with self._conn:
+            self._conn.execute('UPDATE ranges SET checked_at = ? WHERE prefix = ?',
+                                (time.time(), prefix))
+
+    def prefixes(self):
+        return [row[0] for row in self._conn.execute('SELECT prefix FROM ranges ORDER BY prefix')]
+
+    def digests(self):
+        '''
+        Yield the raw 20-byte SHA-1 hash of every stored record, in order.
+        '''
+
+        for prefix, body in self._conn.execute('SELECT prefix, body FROM ranges ORDER BY prefix'):
+            for line in zlib.decompress(body).splitlines():
+                if line:
+                    yield bytes.fromhex(prefix + line.partition(constants.DELIMITER_BYTES)[0].decode('ascii'))
+
+    def count_records(self):
+        '''
+        Return the number of records in all stored ranges.
+        '''
+
+        # Records contain no whitespace, so splitting on it gives one item per record.
+        return sum(len(zlib.decompress(body).split()) for body, in self._conn.execute('SELECT body FROM ranges'))
+
+    def export_corpus(self, dest_path):
+        '''
+        Write every stored range into a binary corpus which can be
+        opened by LocalCorpus. Return the number of records written.
+        '''
+
+        total = 0
+        dest_dir = os.path.dirname(os.path.abspath(dest_path))
+        fd, tmp_path = tempfile.mkstemp(dir=dest_dir)
+
+        try:
+            with os.fdopen(fd, 'wb') as dest:
+                dest.write(constants.CORPUS_MAGIC)
+
+                # Prefixes are in order and each range is sorted,
+                # so records are written in order too.
+                for prefix, body in self._conn.execute('SELECT prefix, body FROM ranges ORDER BY prefix'):
+                    for line in zlib.decompress(body).decode('ascii').splitlines():
+                        if line:
+                            dest.write(parse_corpus_line(prefix + line))
+                            total += 1
+
+            os.replace(tmp_path, dest_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        return total
+
+
+class CorpusDownloader:
+    '''
+    Download ranges from pwnedpasswords API into a RangeStore.
+
+    Throttled and failed requests, and connection errors, are retried
+    with backoff by an AdaptiveRateController, which also adapts the number
+    of requests in flight. By default, it allows up to concurrency requests.
+
+    Usage:
+    async with SessionManager() as manager:
+        with RangeStore('ranges.db') as store:
+            downloader = CorpusDownloader(manager.get_session(), store)
+            await downloader.download()
+            store.export_corpus('pwned.bin')
+    '''
+
+    def __init__(self, session, store, concurrency=constants.DOWNLOAD_CONCURRENCY, url=constants.URL,
+                    rate_controller=None):
+        self._session = session
+        self._store = store
+        self._url = url
+        self._rate_controller = rate_controller if rate_controller is not None else \
+                                    AdaptiveRateController(max_concurrency=concurrency,
+                                                            initial_concurrency=concurrency)
+        self._concurrency = self._rate_controller.max_concurrency
+
+    async def download(self, prefixes=None, callback=None):
+        '''
+        Download every prefix which is not in the store yet.
+        An interrupted download resumes where it stopped.
+
+        If set, callback is called with each prefix once it is stored.
+        Return the number of ranges downloaded.
+        '''
+
+        prefixes = all_prefixes() if prefixes is None else prefixes
+        missing = (prefix for prefix in prefixes if prefix not in self._store)
+
+        return await self._run(missing, callback, False)
+
+    async def refresh(self, prefixes=None, callback=None):
+        '''
+        Download again every stored prefix, using its ETag
+        so that only ranges which have changed are transferred.
+
+        If set, callback is called with each prefix once it is checked.
+        Return the number of ranges which have changed.
+        '''
+
+        prefixes = self._store.prefixes() if prefixes is None else prefixes
+
+        return await self._run(prefixes, callback, True)
+
+    async def _run(self, prefixes, callback, conditional):
+        changed = 0
+
+        async def fetch(prefix):
+            return await self._fetch(prefix, conditional)
+
+        async for prefix, is_changed in iter_bounded(fetch, prefixes, self._concurrency):
+            changed += is_changed
+            if callback is not None:
+                callback(prefix)
+
+        return changed
+
+    async def _fetch(self, prefix, conditional):
+        '''
+        Fetch and store one range, retrying throttled or failed requests
+        with backoff. Return False if it has not changed.
+        '''
+
+        headers = {}
+        etag = self._store.get_etag(prefix) if conditional else None
+        if etag is not None:
+            headers['If-None-Match'] = etag
+
+        controller = self._rate_controller
+
+        for attempt in itertools.count():
+            is_last = attempt >= controller.retries
+            retry_after = None
+
+            try:
+                async with controller:
+                    start = time.monotonic()
+
+                    async with self._session.get(urljoin(self._url, prefix), headers=headers) as response:
+                        body = await response.read()
+
+                        if response.status not in constants.RETRY_STATUS_CODES or is_last:
+                            is_changed = self._store_response(prefix, response, body)
+                            controller.on_success(time.monotonic() - start)
+                            return is_changed
+
+                        if response.status in constants.THROTTLE_STATUS_CODES:
+                            controller.on_throttle()
+                        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                if is_last:
+                    raise
+
+            # Wait outside of the controller, so that the slot can be used by others.
+            await asyncio.sleep(controller.backoff_delay(attempt, retry_after))
+
+    def _store_response(self, prefix, response, body):
+        if response.status == constants.STATUS_CODE_NOT_MODIFIED:
+            self._store.touch(prefix)
+            return False
+
+        if response.status != constants.STATUS_CODE_OK:
+            raise ConnectionError(constants.RESPONSE_CODE_ERROR_MSG + body.decode('utf-8', 'replace'))
+
+        self._store.put(prefix, body, response.headers.get('ETag'))
+        return True
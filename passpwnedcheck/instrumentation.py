@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module lets callers observe where time goes inside a check,
+and keeps the metrics in memory or forwards them to a metrics stack.
+"""
+
+import threading
+import time
+from collections import Counter
+
+import aiohttp
+
+import passpwnedcheck.constants as constants
+
+
+class Instrumentation:
+    '''
+    Hooks called by the checkers and SessionManager. Every hook does nothing,
+    subclass it and override the ones you need to export metrics.
+
+    Stages are named after constants.STAGE_*:
+      +  hash: hashing passwords or parsing precomputed hashes.
+      +  dns, connect: resolving and opening new connections, connect
+      includes dns. Only reported by sessions created by SessionManager
+      with instrumentation.
+      +  wait: from sending a request until its headers are received.
+      For blocking calls, this includes dns and connect.
+      +  download: reading the body of a response.
+      +  parse: building a range from a response body.
+      +  lookup: finding suffixes in ranges.
+
+    Hooks can be called from several threads at once.
+    '''
+
+    def on_stage(self, stage, seconds):
+        '''
+        A stage took seconds to run.
+        '''
+
+    def on_bytes(self, count):
+        '''
+        count bytes of response body were received.
+        '''
+
+    def on_cache(self, hit):
+        '''
+        A range was looked up in cache, hit is True if it was found.
+        '''
+
+    def on_retry(self, status):
+        '''
+        A request is being retried after failing with status.
+        '''
+
+    def on_request_start(self):
+        '''
+        A request was sent.
+        '''
+
+    def on_request_end(self):
+        '''
+        A request finished, whether it succeeded or not.
+        '''
+
+
+class MetricsRecorder(Instrumentation):
+    '''
+    Keep metrics in memory, to inspect them or export them periodically.
+
+    Usage:
+    metrics = MetricsRecorder()
+    with PassChecker(instrumentation=metrics) as pass_checker:
+        pass_checker.is_passwords_compromised(passwords)
+    print(metrics.summary())
+    '''
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.stage_counts = Counter()
+        self.stage_seconds = Counter()
+        self.bytes_received = 0
+        self.cache_hits = 0
+        self.cache_misses = 0
+        self.retries = Counter()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def on_stage(self, stage, seconds):
+        with self._lock:
+            self.stage_counts[stage] += 1
+            self.stage_seconds[stage] += seconds
+
+    def on_bytes(self, count):
+        with self._lock:
+            self.bytes_received += count
+
+    def on_cache(self, hit):
+        with self._lock:
+            if hit:
+                self.cache_hits += 1
+            else:
+                self.cache_misses += 1
+
+    def on_retry(self, status):
+        with self._lock:
+            self.retries[status] += 1
+
+    def on_request_start(self):
+        with self._lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+    def on_request_end(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def summary(self):
+        '''
+        Return the metrics recorded so far as a dictionary.
+        '''
+
+        with self._lock:
+            stages = {stage: {'count': count,
+                              'seconds': self.stage_seconds[stage],
+                              'mean': self.stage_seconds[stage] / count}
+                      for stage, count in self.stage_counts.items()}
+
+            return {
+                'stages': stages,
+                'bytes_received': self.bytes_received,
+                'cache_hits': self.cache_hits,
+                'cache_misses': self.cache_misses,
+                'retries': sum(self.retries.values()),
+                'in_flight': self.in_flight,
+                'max_in_flight': self.max_in_flight
+            }
+
+
+def timed(instrumentation, stage, func, *args):
+    '''
+    Call func(*args) and report how long it took as stage.
+    Without instrumentation, func is called directly.
+    '''
+
+    if instrumentation is None:
+        return func(*args)
+
+    start = time.perf_counter()
+    try:
+        return func(*args)
+    finally:
+        instrumentation.on_stage(stage, time.perf_counter() - start)
+
+
+def create_trace_config(instrumentation):
+    '''
+    Create an aiohttp.TraceConfig reporting dns and connect stages.
+    '''
+
+    async def on_dns_start(session, context, params):
+        context.dns_start = time.perf_counter()
+
+    async def on_dns_end(session, context, params):
+        instrumentation.on_stage(constants.STAGE_DNS, time.perf_counter() - context.dns_start)
+
+    async def on_connect_start(session, context, params):
+        context.connect_start = time.perf_counter()
+
+    async def on_connect_end(session, context, params):
+        instrumentation.on_stage(constants.STAGE_CONNECT, time.perf_counter() - context.connect_start)
+
+    trace_config = aiohttp.TraceConfig()
+    trace_config.on_dns_resolvehost_start.append(on_dns_start)
+    trace_config.on_dns_resolvehost_end.append(on_dns_end)
+    trace_config.on_connection_create_start.append(on_connect_start)
+    trace_config.on_connection_create_end.append(on_connect_end)
+
+    return trace_config
@@ -0,0 +1,210 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module converts the downloadable Pwned Passwords corpus
+into a compact binary file and looks up hashes in it.
+"""
+
+import functools
+import mmap
+import os
+import struct
+import tempfile
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.utils import ExternalSorter, bisect_records
+
+
+def build_corpus(source_path, dest_path, chunk_size=constants.CORPUS_SORT_CHUNK_SIZE):
+    '''
+    Convert the text corpus into a sorted binary file.
+
+    Each line of the source file must be in the format HASH:COUNT,
+    where HASH is the full SHA-1 hash in hex. This is the format
+    used by the downloadable Pwned Passwords corpus.
+
+    Each record in the binary file is made of the raw 20-byte hash
+    followed by the count as a 4-byte big-endian integer.
+    The corpus ordered by hash is written straight to disk,
+    any other order is sorted in chunks of chunk_size records
+    on disk and merged, so it does not have to fit in memory.
+
+    Return the number of records written.
+    '''
+
+    dest_dir = os.path.dirname(os.path.abspath(dest_path))
+    fd, tmp_path = tempfile.mkstemp(dir=dest_dir)
+
+    try:
+        with os.fdopen(fd, 'wb') as dest:
+            dest.write(constants.CORPUS_MAGIC)
+            total, is_sorted = _write_records(source_path, dest)
+
+        if not is_sorted:
+            _sort_records(tmp_path, chunk_size)
+
+        os.replace(tmp_path, dest_path)
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+
+    return total
+
+def parse_corpus_line(line):
+    '''
+    Convert a line of the text corpus into a binary record.
+    '''
+
+    try:
+        hash, count = line.strip().split(constants.DELIMITER)
+        digest = bytes.fromhex(hash)
+        if len(digest) != constants.DIGEST_SIZE:
+            raise ValueError
+        return digest + constants.COUNT_STRUCT.pack(int(count))
+    except (ValueError, struct.error):
+        raise ValueError(constants.CORPUS_LINE_ERROR_MSG + repr(line))
+
+def _write_records(source_path, dest):
+    total = 0
+    is_sorted = True
+    previous = b''
+
+    with open(source_path, 'r', encoding='ascii') as source:
+        for line in source:
+            if not line.strip():
+                continue
+
+            record = parse_corpus_line(line)
+            if record < previous:
+                is_sorted = False
+
+            dest.write(record)
+            previous = record
+            total += 1
+
+    return total, is_sorted
+
+def _sort_records(path, chunk_size):
+    fd, sorted_path = tempfile.mkstemp(dir=os.path.dirname(path))
+
+    try:
+        with open(path, 'rb') as source, os.fdopen(fd, 'wb') as dest, \
+                ExternalSorter(chunk_size) as sorter:
+            source.seek(len(constants.CORPUS_MAGIC))
+            records = iter(functools.partial(source.read, constants.RECORD_SIZE), b'')
+
+            dest.write(constants.CORPUS_MAGIC)
+            dest.writelines(sorter.sort(records))
+
+        os.replace(sorted_path, path)
+    except BaseException:
+        os.remove(sorted_path)
+        raise
+
+
+class LocalCorpus:
+    '''
+    Memory-mapped view of a binary corpus created by build_corpus.
+    Hashes are found using binary search, no remote call is made.
+
+    Usage:
+    with LocalCorpus('pwned.bin') as corpus:
+        count = corpus.get_count(digest)
+    '''
+
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        offset = len(constants.CORPUS_MAGIC)
+        body_size = len(self._mmap) - offset
+        if self._mmap[:offset] != constants.CORPUS_MAGIC or \
+                body_size % constants.RECORD_SIZE:
+            self._mmap.close()
+            raise ValueError(constants.CORPUS_FORMAT_ERROR_MSG + str(path))
+
+        self._offset = offset
+        self._size = body_size // constants.RECORD_SIZE
+
+    def __len__(self):
+        return self._size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
+
+    def close(self):
+        self._mmap.close()
+
+    def view(self):
+        '''
+        Return a memoryview of all records, without the header.
+        The corpus cannot be closed while the view is in use.
+        '''
+
+        return memoryview(self._mmap)[self._offset:]
+
+    def digests(self):
+        '''
+        Yield every raw 20-byte SHA-1 hash in the corpus, in order.
+        '''
+
+        for digest, _ in constants.RECORD_STRUCT.iter_unpack(self.view()):
+            yield digest
+
+    def get_count(self, digest):
+        '''
+        Return the number of times a raw 20-byte SHA-1 hash
+        appears in the corpus, or 0 if it cannot be found.
+        '''
+
+        _, count = self.search(digest)
+        return count
+
+    def search(self, digest, lo=0):
+        '''
+        Search for a raw 20-byte SHA-1 hash, starting from record lo.
+
+        Return the index of the first record not less than digest,
+        and the count of digest (0 if it cannot be found).
+        Searching hashes in order can reuse the returned index as lo.
+        '''
+
+        index = bisect_records(self._mmap, digest, constants.RECORD_SIZE, self._size, self._offset, lo)
+        if index < self._size:
+            start = self._offset + index * constants.RECORD_SIZE
+            end = start + constants.DIGEST_SIZE
+            if self._mmap[start:end] == digest:
+                count, = constants.COUNT_STRUCT.unpack_from(self._mmap, end)
+                return index, count
+
+        return index, 0
+
+    def read_range(self, prefix):
+        '''
+        Return the records of a prefix of 5 hex characters as bytes,
+        in the same format as a response of Pwned Passwords API.
+        Return an empty bytes object if no hash starts with prefix.
+        '''
+
+        # A prefix is 2.5 bytes, records of prefix are between the 3-byte
+        # keys of prefix and of the next prefix.
+        value = int(prefix, 16)
+        start = self._bisect_prefix(value)
+        end = self._bisect_prefix(value + 1, start)
+
+        records = self._mmap[self._offset + start * constants.RECORD_SIZE:
+                                self._offset + end * constants.RECORD_SIZE]
+        lines = (digest.hex().upper()[len(prefix):] + constants.DELIMITER + str(count) \
+                    for digest, count in constants.RECORD_STRUCT.iter_unpack(records))
+
+        return constants.LINE_BREAK.join(lines).encode('ascii')
+
+    def _bisect_prefix(self, value, lo=0):
+        if value >= constants.PREFIX_COUNT:
+            return self._size
+
+        key = bytes.fromhex(constants.PREFIX_FORMAT.format(value) + '0')
+        return bisect_records(self._mmap, key, constants.RECORD_SIZE, self._size, self._offset, lo)
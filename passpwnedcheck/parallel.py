@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module checks large numbers of passwords using a pool of
+worker processes, so that hashing and parsing use every core.
+"""
+
+import itertools
+import os
+from array import array
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.pass_checker import PassChecker
+from passpwnedcheck.utils import get_password_digest
+
+# Source of ranges for the current worker process, set by _init_worker.
+_worker_source = None
+
+
+def check_passwords_parallel(passwords, corpus_path=None, processes=None,
+                                chunk_size=constants.PARALLEL_CHUNK_SIZE):
+    '''
+    Check multiple passwords using a pool of worker processes.
+    Return a dictionary with each password as key.
+
+    See iter_passwords_parallel for the meaning of each parameter.
+    '''
+
+    return dict(iter_passwords_parallel(passwords, corpus_path, processes, chunk_size))
+
+def iter_passwords_parallel(passwords, corpus_path=None, processes=None,
+                                chunk_size=constants.PARALLEL_CHUNK_SIZE):
+    '''
+    Check multiple passwords using a pool of worker processes.
+
+    Passwords are split into chunks of chunk_size, each worker hashes
+    its chunk and looks it up, either in the local corpus at corpus_path
+    or using pwnedpasswords API. Only an array of counts is sent back
+    to the parent process.
+
+    processes defaults to the number of CPUs. At most two chunks per
+    process are in flight, so passwords can be any iterable.
+    Yield (password, count) pairs, in input order.
+    '''
+
+    iterator = iter(passwords)
+    processes = processes or os.cpu_count() or 1
+    window = processes * 2
+
+    with ProcessPoolExecutor(max_workers=processes, initializer=_init_worker,
+                                initargs=(corpus_path,)) as executor:
+        pending = deque()
+
+        while True:
+            while len(pending) < window:
+                chunk = list(itertools.islice(iterator, chunk_size))
+                if not chunk:
+                    break
+                pending.append((chunk, executor.submit(_check_chunk, chunk)))
+
+            if not pending:
+                return
+
+            chunk, future = pending.popleft()
+            yield from zip(chunk, future.result())
+
+def _init_worker(corpus_path):
+    global _worker_source
+    _worker_source = LocalCorpus(corpus_path) if corpus_path else PassChecker()
+
+def _check_chunk(passwords):
+    '''
+    Check a chunk of passwords in a worker process.
+    Return an array of counts, in the same order as passwords.
+    '''
+
+    if isinstance(_worker_source, LocalCorpus):
+        get_count = _worker_source.get_count
+        counts = [get_count(get_password_digest(password)) for password in passwords]
+    else:
+        results = _worker_source.is_passwords_compromised(passwords)
+        counts = [results[password] for password in passwords]
+
+    return array(constants.COMPACT_COUNT_TYPECODE, counts)
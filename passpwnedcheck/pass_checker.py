@@ -5,12 +5,20 @@ This module checks for password pwnage using k-anonimity.
 """
 
 import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 
 import requests
+import urllib3
 from requests.compat import urljoin
 
 import passpwnedcheck.constants as constants
-from passpwnedcheck.utils import get_password_prefix_suffix, response_to_dict
+from passpwnedcheck.cache import AsyncCacheBackend
+from passpwnedcheck.instrumentation import timed
+from passpwnedcheck.ranges import CompactRange, RawRange
+from passpwnedcheck.session_manager import create_pooled_session
+from passpwnedcheck.utils import (get_digest_prefix_suffix, get_hash_digest, get_hash_prefix_suffix,
+                                  get_password_digest, group_by_prefix)
 
 
 class PassChecker:
@@ -29,29 +37,294 @@ class PassChecker:
 
     This package can be included into other projects
     or called straight from command line.
+
+    Optionally, a RangeCache can be passed in to avoid
+    fetching the same prefix more than once. Any CacheBackend can be
+    used instead, such as DiskRangeCache or RedisRangeCache.
+
+    Connections are kept alive and reused between calls. Either pass in
+    a requests.Session, or let PassChecker create a pooled one and close it
+    when done, preferably using a with statement.
+
+    Optionally, a DeadlinePolicy can be passed in to bound how long
+    each request can take and choose what happens when it times out.
+
+    Optionally, an Instrumentation can be passed in to record
+    per stage timings, bytes received, cache hits and retries.
+
+    Optionally, a BloomFilter can be passed in as prefilter. Passwords
+    which are definitely not compromised are answered without any request.
+
+    Usage:
+    with PassChecker() as pass_checker:
+        is_leaked, count = pass_checker.is_password_compromised('Password')
     '''
 
+    def __init__(self, cache=None, session=None, pool_size=constants.POOL_SIZE,
+                    retries=constants.RETRIES, timeout=constants.TIMEOUT, deadline_policy=None,
+                    instrumentation=None, prefilter=None, url=constants.URL):
+        # Its coroutines would be cached as ranges instead of being awaited.
+        if isinstance(cache, AsyncCacheBackend):
+            raise TypeError(constants.ASYNC_CACHE_ERROR_MSG + type(cache).__name__)
+
+        self._cache = cache
+        self._url = url
+        self._owns_session = session is None
+        self._pool_size = pool_size
+        # Retrying slow or failed responses would take longer than the deadline allows.
+        self._session = session if session is not None else \
+                            create_pooled_session(pool_size, retries, retry_reads=deadline_policy is None,
+                                                    retry_statuses=deadline_policy is None)
+        self._deadline_policy = deadline_policy
+        self._timeout = timeout
+        self._instrumentation = instrumentation
+        self._prefilter = prefilter
+
+        # Blocking requests cannot be hedged, the deadline bounds each request instead.
+        if deadline_policy is not None:
+            limits = [timeout, deadline_policy.timeout, deadline_policy.deadline]
+            self._timeout = min((limit for limit in limits if limit is not None), default=None)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        self.close()
+
+    def close(self):
+        '''
+        Close the session if it was created by PassChecker.
+        '''
+
+        if self._owns_session:
+            self._session.close()
+
+    def is_passwords_compromised(self, passwords, max_workers=None):
+        '''
+        Check multiple passwords to see if they are compromised.
+
+        Passwords sharing the same prefix are grouped together,
+        so that each prefix is only fetched once. Prefixes are fetched
+        concurrently by up to max_workers threads sharing the same session,
+        pool_size by default. More threads than pooled connections would
+        open connections which cannot be kept alive, so when passing in
+        a session, keep max_workers at or below its pool size.
+
+        Return a dictionary with each password as key, like
+        PassCheckerAsync.is_passwords_compromised.
+        '''
+
+        groups = timed(self._instrumentation, constants.STAGE_HASH, group_by_prefix, passwords)
+        return self._check_groups(groups, max_workers)
+
+    def is_hashes_compromised(self, hashes, max_workers=None):
+        '''
+        Same as is_passwords_compromised, but takes precomputed SHA-1 hashes,
+        either in hex or as raw 20-byte strings.
+        Return a dictionary with each hash as key.
+        '''
+
+        groups = timed(self._instrumentation, constants.STAGE_HASH,
+                        group_by_prefix, hashes, get_hash_prefix_suffix)
+        return self._check_groups(groups, max_workers)
+
     def is_password_compromised(self, password):
         '''
         Check if a password has been compromised
         using pwnedpasswords API
         '''
 
-        prefix, suffix = get_password_prefix_suffix(password)
-        response = requests.get(urljoin(constants.URL, prefix))
-        
-        if response.status_code == constants.STATUS_CODE_OK:
-            response_dict = response_to_dict(response.text)
+        return self._check(timed(self._instrumentation, constants.STAGE_HASH, get_password_digest, password))
+
+    def is_hash_compromised(self, hash):
+        '''
+        Same as is_password_compromised, but takes a precomputed SHA-1 hash,
+        either in hex or as a raw 20-byte string.
+        '''
+
+        return self._check(timed(self._instrumentation, constants.STAGE_HASH, get_hash_digest, hash))
+
+    def _check(self, digest):
+        if self._prefilter is not None and not self._prefilter.might_contain(digest):
+            return False, 0
+
+        prefix, suffix = get_digest_prefix_suffix(digest)
 
-            if suffix in response_dict:
-                return True, response_dict[suffix]
+        prefix_range = self.get_range(prefix)
+        count = timed(self._instrumentation, constants.STAGE_LOOKUP, prefix_range.get, suffix)
 
-            else:
-                return False, 0
+        if count is not None:
+            return True, count
 
         else:
+            return False, 0
+
+    def _check_groups(self, groups, max_workers):
+        results = {}
+        if self._prefilter is not None:
+            groups, results = self._prefilter.split_groups(groups)
+
+        ranges = {}
+        if self._cache is not None:
+            # Look up every prefix at once, it may cost a single round trip.
+            ranges = self._cache.get_many(groups)
+            if self._instrumentation is not None:
+                for prefix in groups:
+                    self._instrumentation.on_cache(prefix in ranges)
+
+        missing = [prefix for prefix in groups if prefix not in ranges]
+
+        executor = ThreadPoolExecutor(max_workers=max_workers or self._pool_size)
+        try:
+            ranges.update(zip(missing, executor.map(self._fetch_range, missing)))
+        finally:
+            # Do not wait for pending prefixes if one of them failed.
+            executor.shutdown(cancel_futures=True)
+
+        results.update(timed(self._instrumentation, constants.STAGE_LOOKUP, self._lookup, groups, ranges))
+
+        return results
+
+    def _lookup(self, groups, ranges):
+        return {key: ranges[prefix].get(suffix, 0) \
+                    for prefix, group in groups.items() for key, suffix in group}
+
+    def get_range(self, prefix):
+        '''
+        Return the range of a prefix, from cache if possible.
+
+        Without a cache, the raw response is returned as is,
+        since it will only be used once.
+        '''
+
+        if self._cache is not None:
+            cached_range = self._cache.get(prefix)
+            if self._instrumentation is not None:
+                self._instrumentation.on_cache(cached_range is not None)
+            if cached_range is not None:
+                return cached_range
+
+        return self._fetch_range(prefix)
+
+    def _fetch_range(self, prefix):
+        '''
+        Fetch the range of a prefix and store it in cache.
+        '''
+
+        start = time.monotonic()
+        try:
+            response = self._request(urljoin(self._url, prefix), start)
+        except requests.exceptions.RequestException as e:
+            if self._deadline_policy is None or not self._is_deadline_error(e, start):
+                raise
+            return self._deadline_policy.on_deadline()
+
+        if response.status_code != constants.STATUS_CODE_OK:
+            # Errors retried by a session passed in may have taken the whole deadline.
+            if self._deadline_policy is not None and self._is_past_deadline(start):
+                return self._deadline_policy.on_deadline()
             raise ConnectionError(constants.RESPONSE_CODE_ERROR_MSG + response.reason)
 
+        if self._cache is None:
+            return timed(self._instrumentation, constants.STAGE_PARSE, RawRange, response.content)
+
+        compact_range = timed(self._instrumentation, constants.STAGE_PARSE,
+                                CompactRange.from_response, response.content)
+        self._cache.set(prefix, compact_range)
+
+        return compact_range
+
+    def _is_deadline_error(self, error, start):
+        '''
+        Return True if a request failed because it timed out, or failed
+        after the deadline had passed. Once urllib3 runs out of retries,
+        a timeout is raised as a ConnectionError caused by it.
+        '''
+
+        if isinstance(error, requests.exceptions.Timeout):
+            return True
+
+        reason = getattr(error.args[0], 'reason', None) if error.args else None
+        if isinstance(reason, urllib3.exceptions.TimeoutError):
+            return True
+
+        return self._is_past_deadline(start)
+
+    def _is_past_deadline(self, start):
+        deadline = self._deadline_policy.deadline
+        return deadline is not None and time.monotonic() - start >= deadline
+
+    def _request(self, url, start):
+        '''
+        Send one request, reporting its timings if there is instrumentation.
+        '''
+
+        instrumentation = self._instrumentation
+        if instrumentation is None:
+            return self._get(url, start)
+
+        instrumentation.on_request_start()
+        try:
+            request_start = time.perf_counter()
+            response = self._get(url, start)
+            total = time.perf_counter() - request_start
+        finally:
+            instrumentation.on_request_end()
+
+        # The body is read by session.get, after the headers are received.
+        wait = min(response.elapsed.total_seconds(), total)
+        instrumentation.on_stage(constants.STAGE_WAIT, wait)
+        instrumentation.on_stage(constants.STAGE_DOWNLOAD, total - wait)
+        instrumentation.on_bytes(len(response.content))
+
+        # Retries are done by urllib3, which keeps track of them.
+        retries = getattr(response.raw, 'retries', None)
+        for attempt in getattr(retries, 'history', ()):
+            instrumentation.on_retry(attempt.status)
+
+        return response
+
+    def _get(self, url, start):
+        '''
+        Send one request. timeout only bounds each read from the socket,
+        so with a deadline the body is read in chunks, and reading stops
+        with a ReadTimeout once the deadline has passed.
+        '''
+
+        deadline = self._deadline_policy.deadline if self._deadline_policy is not None else None
+        if deadline is None:
+            return self._session.get(url, timeout=self._timeout)
+
+        chunks = []
+        with self._session.get(url, timeout=self._timeout, stream=True) as response:
+            for chunk in _iter_available(response):
+                chunks.append(chunk)
+                if time.monotonic() - start >= deadline:
+                    raise requests.exceptions.ReadTimeout(constants.DEADLINE_ERROR_MSG)
+
+            # Keep the body as if it had been read by session.get,
+            # so that closing the response gives the connection back to the pool.
+            response._content = b''.join(chunks)
+            response._content_consumed = True
+
+        return response
+
+def _iter_available(response):
+    '''
+    Yield the body of a streamed response as soon as bytes arrive,
+    instead of waiting for whole chunks. read1 needs urllib3 2.
+    '''
+
+    read1 = getattr(response.raw, 'read1', None)
+    if read1 is None:
+        yield from response.iter_content(constants.READ_CHUNK_SIZE)
+        return
+
+    chunk = read1(constants.READ_CHUNK_SIZE, decode_content=True)
+    while chunk:
+        yield chunk
+        chunk = read1(constants.READ_CHUNK_SIZE, decode_content=True)
+
 def main():
     '''
     Entry point of script when run from command line.
@@ -91,6 +364,9 @@ def main():
         print(constants.UNKNOWN_ERROR_MSG)
         print(str(e))
 
+    finally:
+        pc.close()
+
 
 if __name__ == '__main__':
     main()
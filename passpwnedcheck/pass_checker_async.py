@@ -6,73 +6,422 @@ All remote calls are non-blocking.
 """
 
 import asyncio
+import contextlib
+import itertools
+import time
 
+import aiohttp
 from requests.compat import urljoin
 
 import passpwnedcheck.constants as constants
-from passpwnedcheck.utils import get_password_prefix_suffix, response_to_dict
+from passpwnedcheck.cache import AsyncCacheBackend
+from passpwnedcheck.instrumentation import timed
+from passpwnedcheck.ranges import CompactRange, RawRange, SuffixScanner
+from passpwnedcheck.rate_control import parse_retry_after
+from passpwnedcheck.scheduler import iter_bounded, map_bounded
+from passpwnedcheck.utils import (get_digest_prefix_suffix, get_hash_digest, get_hash_prefix_suffix,
+                                  get_password_digest, group_by_prefix)
 
 
 class PassCheckerAsync:
     '''
     This is the non-blocking version of PassChecker.
     It supports both checking a single password and multiple passwords.
+
+    Optionally, a RangeCache can be passed in to avoid
+    fetching the same prefix more than once. Any CacheBackend or
+    AsyncCacheBackend can be used instead, such as AsyncRedisRangeCache.
+
+    Concurrent calls for the same prefix are coalesced,
+    only the first one sends a request and the others wait for its result.
+
+    Optionally, an AdaptiveRateController can be passed in to retry
+    throttled requests and adapt concurrency to the rate the server accepts.
+    Then batch_size defaults to its max_concurrency, and the controller
+    decides how many of those requests are in flight.
+
+    Optionally, a DeadlinePolicy can be passed in to set timeouts,
+    hedge slow requests and choose what happens when a deadline passes.
+
+    Optionally, an Instrumentation can be passed in to record per stage
+    timings, bytes received, cache hits, retries and requests in flight.
+    Pass the same instrumentation to SessionManager to also record
+    dns and connect timings.
+
+    Optionally, a BloomFilter can be passed in as prefilter. Passwords
+    which are definitely not compromised are answered without any request.
     '''
 
-    def __init__(self, session):
+    def __init__(self, session, cache=None, rate_controller=None, deadline_policy=None,
+                    instrumentation=None, prefilter=None, url=constants.URL):
         self._session = session
+        self._url = url
+        self._cache = cache
+        self._async_cache = isinstance(cache, AsyncCacheBackend)
+        self._rate_controller = rate_controller
+        self._deadline_policy = deadline_policy
+        self._instrumentation = instrumentation
+        self._prefilter = prefilter
+        self._request_kwargs = {}
+
+        if deadline_policy is not None and deadline_policy.timeout is not None:
+            self._request_kwargs['timeout'] = aiohttp.ClientTimeout(total=deadline_policy.timeout)
+        self._in_flight = {}
 
-    async def is_passwords_compromised(self, passwords, batch_size=constants.BATCH_SIZE):
+    async def is_passwords_compromised(self, passwords, batch_size=None, rate_limit=None):
         '''
         Check multiple passwords to see if they are compromised.
-        Calls are made to haveibeenpwned in batch and are non-blocking.
+        Calls are made to haveibeenpwned concurrently and are non-blocking.
+
+        Passwords sharing the same prefix are grouped together,
+        so that each prefix is only fetched once.
+
+        At most batch_size requests are in flight at any time, a new request
+        is sent as soon as one finishes. If rate_limit is set, at most
+        rate_limit requests are sent per second. batch_size defaults to
+        constants.BATCH_SIZE, or to the max_concurrency of the rate controller.
         '''
 
-        rs = {}
+        groups = timed(self._instrumentation, constants.STAGE_HASH, group_by_prefix, passwords)
+        return await self._check_groups(groups, batch_size, rate_limit)
 
-        batch_generator = self._batch_generator(passwords, batch_size)
-        for password_batch in batch_generator:
-            tasks = []
+    async def is_hashes_compromised(self, hashes, batch_size=None, rate_limit=None):
+        '''
+        Same as is_passwords_compromised, but takes precomputed SHA-1 hashes,
+        either in hex or as raw 20-byte strings.
+        Return a dictionary with each hash as key.
+        '''
+
+        groups = timed(self._instrumentation, constants.STAGE_HASH,
+                        group_by_prefix, hashes, get_hash_prefix_suffix)
+        return await self._check_groups(groups, batch_size, rate_limit)
+
+    async def iter_passwords_compromised(self, passwords, batch_size=None, rate_limit=None):
+        '''
+        This is the streaming version of is_passwords_compromised.
 
-            for password in password_batch:
-                task_run = self.is_password_compromised(password)
-                task = asyncio.ensure_future(task_run)
-                tasks.append(task)
+        passwords can be any iterable or async iterable, including ones
+        which do not fit in memory. (password, count) pairs are yielded
+        as soon as they are ready, not in input order.
 
-            batch_results = await asyncio.gather(*tasks)
+        At most batch_size requests are in flight and at most batch_size
+        results are buffered. If the caller stops consuming results,
+        no more passwords are read.
+        '''
 
-            for password, results in zip(password_batch, batch_results):
-                _, count = results
-                rs[password] = count
+        async def check(password):
+            _, count = await self.is_password_compromised(password)
+            return count
 
-        return rs
+        async for password, count in iter_bounded(check, passwords, self._batch_size(batch_size), rate_limit):
+            yield password, count
 
     async def is_password_compromised(self, password):
         '''
         This is the non-blocking version of PassChecker.is_password_compromised.
         '''
 
-        prefix, suffix = get_password_prefix_suffix(password)
-        url = urljoin(constants.URL, prefix)
+        return await self._check(timed(self._instrumentation, constants.STAGE_HASH, get_password_digest, password))
+
+    async def is_hash_compromised(self, hash):
+        '''
+        This is the non-blocking version of PassChecker.is_hash_compromised.
+        '''
+
+        return await self._check(timed(self._instrumentation, constants.STAGE_HASH, get_hash_digest, hash))
+
+    async def _check(self, digest):
+        if self._prefilter is not None and not self._prefilter.might_contain(digest):
+            return False, 0
+
+        prefix, suffix = get_digest_prefix_suffix(digest)
+
+        if self._can_stream(prefix):
+            count = await self._stream_check(prefix, suffix)
+        else:
+            prefix_range = await self.get_range(prefix)
+            count = timed(self._instrumentation, constants.STAGE_LOOKUP, prefix_range.get, suffix)
+
+        if count is not None:
+            return True, count
+        else:
+            return False, 0
+
+    def _can_stream(self, prefix):
+        '''
+        A single lookup can be answered while the range is being received
+        if the range does not need to be cached, retried or hedged,
+        and is not already being fetched.
+        '''
+
+        return self._cache is None and self._rate_controller is None and \
+                self._deadline_policy is None and prefix not in self._in_flight
+
+    async def _stream_check(self, prefix, suffix):
+        '''
+        Fetch the range of a prefix while looking up suffix in it,
+        and return the count as soon as the suffix is found or passed.
+
+        The request is shared with concurrent calls for the same prefix,
+        and the rest of the response is still read in the background,
+        so that those calls get the whole range and the connection can be reused.
+        '''
+
+        found = asyncio.get_running_loop().create_future()
+        future = self._share(prefix, self._stream_range(prefix, SuffixScanner(suffix), found))
+
+        await asyncio.wait({found, future}, return_when=asyncio.FIRST_COMPLETED)
+        if found.done():
+            return found.result()
+
+        return future.result()
+
+    async def _check_groups(self, groups, batch_size, rate_limit):
+        results = {}
+        if self._prefilter is not None:
+            groups, results = self._prefilter.split_groups(groups)
+
+        ranges = {}
+        if self._cache is not None:
+            # Look up every prefix at once, it may cost a single round trip.
+            ranges = self._cache.get_many(groups)
+            if self._async_cache:
+                ranges = await ranges
+            if self._instrumentation is not None:
+                for prefix in groups:
+                    self._instrumentation.on_cache(prefix in ranges)
+
+        missing = [prefix for prefix in groups if prefix not in ranges]
+        ranges.update(await map_bounded(self._get_shared, missing, self._batch_size(batch_size), rate_limit))
+        results.update(timed(self._instrumentation, constants.STAGE_LOOKUP, self._lookup, groups, ranges))
+
+        return results
+
+    def _batch_size(self, batch_size):
+        if batch_size is not None:
+            return batch_size
+
+        # Let the rate controller go as high as it is allowed to.
+        if self._rate_controller is not None:
+            return self._rate_controller.max_concurrency
+
+        return constants.BATCH_SIZE
+
+    def _lookup(self, groups, ranges):
+        return {key: ranges[prefix].get(suffix, 0) \
+                    for prefix, group in groups.items() for key, suffix in group}
+
+    async def get_range(self, prefix):
+        '''
+        Return the range of a prefix, from cache if possible.
+
+        If the same prefix is already being fetched,
+        wait for that request instead of sending a new one.
+        '''
+
+        if self._cache is not None:
+            cached_range = self._cache.get(prefix)
+            if self._async_cache:
+                cached_range = await cached_range
+            if self._instrumentation is not None:
+                self._instrumentation.on_cache(cached_range is not None)
+            if cached_range is not None:
+                return cached_range
+
+        return await self._get_shared(prefix)
+
+    async def _get_shared(self, prefix):
+        '''
+        Fetch the range of a prefix, or wait for the request
+        already fetching it, within the deadline if there is one.
+        '''
+
+        future = self._in_flight.get(prefix)
+        if future is None:
+            future = self._share(prefix, self._fetch_range(prefix))
+
+        # A waiter being cancelled must not cancel the request shared by other waiters.
+        shared = asyncio.shield(future)
 
-        async with self._session.get(url) as response:
-            response_text = await self._ensure_success(response)
-            response_dict = response_to_dict(response_text)
+        policy = self._deadline_policy
+        if policy is None:
+            return await shared
 
-            if suffix in response_dict:
-                return True, response_dict[suffix]
-            else:
-                return False, 0
+        # The per-request timeout goes to the policy too, like in PassChecker.
+        try:
+            if policy.deadline is None:
+                return await shared
+            return await asyncio.wait_for(shared, policy.deadline)
+        except asyncio.TimeoutError:
+            return policy.on_deadline()
 
-    def _batch_generator(self, collection, batch_size):
+    def _share(self, prefix, coroutine):
         '''
-        This method returns a generator which batches the input into smaller chunks.
+        Run the fetch of a prefix, letting other calls wait for it until it is done.
         '''
 
-        head_index = 0
-        while (head_index < len(collection)):
-            yield collection[head_index:head_index+batch_size]
-            head_index += batch_size
+        future = asyncio.ensure_future(coroutine)
+        self._in_flight[prefix] = future
+        future.add_done_callback(lambda done: self._on_fetch_done(prefix, done))
+
+        return future
+
+    def _on_fetch_done(self, prefix, future):
+        del self._in_flight[prefix]
+
+        # Mark the exception as retrieved, in case every waiter was cancelled.
+        if not future.cancelled():
+            future.exception()
+
+    async def _fetch_range(self, prefix):
+        '''
+        Fetch the range of a prefix and store it in cache.
+
+        Without a cache, the raw response is returned as is,
+        since it will only be used once.
+        '''
+
+        url = urljoin(self._url, prefix)
+
+        if self._deadline_policy is None or self._deadline_policy.hedge_delay() is None:
+            body = await self._request(url)
+        else:
+            body = await self._hedged_request(url)
+
+        if self._cache is None:
+            return timed(self._instrumentation, constants.STAGE_PARSE, RawRange, body)
+
+        compact_range = timed(self._instrumentation, constants.STAGE_PARSE, CompactRange.from_response, body)
+        stored = self._cache.set(prefix, compact_range)
+        if self._async_cache:
+            await stored
+
+        return compact_range
+
+    async def _stream_range(self, prefix, scanner, found):
+        '''
+        Fetch the range of a prefix chunk by chunk, feeding each chunk to scanner.
+        Set the result of found as soon as scanner is done, and return the whole range.
+        '''
+
+        chunks = []
+
+        async with self._get(urljoin(self._url, prefix)) as response:
+            if response.status != constants.STATUS_CODE_OK:
+                # Raise exception with the body of the response.
+                await self._ensure_success(response)
+
+            start = time.perf_counter()
+            async for chunk in response.content.iter_any():
+                chunks.append(chunk)
+                if not found.done() and scanner.feed(chunk):
+                    found.set_result(scanner.count)
+
+        body = b''.join(chunks)
+
+        if self._instrumentation is not None:
+            self._instrumentation.on_stage(constants.STAGE_DOWNLOAD, time.perf_counter() - start)
+            self._instrumentation.on_bytes(len(body))
+
+        if not found.done():
+            found.set_result(scanner.finish())
+
+        return timed(self._instrumentation, constants.STAGE_PARSE, RawRange, body)
+
+    async def _hedged_request(self, url):
+        '''
+        Send a request, and if it has not finished after the hedge delay,
+        send a second one. Return the body of whichever succeeds first.
+        '''
+
+        tasks = {asyncio.ensure_future(self._request(url))}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=self._deadline_policy.hedge_delay())
+            if not done:
+                tasks.add(asyncio.ensure_future(self._request(url)))
+
+            error = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        return task.result()
+                    error = error or task.exception()
+
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def _request(self, url):
+        '''
+        Send one request, through the rate controller if there is one,
+        and return the body of the response.
+        '''
+
+        start = time.monotonic()
+
+        if self._rate_controller is None:
+            async with self._get(url) as response:
+                body = await self._ensure_success(response)
+        else:
+            body = await self._fetch_with_retry(url)
+
+        if self._deadline_policy is not None:
+            self._deadline_policy.record(time.monotonic() - start)
+
+        return body
+
+    async def _fetch_with_retry(self, url):
+        '''
+        Fetch a url within the limit of the rate controller,
+        retrying throttled or failed requests with backoff.
+        '''
+
+        controller = self._rate_controller
+
+        for attempt in itertools.count():
+            async with controller:
+                start = time.monotonic()
+
+                async with self._get(url) as response:
+                    if response.status not in constants.RETRY_STATUS_CODES or attempt >= controller.retries:
+                        body = await self._ensure_success(response)
+                        controller.on_success(time.monotonic() - start)
+                        return body
+
+                    if response.status in constants.THROTTLE_STATUS_CODES:
+                        controller.on_throttle()
+                    retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                    if self._instrumentation is not None:
+                        self._instrumentation.on_retry(response.status)
+
+            # Wait outside of the controller, so that the slot can be used by others.
+            await asyncio.sleep(controller.backoff_delay(attempt, retry_after))
+
+    def _get(self, url):
+        '''
+        Return the context manager of a request,
+        reporting its timings if there is instrumentation.
+        '''
+
+        if self._instrumentation is None:
+            return self._session.get(url, **self._request_kwargs)
+
+        return self._instrumented_get(url)
+
+    @contextlib.asynccontextmanager
+    async def _instrumented_get(self, url):
+        instrumentation = self._instrumentation
+
+        instrumentation.on_request_start()
+        try:
+            start = time.perf_counter()
+            async with self._session.get(url, **self._request_kwargs) as response:
+                instrumentation.on_stage(constants.STAGE_WAIT, time.perf_counter() - start)
+                yield response
+        finally:
+            instrumentation.on_request_end()
 
     async def _ensure_success(self, response):
         '''
@@ -80,9 +429,16 @@ class PassCheckerAsync:
         '''
 
         status = response.status
-        response_text = await response.text()
 
-        if status == 200:
-            return response_text
+        if self._instrumentation is None:
+            body = await response.read()
+        else:
+            start = time.perf_counter()
+            body = await response.read()
+            self._instrumentation.on_stage(constants.STAGE_DOWNLOAD, time.perf_counter() - start)
+            self._instrumentation.on_bytes(len(body))
+
+        if status == constants.STATUS_CODE_OK:
+            return body
         else:
-            raise ConnectionError(constants.RESPONSE_CODE_ERROR_MSG + response_text)
+            raise ConnectionError(constants.RESPONSE_CODE_ERROR_MSG + body.decode('utf-8', 'replace'))
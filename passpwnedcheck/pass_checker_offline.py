@@ -0,0 +1,59 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module checks for password pwnage using a local copy of the corpus.
+No remote calls are made.
+"""
+
+from passpwnedcheck.utils import get_hash_digest, get_password_digest
+
+
+class PassCheckerOffline:
+    '''
+    This is the offline version of PassChecker.
+    It supports both checking a single password and multiple passwords.
+
+    Usage:
+    with LocalCorpus('pwned.bin') as corpus:
+        pass_checker = PassCheckerOffline(corpus)
+        is_leaked, count = pass_checker.is_password_compromised('Password')
+    '''
+
+    def __init__(self, corpus):
+        self._corpus = corpus
+
+    def is_passwords_compromised(self, passwords):
+        '''
+        Check multiple passwords to see if they are compromised.
+        '''
+
+        return {password: self.is_password_compromised(password)[1] \
+                    for password in passwords}
+
+    def is_hashes_compromised(self, hashes):
+        '''
+        Same as is_passwords_compromised, but takes precomputed SHA-1 hashes,
+        either in hex or as raw 20-byte strings.
+        Return a dictionary with each hash as key.
+        '''
+
+        return {hash: self.is_hash_compromised(hash)[1] for hash in hashes}
+
+    def is_password_compromised(self, password):
+        '''
+        This is the offline version of PassChecker.is_password_compromised.
+        '''
+
+        count = self._corpus.get_count(get_password_digest(password))
+
+        return count > 0, count
+
+    def is_hash_compromised(self, hash):
+        '''
+        Same as is_password_compromised, but takes a precomputed SHA-1 hash,
+        either in hex or as a raw 20-byte string.
+        '''
+
+        count = self._corpus.get_count(get_hash_digest(hash))
+
+        return count > 0, count
@@ -0,0 +1,170 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module contains lightweight representations of range responses.
+They can be used in place of the dictionary returned by response_to_dict.
+"""
+
+from array import array
+from collections.abc import Mapping
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.utils import bisect_records, find_suffix_count
+
+
+class RawRange:
+    '''
+    Range response kept as raw bytes.
+
+    Each lookup scans the bytes directly, without decoding
+    the response or building a dictionary. This is the fastest option
+    when a range is only used to look up a few suffixes, once.
+    '''
+
+    def __init__(self, body):
+        self.body = body
+
+    def get(self, suffix, default=None):
+        count = find_suffix_count(self.body, suffix)
+        return default if count is None else count
+
+
+class CompactRange(Mapping):
+    '''
+    Range response stored in two contiguous buffers.
+
+    Each suffix is converted from 35 hex characters into 18 bytes
+    and stored in one sorted bytes object, the counts are stored
+    in a parallel array. Suffixes are found using binary search.
+
+    This takes a fraction of the memory of the dictionary returned
+    by response_to_dict, and can be used wherever that dictionary is used.
+    '''
+
+    def __init__(self, suffixes, counts):
+        self._suffixes = suffixes
+        self._counts = counts
+
+    @classmethod
+    def from_response(cls, body):
+        '''
+        Create a range from the raw response data in bytes.
+        '''
+
+        entries = []
+        for line in body.split(b'\n'):
+            suffix, _, count = line.partition(constants.DELIMITER_BYTES)
+            if suffix:
+                entries.append((_encode_suffix(suffix.decode('ascii')), int(count)))
+
+        return cls._from_entries(entries)
+
+    @classmethod
+    def from_mapping(cls, mapping):
+        '''
+        Create a range from a mapping of suffix to count,
+        such as the dictionary returned by response_to_dict.
+        '''
+
+        return cls._from_entries([(_encode_suffix(suffix), count) \
+                    for suffix, count in mapping.items()])
+
+    @classmethod
+    def _from_entries(cls, entries):
+        entries.sort()
+        suffixes = b''.join(suffix for suffix, _ in entries)
+        counts = array(constants.COMPACT_COUNT_TYPECODE, (count for _, count in entries))
+        return cls(suffixes, counts)
+
+    def __getitem__(self, suffix):
+        try:
+            key = _encode_suffix(suffix)
+        except (ValueError, TypeError):
+            raise KeyError(suffix)
+
+        size = len(self._counts)
+        index = bisect_records(self._suffixes, key, constants.COMPACT_SUFFIX_SIZE, size)
+
+        start = index * constants.COMPACT_SUFFIX_SIZE
+        if index < size and self._suffixes[start:start+constants.COMPACT_SUFFIX_SIZE] == key:
+            return self._counts[index]
+
+        raise KeyError(suffix)
+
+    def __len__(self):
+        return len(self._counts)
+
+    def __iter__(self):
+        size = constants.COMPACT_SUFFIX_SIZE
+        for start in range(0, len(self._suffixes), size):
+            yield self._suffixes[start:start+size].hex().upper()[:constants.SUFFIX_LENGTH]
+
+    def __repr__(self):
+        return '{}({} suffixes)'.format(type(self).__name__, len(self))
+
+    def nbytes(self):
+        '''
+        Return the number of bytes used by both buffers.
+        '''
+
+        return len(self._suffixes) + len(self._counts) * self._counts.itemsize
+
+class SuffixScanner:
+    '''
+    Look up one suffix in a range response received in chunks.
+
+    Lines of a range are sorted by suffix, so the scan is done as soon as
+    the suffix is found or a greater suffix is seen. feed returns True
+    once the scan is done, then count holds the count of the suffix,
+    or None if it is not in the range.
+    '''
+
+    def __init__(self, suffix):
+        self._suffix = suffix
+        self._needle = suffix.encode('ascii')
+        self._tail = b''
+        self.done = False
+        self.count = None
+
+    def feed(self, chunk):
+        if self.done:
+            return True
+
+        data = self._tail + chunk
+        end = data.rfind(b'\n')
+        if end < 0:
+            self._tail = data
+            return False
+
+        # Only complete lines are scanned, the last partial line waits for the next chunk.
+        lines = data[:end]
+        self._tail = data[end+1:]
+
+        self.count = find_suffix_count(lines, self._suffix)
+        last_line = lines.rfind(b'\n') + 1
+        self.done = self.count is not None or \
+                        lines[last_line:last_line+constants.SUFFIX_LENGTH] > self._needle
+
+        return self.done
+
+    def finish(self):
+        '''
+        Scan what is left once the response has ended, and return count.
+        '''
+
+        if not self.done:
+            self.count = find_suffix_count(self._tail, self._suffix)
+            self.done = True
+
+        return self.count
+
+def _encode_suffix(suffix):
+    '''
+    Convert a suffix of 35 hex characters into 18 bytes,
+    padding the last half byte with zero.
+    '''
+
+    if len(suffix) != constants.SUFFIX_LENGTH:
+        raise ValueError(constants.SUFFIX_FORMAT_ERROR_MSG + suffix)
+
+    return bytes.fromhex(suffix + '0')
@@ -0,0 +1,139 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module adapts the number of concurrent requests to the rate
+pwnedpasswords API can sustain, and decides how long to back off
+after a throttled response.
+"""
+
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import passpwnedcheck.constants as constants
+
+
+def parse_retry_after(value, now=None):
+    '''
+    Convert the value of a Retry-After header into seconds.
+    The header can either be a number of seconds or an HTTP date.
+    Return None if value is missing or cannot be parsed.
+    '''
+
+    if value is None:
+        return None
+
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        retry_at = parsedate_to_datetime(value).timestamp()
+    except (TypeError, ValueError):
+        return None
+
+    return max(0.0, retry_at - (time.time() if now is None else now))
+
+
+class AdaptiveRateController:
+    '''
+    Limit the number of requests in flight, adapting the limit
+    to throttling and latency (additive increase, multiplicative decrease).
+
+      +  Each successful response raises the limit by about one per round trip,
+      as long as the limit is reached. A limit which is not used is not raised.
+      +  A throttled response, or one slower than latency_target,
+      cuts the limit by decrease_factor, at most once per cooldown seconds.
+      +  Throttled requests are retried up to retries times, waiting for
+      Retry-After if the server sent it, or else for a jittered exponential backoff.
+
+    Usage:
+    controller = AdaptiveRateController(max_concurrency=50)
+    pass_checker = PassCheckerAsync(session, rate_controller=controller)
+    '''
+
+    def __init__(self, max_concurrency=constants.RATE_MAX_CONCURRENCY, min_concurrency=1,
+                    initial_concurrency=constants.BATCH_SIZE, retries=constants.RETRIES,
+                    latency_target=None, decrease_factor=constants.RATE_DECREASE_FACTOR,
+                    cooldown=constants.RATE_COOLDOWN, backoff_base=constants.RETRY_BACKOFF_FACTOR,
+                    backoff_max=constants.RATE_BACKOFF_MAX, clock=time.monotonic, rng=random.random):
+        self._max = max_concurrency
+        self._min = min_concurrency
+        self._limit = float(min(max(initial_concurrency, min_concurrency), max_concurrency))
+        self.retries = retries
+        self._latency_target = latency_target
+        self._decrease_factor = decrease_factor
+        self._cooldown = cooldown
+        self._backoff_base = backoff_base
+        self._backoff_max = backoff_max
+        self._clock = clock
+        self._rng = rng
+        self._last_decrease = None
+        self._in_flight = 0
+        self._condition = asyncio.Condition()
+
+    @property
+    def limit(self):
+        '''
+        Current number of requests allowed in flight.
+        '''
+
+        return int(self._limit)
+
+    @property
+    def in_flight(self):
+        return self._in_flight
+
+    @property
+    def max_concurrency(self):
+        return self._max
+
+    async def __aenter__(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._in_flight < self.limit)
+            self._in_flight += 1
+        return self
+
+    async def __aexit__(self, *err):
+        async with self._condition:
+            self._in_flight -= 1
+            self._condition.notify_all()
+
+    def on_success(self, latency):
+        '''
+        Record a successful response which took latency seconds.
+        '''
+
+        if self._latency_target is not None and latency > self._latency_target:
+            self._decrease()
+        elif self._in_flight >= self.limit:
+            self._limit = min(self._max, self._limit + 1 / self._limit)
+
+    def on_throttle(self):
+        '''
+        Record a throttled response.
+        '''
+
+        self._decrease()
+
+    def backoff_delay(self, attempt, retry_after=None):
+        '''
+        Return how long to wait before retry number attempt (starting from 0).
+        Retry-After from the server always wins, otherwise use
+        exponential backoff with full jitter.
+        '''
+
+        if retry_after is not None:
+            return retry_after
+
+        return self._rng() * min(self._backoff_max, self._backoff_base * 2 ** attempt)
+
+    def _decrease(self):
+        now = self._clock()
+        if self._last_decrease is not None and now - self._last_decrease < self._cooldown:
+            return
+
+        self._last_decrease = now
+        self._limit = max(self._min, self._limit * self._decrease_factor)
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module schedules non-blocking calls with bounded concurrency.
+"""
+
+import asyncio
+import time
+
+
+class RateLimiter:
+    '''
+    Space out calls so that at most rate calls are started per second.
+
+    Usage:
+    limiter = RateLimiter(50)
+    await limiter.wait()
+    # code to start a call
+    '''
+
+    def __init__(self, rate, clock=time.monotonic):
+        self._interval = 1 / rate
+        self._clock = clock
+        self._next_start = 0
+
+    async def wait(self):
+        now = self._clock()
+        start = max(now, self._next_start)
+        self._next_start = start + self._interval
+
+        if start > now:
+            await asyncio.sleep(start - now)
+
+
+async def map_bounded(func, items, concurrency, rate_limit=None):
+    '''
+    Call func on every item, keeping exactly concurrency calls in flight
+    until items run out. A new call starts as soon as any call finishes,
+    so one slow call does not hold back the others.
+
+    If rate_limit is set, at most rate_limit calls are started per second.
+
+    Return a dictionary with each item as key and the result of func as value.
+    If any call raises an exception, the remaining calls are cancelled
+    and the exception is propagated.
+    '''
+
+    return {item: result async for item, result in \
+                iter_bounded(func, items, concurrency, rate_limit)}
+
+async def iter_bounded(func, items, concurrency, rate_limit=None):
+    '''
+    This is the streaming version of map_bounded.
+
+    items can be any iterable or async iterable, it is consumed lazily.
+    Yield (item, result) pairs in the order they complete.
+
+    At most concurrency results are buffered, once the buffer is full
+    no new item is taken until the caller consumes some results.
+    '''
+
+    queue = asyncio.Queue(maxsize=concurrency)
+    next_item = _item_getter(items)
+    limiter = RateLimiter(rate_limit) if rate_limit else None
+
+    async def worker():
+        try:
+            while True:
+                try:
+                    item = await next_item()
+                except StopAsyncIteration:
+                    break
+
+                if limiter is not None:
+                    await limiter.wait()
+                await queue.put((item, await func(item)))
+        except Exception as e:
+            await queue.put(_Failure(e))
+        else:
+            await queue.put(_DONE)
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        finished = 0
+        while finished < len(workers):
+            entry = await queue.get()
+
+            if entry is _DONE:
+                finished += 1
+            elif isinstance(entry, _Failure):
+                raise entry.error
+            else:
+                yield entry
+    finally:
+        for task in workers:
+            task.cancel()
+
+def _item_getter(items):
+    '''
+    Return a coroutine function which takes the next item from
+    an iterable or async iterable. It raises StopAsyncIteration
+    once items run out, and is safe to call from multiple workers.
+    '''
+
+    if hasattr(items, '__aiter__'):
+        iterator = items.__aiter__()
+        lock = asyncio.Lock()
+
+        # An async iterator cannot be advanced by two workers at the same time.
+        async def next_item():
+            async with lock:
+                return await iterator.__anext__()
+    else:
+        iterator = iter(items)
+
+        async def next_item():
+            try:
+                return next(iterator)
+            except StopIteration:
+                raise StopAsyncIteration
+
+    return next_item
+
+
+class _Failure:
+    '''
+    Wrap an exception raised by a worker so that it can be sent through the queue.
+    '''
+
+    def __init__(self, error):
+        self.error = error
+
+
+_DONE = object()
@@ -0,0 +1,155 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module serves ranges in the same format as Pwned Passwords API,
+so that every service on a node can share one warm cache.
+
+Usage: # python -m passpwnedcheck.server --corpus pwned.bin --port 8080
+"""
+
+import argparse
+import asyncio
+import string
+
+import aiohttp
+from aiohttp import web
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.cache import AsyncCacheBackend, RangeCache, encode_range
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from passpwnedcheck.ranges import RawRange
+from passpwnedcheck.rate_control import AdaptiveRateController
+from passpwnedcheck.session_manager import SessionManager
+
+
+class RangeServer:
+    '''
+    Serve /range/{prefix} like Pwned Passwords API does.
+
+    Ranges are read from a LocalCorpus if one is passed in and it has
+    records for the prefix. Otherwise, if a session is passed in, they are
+    fetched from upstream url, and concurrent requests for the same prefix
+    share one upstream request. Served ranges are kept in cache as a RawRange,
+    so a range cached in memory is served without parsing or encoding it again.
+    Any CacheBackend or AsyncCacheBackend can be used, such as DiskRangeCache
+    or RedisRangeCache, their ranges are encoded back into bytes when served.
+
+    Usage:
+    server = RangeServer(corpus=corpus, session=session)
+    web.run_app(server.create_app(), port=8080)
+
+    # In each service
+    pass_checker = PassChecker(url='http://localhost:8080/range/')
+    '''
+
+    def __init__(self, corpus=None, session=None, cache=None, rate_controller=None, url=constants.URL):
+        self._corpus = corpus
+        self._cache = cache if cache is not None else RangeCache()
+        self._upstream = None
+
+        if session is not None:
+            self._upstream = PassCheckerAsync(session, rate_controller=rate_controller, url=url)
+
+    def create_app(self):
+        '''
+        Create an aiohttp application serving ranges.
+        '''
+
+        app = web.Application()
+        app.router.add_get('/range/{prefix}', self.handle)
+        return app
+
+    async def handle(self, request):
+        prefix = request.match_info['prefix'].upper()
+        if len(prefix) != 5 or not all(char in string.hexdigits for char in prefix):
+            return web.Response(status=constants.STATUS_CODE_BAD_REQUEST,
+                                text=constants.PREFIX_FORMAT_ERROR_MSG + prefix)
+
+        try:
+            body = await self.get_body(prefix)
+        except (ConnectionError, aiohttp.ClientError, asyncio.TimeoutError) as e:
+            return web.Response(status=constants.STATUS_CODE_BAD_GATEWAY,
+                                text=constants.CONNECTION_ERROR_MSG + str(e))
+
+        return web.Response(body=body, content_type='text/plain')
+
+    async def get_body(self, prefix):
+        '''
+        Return the range of a prefix as bytes, from cache if possible.
+        '''
+
+        cached_range = await self._cache_call(self._cache.get, prefix)
+        if cached_range is not None:
+            return encode_range(cached_range, compress=False)
+
+        body = None
+        if self._corpus is not None:
+            body = self._corpus.read_range(prefix)
+
+        if not body and self._upstream is not None:
+            body = (await self._upstream.get_range(prefix)).body
+
+        body = body or b''
+        await self._cache_call(self._cache.set, prefix, RawRange(body))
+
+        return body
+
+    async def _cache_call(self, method, *args):
+        result = method(*args)
+        if isinstance(self._cache, AsyncCacheBackend):
+            result = await result
+
+        return result
+
+
+async def serve(args):
+    '''
+    Run the server until it is interrupted.
+    '''
+
+    corpus = LocalCorpus(args.corpus) if args.corpus else None
+
+    try:
+        async with SessionManager() as manager:
+            session = None if args.offline else manager.get_session()
+            controller = AdaptiveRateController(max_concurrency=args.concurrency)
+            server = RangeServer(corpus, session, RangeCache(args.cache_size, args.cache_ttl),
+                                    controller, args.upstream)
+
+            runner = web.AppRunner(server.create_app())
+            await runner.setup()
+            try:
+                await web.TCPSite(runner, args.host, args.port).start()
+                print(constants.SERVER_STARTED_MSG.format(args.host, args.port), flush=True)
+                await asyncio.Event().wait()
+            finally:
+                await runner.cleanup()
+    finally:
+        if corpus is not None:
+            corpus.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve ranges in the same format as Pwned Passwords API.')
+    parser.add_argument('--host', default=constants.SERVER_HOST)
+    parser.add_argument('--port', type=int, default=constants.SERVER_PORT)
+    parser.add_argument('--corpus', help='Serve ranges from this local corpus first')
+    parser.add_argument('--offline', action='store_true', help='Never fetch ranges from upstream')
+    parser.add_argument('--upstream', default=constants.URL, help='Range API to fetch missing ranges from')
+    parser.add_argument('--concurrency', type=int, default=constants.RATE_MAX_CONCURRENCY,
+                        help='Maximum number of upstream requests in flight')
+    parser.add_argument('--cache-size', type=int, default=constants.CACHE_MAX_SIZE,
+                        help='Maximum number of ranges kept in memory')
+    parser.add_argument('--cache-ttl', type=float, default=constants.CACHE_TTL,
+                        help='Seconds before a cached range is fetched again')
+    args = parser.parse_args(argv)
+
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -1,10 +1,17 @@
 # -*- coding: utf-8 -*-
 
 """
-This module helps manage asyncio session.
+This module helps manage asyncio session,
+and creates pooled session for blocking calls.
 """
 
 import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.instrumentation import create_trace_config
 
 
 class SessionManager:
@@ -13,10 +20,14 @@ class SessionManager:
     async with SessionManager() as manager:
         session = manager.get_session()
         # code to use session
+
+    If instrumentation is passed in, dns and connect timings
+    of the session are reported to it.
     '''
 
-    def __init__(self):
+    def __init__(self, instrumentation=None):
         self._session = None
+        self._instrumentation = instrumentation
 
     def get_session(self):
         if not self._session:
@@ -25,9 +36,42 @@ class SessionManager:
         return self._session
 
     async def __aenter__(self):
-        self._session = aiohttp.ClientSession()
+        trace_configs = []
+        if self._instrumentation is not None:
+            trace_configs.append(create_trace_config(self._instrumentation))
+
+        self._session = aiohttp.ClientSession(trace_configs=trace_configs)
         return self
 
     async def __aexit__(self, *err):
         await self._session.close()
         self._session = None
+
+
+def create_pooled_session(pool_size=constants.POOL_SIZE, retries=constants.RETRIES, retry_reads=True,
+                            retry_statuses=True):
+    '''
+    Create a requests.Session which keeps up to pool_size connections alive.
+
+    Requests failing with connection errors or with one of
+    constants.RETRY_STATUS_CODES are retried up to retries times,
+    with exponential backoff and honoring the Retry-After header.
+    If retry_reads is False, read timeouts are raised right away
+    as requests.exceptions.ReadTimeout instead of being retried.
+    If retry_statuses is False, error responses are returned right away.
+    '''
+
+    retry = Retry(
+        total=retries,
+        read=None if retry_reads else False,
+        backoff_factor=constants.RETRY_BACKOFF_FACTOR,
+        status_forcelist=constants.RETRY_STATUS_CODES if retry_statuses else (),
+        raise_on_status=False
+    )
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+
+    return session
@@ -4,6 +4,10 @@
 Helper methods used by both pass_checker and pass_checker_async
 '''
 
+import heapq
+import itertools
+import pickle
+import tempfile
 from hashlib import sha1
 
 import passpwnedcheck.constants as constants
@@ -26,6 +30,84 @@ def get_password_prefix_suffix(password):
     hash = sha1(password.encode('utf-8')).hexdigest()
     return hash[:5].upper(), hash[5:].upper()
 
+def get_hash_prefix_suffix(hash):
+    '''
+    Calculate prefix and suffix for a precomputed SHA-1 hash,
+    either 40 hex characters or 20 raw bytes.
+
+    This skips hashing, so that the password itself is never needed.
+    '''
+
+    if isinstance(hash, (bytes, bytearray)) and len(hash) == constants.DIGEST_SIZE:
+        hash = hash.hex()
+
+    elif not _is_hex_hash(hash):
+        raise ValueError(constants.HASH_FORMAT_ERROR_MSG + repr(hash))
+
+    hash = hash.upper()
+    return hash[:5], hash[5:]
+
+def get_password_digest(password):
+    '''
+    Return the raw 20-byte SHA-1 hash of password.
+    '''
+
+    if not isinstance(password, str):
+        raise TypeError(constants.PASSWORD_FORMAT_ERROR_MSG)
+
+    return sha1(password.encode('utf-8')).digest()
+
+def get_hash_digest(hash):
+    '''
+    Return a precomputed SHA-1 hash, either 40 hex characters
+    or 20 raw bytes, as 20 raw bytes.
+    '''
+
+    if isinstance(hash, (bytes, bytearray)) and len(hash) == constants.DIGEST_SIZE:
+        return bytes(hash)
+
+    if not _is_hex_hash(hash):
+        raise ValueError(constants.HASH_FORMAT_ERROR_MSG + repr(hash))
+
+    return bytes.fromhex(hash)
+
+def get_digest_prefix_suffix(digest):
+    '''
+    Calculate prefix and suffix for a raw 20-byte SHA-1 hash.
+    '''
+
+    hash = digest.hex().upper()
+    return hash[:5], hash[5:]
+
+def _is_hex_hash(hash):
+    '''
+    Check if hash is exactly 40 hex characters.
+    '''
+
+    if not isinstance(hash, str) or len(hash) != constants.DIGEST_SIZE * 2:
+        return False
+
+    try:
+        # Whitespace is skipped by fromhex, so it would give fewer bytes.
+        return len(bytes.fromhex(hash)) == constants.DIGEST_SIZE
+    except ValueError:
+        return False
+
+def group_by_prefix(keys, get_prefix_suffix=get_password_prefix_suffix):
+    '''
+    Group passwords, or hashes if get_prefix_suffix is get_hash_prefix_suffix, by prefix.
+
+    Return a dictionary with each prefix as key,
+    and a list of (key, suffix) pairs as value.
+    '''
+
+    groups = {}
+    for key in keys:
+        prefix, suffix = get_prefix_suffix(key)
+        groups.setdefault(prefix, []).append((key, suffix))
+
+    return groups
+
 def response_to_dict(text):
     '''
     Convert response data from string to dictionary format.
@@ -37,6 +119,117 @@ def response_to_dict(text):
     if not text:
         return {}
 
-    # Create dictionary using dictionary comprehesion.
-    return {row.split(constants.DELIMITER)[0]: int(row.split(constants.DELIMITER)[-1]) \
-                for row in text.split(constants.LINE_BREAK)}
+    # Split each row only once, on the first delimiter.
+    rows = (row.partition(constants.DELIMITER) for row in text.split(constants.LINE_BREAK))
+    return {suffix: int(count) for suffix, _, count in rows}
+
+def dict_to_response(response_dict):
+    '''
+    Convert dictionary back to response data in string format.
+    This is the reverse of response_to_dict.
+    '''
+
+    return constants.LINE_BREAK.join(suffix + constants.DELIMITER + str(count) \
+                for suffix, count in response_dict.items())
+
+def find_suffix_count(body, suffix):
+    '''
+    Find the count of a suffix directly in the raw response data in bytes.
+
+    This avoids decoding the response and building a dictionary
+    when only one suffix needs to be looked up.
+    Return None if the suffix is not in the response.
+    '''
+
+    needle = suffix.encode('ascii') + constants.DELIMITER_BYTES
+    start = body.find(needle)
+
+    # A match must be at the start of a line.
+    while start > 0 and body[start - 1] != constants.NEWLINE_BYTE:
+        start = body.find(needle, start + 1)
+
+    if start < 0:
+        return None
+
+    start += len(needle)
+    end = body.find(b'\n', start)
+    return int(body[start:end if end >= 0 else None])
+
+def bisect_records(buffer, key, record_size, size, offset=0, lo=0):
+    '''
+    Binary search in a buffer of fixed-width records sorted by their leading bytes.
+
+    Return the index of the first record from lo whose leading len(key) bytes
+    are not less than key, or size if there is no such record.
+    '''
+
+    hi = size
+    key_size = len(key)
+
+    while lo < hi:
+        mid = (lo + hi) // 2
+        start = offset + mid * record_size
+        if buffer[start:start+key_size] < key:
+            lo = mid + 1
+        else:
+            hi = mid
+
+    return lo
+
+
+class ExternalSorter:
+    '''
+    Sort items which may not fit in memory.
+
+    Items are sorted in chunks of chunk_size, each chunk after
+    the first one is spilled to a temporary file, and all chunks
+    are merged lazily. Items are compared by key if it is not None,
+    like in sorted. Temporary files are removed on exit.
+    '''
+
+    def __init__(self, chunk_size, key=None):
+        self._chunk_size = chunk_size
+        self._key = key
+        self._files = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *err):
+        for f in self._files:
+            f.close()
+
+    def sort(self, items):
+        iterator = iter(items)
+        chunk = sorted(itertools.islice(iterator, self._chunk_size), key=self._key)
+
+        # Everything fits in one chunk, no need to touch the disk.
+        peek = list(itertools.islice(iterator, 1))
+        if not peek:
+            return iter(chunk)
+
+        chunks = []
+        iterator = itertools.chain(peek, iterator)
+
+        while chunk:
+            chunks.append(self._spill(chunk))
+            chunk = sorted(itertools.islice(iterator, self._chunk_size), key=self._key)
+
+        return heapq.merge(*chunks, key=self._key)
+
+    def _spill(self, chunk):
+        f = tempfile.TemporaryFile()
+        self._files.append(f)
+
+        for item in chunk:
+            pickle.dump(item, f, pickle.HIGHEST_PROTOCOL)
+        f.seek(0)
+
+        return self._load(f)
+
+    def _load(self, f):
+        while True:
+            try:
+                yield pickle.load(f)
+            except EOFError:
+                return
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+"""
+This module looks up many hashes at once against a local corpus,
+using NumPy. Install it with: pip install passpwnedcheck[numpy]
+"""
+
+import passpwnedcheck.constants as constants
+from passpwnedcheck.utils import get_password_digest
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+def hash_passwords(passwords):
+    '''
+    Hash passwords into an array of raw 20-byte SHA-1 hashes.
+    passwords can be any iterable, it is only read once.
+    '''
+
+    _ensure_numpy()
+
+    return np.array([get_password_digest(password) for password in passwords],
+                        dtype=constants.DIGEST_DTYPE)
+
+def lookup_digests(corpus, digests):
+    '''
+    Look up raw 20-byte SHA-1 hashes in a LocalCorpus.
+
+    digests can be a sequence of bytes, an array of 20-byte strings
+    or an (n, 20) array of uint8. All hashes are resolved in one
+    vectorized binary search over the memory-mapped corpus.
+
+    Return an array of counts, 0 for hashes which cannot be found.
+    '''
+
+    _ensure_numpy()
+
+    digests = _as_digest_array(digests)
+    records = np.frombuffer(corpus.view(), dtype=np.dtype(constants.RECORD_DTYPE))
+
+    indexes = np.searchsorted(records['digest'], digests)
+    found = indexes < len(records)
+    found[found] = records['digest'][indexes[found]] == digests[found]
+
+    counts = np.zeros(len(digests), dtype=np.uint32)
+    counts[found] = records['count'][indexes[found]]
+
+    return counts
+
+def lookup_passwords(corpus, passwords):
+    '''
+    Hash passwords and look them up in a LocalCorpus.
+    Return an array of counts, in the same order as passwords.
+    '''
+
+    return lookup_digests(corpus, hash_passwords(passwords))
+
+def _as_digest_array(digests):
+    digests = np.asarray(digests)
+
+    if digests.dtype == np.uint8 and digests.ndim == 2 and digests.shape[1] == constants.DIGEST_SIZE:
+        return np.ascontiguousarray(digests).view(constants.DIGEST_DTYPE).ravel()
+
+    if digests.dtype.kind == 'S' and digests.ndim == 1 and digests.dtype.itemsize <= constants.DIGEST_SIZE:
+        return digests.astype(constants.DIGEST_DTYPE)
+
+    raise ValueError(constants.DIGEST_ARRAY_ERROR_MSG)
+
+def _ensure_numpy():
+    if np is None:
+        raise ImportError(constants.NUMPY_MISSING_ERROR_MSG)
@@ -29,6 +29,8 @@ setup(
         'License :: OSI Approved :: MIT License',
         'Operating System :: OS Independent',
     ],
+    python_requires='>=3.9',
     install_requires=requires,
+    extras_require={'numpy': ['numpy>=1.17']},
     tests_require=test_requirements,
 )
\ No newline at end of file
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+
+"""
+Helpers shared by the tests.
+"""
+
+from hashlib import sha1
+
+from passpwnedcheck.local_corpus import build_corpus
+
+
+def hash_password(password):
+    '''
+    Return the SHA-1 hash of password in upper case hex.
+    '''
+
+    return sha1(password.encode('utf-8')).hexdigest().upper()
+
+def leaked_passwords(stop):
+    '''
+    Return every third password of password0 to password{stop - 1},
+    with a distinct count for each.
+    '''
+
+    return {'password{}'.format(i): i + 1 for i in range(0, stop, 3)}
+
+def make_corpus(tmp_path, counts, extra_lines=()):
+    '''
+    Build a binary corpus in tmp_path from a dictionary of passwords
+    and counts, plus any extra lines in the format HASH:COUNT.
+    Return the path of the binary corpus.
+    '''
+
+    source = tmp_path / 'pwned.txt'
+    dest = tmp_path / 'pwned.bin'
+
+    lines = ['{}:{}'.format(hash_password(password), count) for password, count in counts.items()]
+    source.write_text('\r\n'.join(lines + list(extra_lines)))
+    build_corpus(source, dest)
+
+    return dest
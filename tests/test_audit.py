@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for audit.
+"""
+
+import passpwnedcheck.constants as constants
+import pytest
+from passpwnedcheck.audit import audit
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.ranges import CompactRange
+from passpwnedcheck.utils import group_by_prefix
+
+from tests.conftest import hash_password, leaked_passwords, make_corpus
+
+leaked = leaked_passwords(200)
+records = [(i, 'password{}'.format(i)) for i in range(200)]
+expected = sorted((i, leaked[password]) for i, password in records if password in leaked)
+
+
+class FakeRangeSource:
+    '''
+    Serve ranges built from leaked passwords, like PassChecker.get_range.
+    '''
+
+    def __init__(self):
+        self.ranges = {prefix: CompactRange.from_mapping({suffix: leaked[password] for password, suffix in group}) \
+                            for prefix, group in group_by_prefix(leaked).items()}
+        self.prefixes = []
+
+    def get_range(self, prefix):
+        self.prefixes.append(prefix)
+        return self.ranges.get(prefix, {})
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    with LocalCorpus(make_corpus(tmp_path, leaked)) as corpus:
+        yield corpus
+
+
+@pytest.mark.parametrize('chunk_size', [1000, 7])
+def test_audit_corpus(corpus, chunk_size):
+    '''
+    Can audit records against a local corpus, in memory or with external sort.
+    '''
+
+    results = list(audit(records, corpus, chunk_size=chunk_size))
+
+    assert sorted(results) == expected
+
+
+def test_audit_corpus_hashes(corpus):
+    '''
+    Can audit records which are already hashed.
+    '''
+
+    hashed_records = [(i, hash_password(password)) for i, password in records]
+
+    results = list(audit(hashed_records, corpus, is_hash=True, chunk_size=10))
+
+    assert sorted(results) == expected
+
+
+@pytest.mark.parametrize('chunk_size', [1000, 7])
+def test_audit_ranges(chunk_size):
+    '''
+    Can audit records against ranges, fetching each prefix once and in order.
+    '''
+
+    source = FakeRangeSource()
+
+    results = list(audit(records, source, chunk_size=chunk_size))
+
+    assert sorted(results) == expected
+    assert source.prefixes == sorted(set(source.prefixes))
+    assert len(source.prefixes) == len(group_by_prefix(password for _, password in records))
+
+
+def test_audit_wronghash_password(corpus):
+    '''
+    If a hash is not 40 hex characters, raise exception.
+    '''
+
+    hash = hash_password('password')
+    for value in ['5BAA6', 'not a hash', None, hash[:20] + ' ' + hash[20:]]:
+        with pytest.raises(ValueError) as ve:
+            list(audit([(0, value)], corpus, is_hash=True))
+        assert str(ve.value) == constants.HASH_FORMAT_ERROR_MSG + repr(value)
+
+
+@pytest.mark.parametrize('chunk_size', [1000, 1])
+def test_audit_duplicate_hashes(corpus, chunk_size):
+    '''
+    Records sharing a hash are reported, even if their ids cannot be compared.
+    '''
+
+    duplicates = [({'id': 1}, 'password0'), ({'id': 2}, 'password0'), ({'id': 3}, 'password1')]
+
+    results = list(audit(duplicates, corpus, chunk_size=chunk_size))
+
+    assert results == [({'id': 1}, 1), ({'id': 2}, 1)]
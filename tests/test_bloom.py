@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for bloom.
+"""
+
+import random
+from unittest.mock import Mock
+
+import passpwnedcheck.bloom as bloom
+import pytest
+from passpwnedcheck.bloom import BloomFilter, bloom_size, build_bloom_filter
+from passpwnedcheck.downloader import RangeStore
+from passpwnedcheck.local_corpus import LocalCorpus, build_corpus
+from passpwnedcheck.pass_checker import PassChecker
+from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from requests.models import Response
+
+PASSWORD_HASH = '5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8'
+RESPONSE_TEXT = '1E4C9B93F3F0682250B6CF8331B7EE68FD8:9545824'
+
+
+def _random_digests(count, seed):
+    rng = random.Random(seed)
+    return [rng.getrandbits(160).to_bytes(20, 'big') for _ in range(count)]
+
+
+def test_bloom_size():
+    '''
+    Size grows with the number of hashes and the precision.
+    '''
+
+    assert bloom_size(1000, 0.01) == (9586, 7)
+    assert bloom_size(1000, 0.1) == (4793, 3)
+
+    with pytest.raises(ValueError):
+        bloom_size(1000, 0)
+
+
+@pytest.mark.parametrize('use_numpy', [True, False])
+def test_build_bloom_filter(tmp_path, monkeypatch, use_numpy):
+    '''
+    Every hash is found, and other hashes are found at about the false positive rate.
+    '''
+
+    # Arrange
+    if not use_numpy:
+        monkeypatch.setattr(bloom, 'np', None)
+    elif bloom.np is None:
+        pytest.skip('NumPy is not installed')
+
+    digests = _random_digests(5000, 0)
+    others = _random_digests(20000, 1)
+
+    # Act
+    size = build_bloom_filter(digests, len(digests), tmp_path / 'pwned.bloom', 0.01)
+
+    # Assert
+    with BloomFilter(tmp_path / 'pwned.bloom') as prefilter:
+        assert size == (prefilter.bits + 7) // 8
+        assert all(prefilter.might_contain(digest) for digest in digests)
+        assert sum(map(prefilter.might_contain, others)) / len(others) < 0.02
+
+
+def test_build_bloom_filter_same_file(tmp_path, monkeypatch):
+    '''
+    Filters built with and without NumPy are identical.
+    '''
+
+    if bloom.np is None:
+        pytest.skip('NumPy is not installed')
+
+    digests = _random_digests(1000, 0)
+    build_bloom_filter(digests, len(digests), tmp_path / 'numpy.bloom')
+    monkeypatch.setattr(bloom, 'np', None)
+    build_bloom_filter(digests, len(digests), tmp_path / 'python.bloom')
+
+    assert (tmp_path / 'numpy.bloom').read_bytes() == (tmp_path / 'python.bloom').read_bytes()
+
+
+def test_bloom_filter_wrong_format(tmp_path):
+    '''
+    Files which were not created by build_bloom_filter are rejected.
+    '''
+
+    path = tmp_path / 'pwned.bloom'
+    path.write_bytes(b'not a bloom filter')
+
+    with pytest.raises(ValueError):
+        BloomFilter(path)
+
+
+def test_build_from_sources(tmp_path):
+    '''
+    Filters can be built from a local corpus or from downloaded ranges.
+    '''
+
+    # Arrange
+    source = tmp_path / 'pwned.txt'
+    source.write_text(PASSWORD_HASH + ':9545824')
+    build_corpus(source, tmp_path / 'pwned.bin')
+
+    with RangeStore(str(tmp_path / 'ranges.db')) as store, LocalCorpus(tmp_path / 'pwned.bin') as corpus:
+        store.put('5BAA6', RESPONSE_TEXT.encode('ascii') + b'\r\n', None)
+
+        # Act
+        build_bloom_filter(corpus.digests(), len(corpus), tmp_path / 'corpus.bloom')
+        build_bloom_filter(store.digests(), store.count_records(), tmp_path / 'store.bloom')
+
+        # Assert
+        assert store.count_records() == 1
+        assert (tmp_path / 'corpus.bloom').read_bytes() == (tmp_path / 'store.bloom').read_bytes()
+
+
+def test_pass_checker_prefilter(tmp_path):
+    '''
+    Passwords ruled out by the prefilter are answered without a request.
+    '''
+
+    # Arrange
+    build_bloom_filter([bytes.fromhex(PASSWORD_HASH)], 1, tmp_path / 'pwned.bloom')
+
+    response = Response()
+    response.status_code = 200
+    response._content = RESPONSE_TEXT.encode('ascii')
+    session = Mock()
+    session.get.return_value = response
+
+    with BloomFilter(tmp_path / 'pwned.bloom') as prefilter:
+        pc = PassChecker(session=session, prefilter=prefilter)
+
+        # Act
+        single_results = [pc.is_password_compromised('dummypassword'), pc.is_password_compromised('password')]
+        results = pc.is_passwords_compromised(['dummypassword', 'password'])
+
+    # Assert
+    assert single_results == [(False, 0), (True, 9545824)]
+    assert results == {'dummypassword': 0, 'password': 9545824}
+    assert session.get.call_count == 2
+
+
+@pytest.mark.asyncio
+async def test_pass_checker_async_prefilter(tmp_path):
+    '''
+    PassCheckerAsync skips requests for passwords ruled out by the prefilter.
+    '''
+
+    # Arrange
+    build_bloom_filter([bytes.fromhex(PASSWORD_HASH)], 1, tmp_path / 'pwned.bloom')
+    session = Mock()
+
+    with BloomFilter(tmp_path / 'pwned.bloom') as prefilter:
+        pc = PassCheckerAsync(session, prefilter=prefilter)
+
+        # Act
+        single_results = await pc.is_password_compromised('dummypassword')
+        results = await pc.is_passwords_compromised(['dummypassword', 'letmein'])
+
+    # Assert
+    assert single_results == (False, 0)
+    assert results == {'dummypassword': 0, 'letmein': 0}
+    assert session.get.call_count == 0
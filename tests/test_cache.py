@@ -0,0 +1,367 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for cache.
+"""
+
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import Mock
+
+import passpwnedcheck.constants as constants
+import pytest
+from passpwnedcheck.cache import (AsyncCacheBackend, AsyncRedisRangeCache, CacheBackend, DiskRangeCache,
+                                  RangeCache, RedisRangeCache)
+from passpwnedcheck.pass_checker import PassChecker
+from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from requests.models import Response
+
+RESPONSE_DICT = {
+    '1E4C9B93F3F0682250B6CF8331B7EE68FD8': 9545824,
+    '00F8AFEB99401868422C69E1A119902366A': 1
+}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+class FakeRedis:
+    '''
+    In-process stand-in for a Redis client, counting round trips.
+    '''
+
+    def __init__(self, clock):
+        self._clock = clock
+        self._values = {}
+        self.round_trips = 0
+
+    def get(self, key):
+        return self.mget([key])[0]
+
+    def mget(self, keys):
+        self.round_trips += 1
+        values = [self._values.get(key, (None, None)) for key in keys]
+        return [value if expires is None or expires > self._clock() else None for value, expires in values]
+
+    def set(self, key, value, ex=None):
+        self.round_trips += 1
+        self._values[key] = (value, None if ex is None else self._clock() + ex)
+
+class FakeAsyncRedis(FakeRedis):
+    async def mget(self, keys):
+        return super().mget(keys)
+
+    async def set(self, key, value, ex=None):
+        super().set(key, value, ex)
+
+
+def test_get_set():
+    '''
+    Can store and retrieve ranges, counting hits and misses.
+    '''
+
+    cache = RangeCache()
+
+    assert cache.get('5BAA6') is None
+    cache.set('5BAA6', {'1E4C9B93F3F0682250B6CF8331B7EE68FD8': 1})
+
+    assert cache.get('5BAA6') == {'1E4C9B93F3F0682250B6CF8331B7EE68FD8': 1}
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_ttl():
+    '''
+    Entries expire after ttl seconds.
+    '''
+
+    clock = FakeClock()
+    cache = RangeCache(ttl=10, clock=clock)
+    cache.set('5BAA6', {})
+
+    clock.now = 9
+    assert cache.get('5BAA6') == {}
+
+    clock.now = 10
+    assert cache.get('5BAA6') is None
+    assert len(cache) == 0
+
+
+def test_no_ttl():
+    '''
+    If ttl is None, entries never expire.
+    '''
+
+    clock = FakeClock()
+    cache = RangeCache(ttl=None, clock=clock)
+    cache.set('5BAA6', {})
+
+    clock.now = 10 ** 9
+    assert cache.get('5BAA6') == {}
+
+
+def test_lru_eviction():
+    '''
+    The least recently used entry is evicted when the cache is full.
+    '''
+
+    cache = RangeCache(max_size=2)
+    cache.set('00000', {})
+    cache.set('00001', {})
+
+    # Touch 00000 so that 00001 becomes the least recently used.
+    cache.get('00000')
+    cache.set('00002', {})
+
+    assert cache.get('00000') == {}
+    assert cache.get('00001') is None
+    assert cache.get('00002') == {}
+
+
+def test_clear():
+    '''
+    Can remove all entries and reset counters.
+    '''
+
+    cache = RangeCache()
+    cache.set('5BAA6', {})
+    cache.get('5BAA6')
+    cache.clear()
+
+    assert len(cache) == 0
+    assert (cache.hits, cache.misses) == (0, 0)
+
+
+def test_wrong_size():
+    '''
+    If max_size is less than 1, raise exception.
+    '''
+
+    with pytest.raises(ValueError) as ve:
+        RangeCache(max_size=0)
+    assert str(ve.value) == constants.CACHE_SIZE_ERROR_MSG
+
+
+def test_disk_get_set(tmp_path):
+    '''
+    Ranges stored on disk survive across cache instances.
+    '''
+
+    path = str(tmp_path / 'ranges.db')
+    response_dict = {
+        '1E4C9B93F3F0682250B6CF8331B7EE68FD8': 9545824,
+        '00F8AFEB99401868422C69E1A119902366A': 1
+    }
+
+    cache = DiskRangeCache(path)
+    assert cache.get('5BAA6') is None
+    cache.set('5BAA6', response_dict)
+    cache.close()
+
+    other_cache = DiskRangeCache(path)
+    assert other_cache.get('5BAA6') == response_dict
+    assert len(other_cache) == 1
+    assert (other_cache.hits, other_cache.misses) == (1, 0)
+
+
+def test_disk_ttl(tmp_path):
+    '''
+    Ranges on disk expire after ttl seconds.
+    '''
+
+    clock = FakeClock()
+    cache = DiskRangeCache(str(tmp_path / 'ranges.db'), ttl=10, clock=clock)
+    cache.set('5BAA6', {})
+
+    clock.now = 9
+    assert cache.get('5BAA6') == {}
+
+    clock.now = 10
+    assert cache.get('5BAA6') is None
+
+
+def test_disk_threads(tmp_path):
+    '''
+    The same disk cache can be used from multiple threads.
+    '''
+
+    cache = DiskRangeCache(str(tmp_path / 'ranges.db'))
+    prefixes = ['{:05X}'.format(i) for i in range(50)]
+
+    def set_get(prefix):
+        cache.set(prefix, {prefix * 7: 1})
+        return cache.get(prefix)
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        results = list(executor.map(set_get, prefixes))
+
+    assert results == [{prefix * 7: 1} for prefix in prefixes]
+    assert len(cache) == len(prefixes)
+
+
+def test_disk_clear(tmp_path):
+    '''
+    Can remove all entries from disk.
+    '''
+
+    cache = DiskRangeCache(str(tmp_path / 'ranges.db'))
+    cache.set('5BAA6', {})
+    cache.clear()
+
+    assert len(cache) == 0
+    assert cache.get('5BAA6') is None
+
+
+def test_disk_get_many(tmp_path):
+    '''
+    Several prefixes can be looked up on disk at once.
+    '''
+
+    cache = DiskRangeCache(str(tmp_path / 'ranges.db'))
+    cache.set('5BAA6', RESPONSE_DICT)
+    cache.set('00000', {})
+
+    assert cache.get_many(['5BAA6', '00000', '12345']) == {'5BAA6': RESPONSE_DICT, '00000': {}}
+    assert (cache.hits, cache.misses) == (2, 1)
+
+
+def test_backend_get_many():
+    '''
+    By default, get_many looks up one prefix at a time.
+    '''
+
+    class DictCache(CacheBackend):
+        def __init__(self):
+            self.ranges = {'5BAA6': RESPONSE_DICT}
+
+        def get(self, prefix):
+            return self.ranges.get(prefix)
+
+        def set(self, prefix, value):
+            self.ranges[prefix] = value
+
+    assert DictCache().get_many(['5BAA6', '12345']) == {'5BAA6': RESPONSE_DICT}
+
+
+def test_backend_incomplete():
+    '''
+    Backends which do not implement get and set cannot be created.
+    '''
+
+    class GetOnlyCache(CacheBackend):
+        def get(self, prefix):
+            return None
+
+    class AsyncGetOnlyCache(AsyncCacheBackend):
+        async def get(self, prefix):
+            return None
+
+    for backend in [CacheBackend, GetOnlyCache, AsyncCacheBackend, AsyncGetOnlyCache]:
+        with pytest.raises(TypeError):
+            backend()
+
+
+@pytest.mark.parametrize('compress', [True, False])
+def test_redis_get_set(compress):
+    '''
+    Ranges are shared through a key-value store, optionally compressed, and expire after ttl.
+    '''
+
+    clock = FakeClock()
+    client = FakeRedis(clock)
+    cache = RedisRangeCache(client, ttl=10, compress=compress)
+    other_cache = RedisRangeCache(client, compress=not compress)
+
+    assert cache.get('5BAA6') is None
+    cache.set('5BAA6', RESPONSE_DICT)
+
+    body, _ = client._values[constants.SHARED_CACHE_KEY_PREFIX + '5BAA6']
+    assert (body[:1] == b'x') == compress
+    assert zlib.decompress(body) if compress else body
+
+    assert cache.get('5BAA6') == RESPONSE_DICT
+    assert other_cache.get('5BAA6') == RESPONSE_DICT
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    clock.now = 10
+    assert cache.get('5BAA6') is None
+
+
+def test_redis_get_many():
+    '''
+    Batch calls of PassChecker look up all prefixes in one round trip.
+    '''
+
+    # Arrange
+    client = FakeRedis(FakeClock())
+    cache = RedisRangeCache(client)
+    cache.set('5BAA6', RESPONSE_DICT)
+    cache.set('36632', {})
+    client.round_trips = 0
+
+    session = Mock()
+    pc = PassChecker(cache=cache, session=session)
+
+    # Act
+    results = pc.is_passwords_compromised(['password', 'dummypassword'])
+
+    # Assert
+    assert results == {'password': 9545824, 'dummypassword': 0}
+    assert client.round_trips == 1
+    assert session.get.call_count == 0
+
+
+def test_redis_get_many_missing():
+    '''
+    Prefixes missing from cache are fetched and stored.
+    '''
+
+    # Arrange
+    client = FakeRedis(FakeClock())
+    cache = RedisRangeCache(client)
+
+    response = Response()
+    response.status_code = 200
+    response._content = b'1E4C9B93F3F0682250B6CF8331B7EE68FD8:9545824'
+    session = Mock()
+    session.get.return_value = response
+    pc = PassChecker(cache=cache, session=session)
+
+    # Act
+    first_results = pc.is_passwords_compromised(['password'])
+    second_results = pc.is_passwords_compromised(['password'])
+
+    # Assert
+    assert first_results == second_results == {'password': 9545824}
+    assert session.get.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+@pytest.mark.asyncio
+async def test_async_redis():
+    '''
+    PassCheckerAsync can use an asynchronous key-value store.
+    '''
+
+    # Arrange
+    client = FakeAsyncRedis(FakeClock())
+    cache = AsyncRedisRangeCache(client)
+    await cache.set('5BAA6', RESPONSE_DICT)
+    await cache.set('36632', {})
+    client.round_trips = 0
+
+    session = Mock()
+    pc = PassCheckerAsync(session, cache=cache)
+
+    # Act
+    single_results = await pc.is_password_compromised('password')
+    results = await pc.is_passwords_compromised(['password', 'dummypassword'])
+
+    # Assert
+    assert single_results == (True, 9545824)
+    assert results == {'password': 9545824, 'dummypassword': 0}
+    assert client.round_trips == 2
+    assert session.get.call_count == 0
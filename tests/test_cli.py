@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for cli.
+"""
+
+import io
+import json
+
+import passpwnedcheck.cli as cli
+import passpwnedcheck.constants as constants
+from passpwnedcheck.ranges import RawRange
+
+from tests.conftest import hash_password, make_corpus
+
+PASSWORD_HASH = '5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8'
+
+
+def test_read_hashes():
+    '''
+    Passwords are hashed, empty lines are skipped and invalid hashes are reported.
+    '''
+
+    # Arrange
+    errors = []
+
+    # Act
+    passwords = list(cli.read_hashes(['password\n', '\n', 'letmein\r\n'], False, None))
+    hashes = list(cli.read_hashes([PASSWORD_HASH.lower() + '\n', 'zz\n'], True,
+                                    lambda number, error: errors.append(number)))
+
+    # Assert
+    assert passwords == [(1, PASSWORD_HASH), (3, hash_password('letmein'))]
+    assert hashes == [(1, PASSWORD_HASH)]
+    assert errors == [2]
+
+
+def test_create_writer():
+    '''
+    Results can be written as CSV or JSON lines, with hashes only if asked for.
+    '''
+
+    # Arrange
+    outputs = {(format, with_hash): io.StringIO() for format in ['csv', 'jsonl'] for with_hash in [False, True]}
+
+    # Act
+    for (format, with_hash), output in outputs.items():
+        cli.create_writer(output, format, with_hash)(1, PASSWORD_HASH, 3)
+
+    # Assert
+    assert outputs['csv', False].getvalue() == 'line,count\n1,3\n'
+    assert outputs['csv', True].getvalue() == 'line,hash,count\n1,{},3\n'.format(PASSWORD_HASH)
+    assert json.loads(outputs['jsonl', False].getvalue()) == {'line': 1, 'count': 3}
+    assert json.loads(outputs['jsonl', True].getvalue()) == {'line': 1, 'hash': PASSWORD_HASH, 'count': 3}
+
+
+def test_progress():
+    '''
+    Progress is shown at most once per interval, and when finished.
+    '''
+
+    # Arrange
+    now = [0]
+    stream = io.StringIO()
+    progress = cli.Progress(stream, interval=1, clock=lambda: now[0])
+
+    # Act
+    for count in [0, 5, 0]:
+        now[0] += 0.5
+        progress.update(count)
+    progress.finish()
+
+    # Assert
+    assert stream.getvalue() == constants.PROGRESS_MSG.format(2, 2, 1) + \
+                                constants.PROGRESS_MSG.format(3, 2, 1) + '\n'
+
+
+def test_main_offline(tmp_path, capsys):
+    '''
+    Passwords can be checked against a local corpus, without writing their hashes.
+    '''
+
+    # Arrange
+    corpus_path = make_corpus(tmp_path, {'password': 9545824, 'letmein': 285095})
+
+    source = tmp_path / 'passwords.txt'
+    source.write_text('password\nnot-leaked\n')
+
+    # Act
+    status = cli.main([str(source), '--corpus', str(corpus_path), '--quiet'])
+
+    # Assert
+    assert status == 0
+    assert capsys.readouterr().out.splitlines() == [
+        'line,count',
+        '1,9545824',
+        '2,0'
+    ]
+
+
+def test_main_online(tmp_path, monkeypatch):
+    '''
+    Each prefix is fetched once, and invalid lines are skipped.
+    '''
+
+    # Arrange
+    prefixes = []
+
+    class StubChecker:
+        def __init__(self, session, **kwargs):
+            pass
+
+        async def get_range(self, prefix):
+            prefixes.append(prefix)
+            return RawRange(PASSWORD_HASH[5:].encode('utf-8') + b':10')
+
+    monkeypatch.setattr(cli, 'PassCheckerAsync', StubChecker)
+
+    source = tmp_path / 'hashes.txt'
+    source.write_text('\n'.join([PASSWORD_HASH, 'zz', PASSWORD_HASH[:5] + '0' * 35, hash_password('letmein')]))
+    output = tmp_path / 'results.jsonl'
+
+    # Act
+    status = cli.main([str(source), '--hashes', '--format', 'jsonl', '-o', str(output), '--quiet'])
+
+    # Assert
+    results = [json.loads(line) for line in output.read_text().splitlines()]
+    assert status == 1
+    assert sorted(prefixes) == sorted([PASSWORD_HASH[:5], hash_password('letmein')[:5]])
+    assert sorted((r['line'], r['count']) for r in results) == [(1, 10), (3, 0), (4, 0)]
+    assert {r['line']: r['hash'] for r in results}[1] == PASSWORD_HASH
@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for deadline.
+"""
+
+import passpwnedcheck.constants as constants
+import pytest
+from passpwnedcheck.deadline import DeadlinePolicy
+
+
+def test_hedge_delay():
+    '''
+    Hedge delay is the configured percentile of recent latencies.
+    '''
+
+    policy = DeadlinePolicy(hedge_percentile=90, min_samples=10)
+
+    for latency in range(1, 10):
+        policy.record(latency / 100)
+    assert policy.hedge_delay() is None
+
+    policy.record(0.1)
+    assert policy.hedge_delay() == 0.09
+
+
+def test_hedge_delay_window():
+    '''
+    Only the most recent latencies are used.
+    '''
+
+    policy = DeadlinePolicy(hedge_percentile=50, min_samples=1, window=3)
+
+    for latency in [5, 5, 5, 1, 1, 1]:
+        policy.record(latency)
+
+    assert policy.hedge_delay() == 1
+
+
+def test_hedge_disabled():
+    '''
+    Without hedge_percentile, there is no hedging.
+    '''
+
+    policy = DeadlinePolicy(min_samples=1)
+    policy.record(1)
+
+    assert policy.hedge_delay() is None
+
+
+def test_on_deadline():
+    '''
+    Fail open returns an empty range, fail closed raises exception.
+    '''
+
+    assert DeadlinePolicy(fail_open=True).on_deadline() == {}
+
+    with pytest.raises(TimeoutError) as te:
+        DeadlinePolicy().on_deadline()
+    assert str(te.value) == constants.DEADLINE_ERROR_MSG
@@ -0,0 +1,184 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for downloader, against a local stub server.
+"""
+
+import hashlib
+
+import aiohttp
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from passpwnedcheck.downloader import CorpusDownloader, RangeStore, all_prefixes
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.rate_control import AdaptiveRateController
+
+ranges = {
+    '00000': b'0005AD76BD555C1D6D771DE417A4B87E4B4:10\r\n000A8DAE4228F821FB418F59826079BF368:4',
+    '00001': b'0007B4C8FCF6B8B4A0BE0B7ACEDA6AE0E5A:2',
+    '00002': b''
+}
+
+
+class StubServer:
+    '''
+    Serve ranges with an ETag and count requests per prefix.
+    Prefixes in fail always get 503 errors, prefixes in flaky
+    get that many 503 errors before succeeding.
+    '''
+
+    def __init__(self, ranges, fail=(), flaky=None):
+        self.ranges = dict(ranges)
+        self.fail = set(fail)
+        self.flaky = dict(flaky or {})
+        self.requests = []
+
+    async def handle(self, request):
+        prefix = request.match_info['prefix']
+        self.requests.append(prefix)
+
+        if self.flaky.get(prefix):
+            self.flaky[prefix] -= 1
+            return web.Response(status=503, text='Service Unavailable')
+
+        if prefix in self.fail:
+            return web.Response(status=503, text='Service Unavailable')
+
+        body = self.ranges[prefix]
+        etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+        if request.headers.get('If-None-Match') == etag:
+            return web.Response(status=304)
+
+        return web.Response(body=body, headers={'ETag': etag})
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/range/{prefix}', self.handle)
+        return app
+
+
+class FlakySession:
+    '''
+    Session whose first requests fail with a connection error.
+    '''
+
+    def __init__(self, session, failures):
+        self._session = session
+        self.failures = failures
+
+    def get(self, url, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            raise aiohttp.ClientConnectionError()
+
+        return self._session.get(url, **kwargs)
+
+
+async def _download(stub, store, refresh=False, failures=0):
+    async with TestServer(stub.app()) as server:
+        async with aiohttp.ClientSession() as session:
+            session = FlakySession(session, failures)
+            # Retry right away, to keep tests fast.
+            controller = AdaptiveRateController(max_concurrency=2, backoff_base=0.001)
+            downloader = CorpusDownloader(session, store, url=str(server.make_url('/range/')),
+                                            rate_controller=controller)
+            if refresh:
+                return await downloader.refresh()
+            return await downloader.download(prefixes=list(ranges))
+
+
+def test_all_prefixes():
+    '''
+    Every prefix is generated, in order.
+    '''
+
+    prefixes = list(all_prefixes())
+
+    assert len(prefixes) == 1048576
+    assert prefixes[:2] == ['00000', '00001']
+    assert prefixes[-1] == 'FFFFF'
+
+
+@pytest.mark.asyncio
+async def test_download(tmp_path):
+    '''
+    Can download ranges into a store and export them as a corpus.
+    '''
+
+    # Arrange
+    stub = StubServer(ranges)
+    corpus_path = tmp_path / 'pwned.bin'
+
+    with RangeStore(str(tmp_path / 'ranges.db')) as store:
+        # Act
+        downloaded = await _download(stub, store)
+        total = store.export_corpus(corpus_path)
+
+        # Assert
+        assert downloaded == 3
+        assert total == 3
+        for prefix, body in ranges.items():
+            assert store.get(prefix) == body
+
+    with LocalCorpus(corpus_path) as corpus:
+        assert corpus.get_count(bytes.fromhex('000000005AD76BD555C1D6D771DE417A4B87E4B4')) == 10
+        assert corpus.get_count(bytes.fromhex('000010007B4C8FCF6B8B4A0BE0B7ACEDA6AE0E5A')) == 2
+
+
+@pytest.mark.asyncio
+async def test_download_retry(tmp_path):
+    '''
+    Transient errors and connection errors are retried instead of stopping the download.
+    '''
+
+    stub = StubServer(ranges, flaky={'00000': 2, '00002': 3})
+
+    with RangeStore(str(tmp_path / 'ranges.db')) as store:
+        downloaded = await _download(stub, store, failures=1)
+
+        assert downloaded == 3
+        assert sorted(stub.requests) == ['00000'] * 3 + ['00001'] + ['00002'] * 4
+        for prefix, body in ranges.items():
+            assert store.get(prefix) == body
+
+
+@pytest.mark.asyncio
+async def test_download_resume(tmp_path):
+    '''
+    An interrupted download only fetches missing ranges when resumed.
+    '''
+
+    stub = StubServer(ranges, fail=['00002'])
+
+    with RangeStore(str(tmp_path / 'ranges.db')) as store:
+        with pytest.raises(ConnectionError):
+            await _download(stub, store)
+        stored = set(store.prefixes())
+
+        stub.fail.clear()
+        stub.requests.clear()
+        await _download(stub, store)
+
+        assert '00002' not in stored
+        assert sorted(stub.requests) == sorted(set(ranges) - stored)
+        assert len(store) == 3
+
+
+@pytest.mark.asyncio
+async def test_refresh(tmp_path):
+    '''
+    Refresh only stores ranges which have changed.
+    '''
+
+    stub = StubServer(ranges)
+
+    with RangeStore(str(tmp_path / 'ranges.db')) as store:
+        await _download(stub, store)
+
+        stub.ranges['00001'] = b'0007B4C8FCF6B8B4A0BE0B7ACEDA6AE0E5A:3'
+        changed = await _download(stub, store, refresh=True)
+
+        assert changed == 1
+        assert store.get('00001') == b'0007B4C8FCF6B8B4A0BE0B7ACEDA6AE0E5A:3'
+        assert store.get('00000') == ranges['00000']
@@ -0,0 +1,180 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for instrumentation.
+"""
+
+import asyncio
+from unittest.mock import Mock
+
+import passpwnedcheck.constants as constants
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from passpwnedcheck.cache import RangeCache
+from passpwnedcheck.instrumentation import Instrumentation, MetricsRecorder, timed
+from passpwnedcheck.pass_checker import PassChecker
+from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from passpwnedcheck.rate_control import AdaptiveRateController
+from passpwnedcheck.session_manager import SessionManager
+from requests.models import Response
+
+RESPONSE_TEXT = 'CBCD36D02E3B172B788D0CB372D168B30C3:1\r\n00F8AFEB99401868422C69E1A119902366A:1'
+
+
+def test_metrics_recorder():
+    '''
+    MetricsRecorder sums stage timings and counts events.
+    '''
+
+    # Arrange
+    metrics = MetricsRecorder()
+
+    # Act
+    metrics.on_stage(constants.STAGE_WAIT, 0.5)
+    metrics.on_stage(constants.STAGE_WAIT, 1.5)
+    metrics.on_bytes(100)
+    metrics.on_cache(True)
+    metrics.on_cache(False)
+    metrics.on_cache(False)
+    metrics.on_retry(429)
+    metrics.on_request_start()
+    metrics.on_request_start()
+    metrics.on_request_end()
+
+    # Assert
+    assert metrics.summary() == {
+        'stages': {constants.STAGE_WAIT: {'count': 2, 'seconds': 2.0, 'mean': 1.0}},
+        'bytes_received': 100,
+        'cache_hits': 1,
+        'cache_misses': 2,
+        'retries': 1,
+        'in_flight': 1,
+        'max_in_flight': 2
+    }
+
+
+def test_timed():
+    '''
+    timed reports how long a call took, even if it failed.
+    '''
+
+    # Arrange
+    instrumentation = Mock(spec=Instrumentation)
+
+    # Act
+    assert timed(None, constants.STAGE_HASH, max, 1, 2) == 2
+    assert timed(instrumentation, constants.STAGE_HASH, max, 1, 2) == 2
+    with pytest.raises(ValueError):
+        timed(instrumentation, constants.STAGE_PARSE, int, 'x')
+
+    # Assert
+    stages = [call.args[0] for call in instrumentation.on_stage.call_args_list]
+    assert stages == [constants.STAGE_HASH, constants.STAGE_PARSE]
+
+
+def test_pass_checker_instrumentation():
+    '''
+    PassChecker reports stages, bytes and cache lookups.
+    '''
+
+    # Arrange
+    response = Response()
+    response.status_code = 200
+    response._content = RESPONSE_TEXT.encode('utf-8')
+    session = Mock()
+    session.get.return_value = response
+    metrics = MetricsRecorder()
+    pc = PassChecker(cache=RangeCache(), session=session, instrumentation=metrics)
+
+    # Act
+    pc.is_password_compromised('dummypassword')
+    pc.is_passwords_compromised(['dummypassword'])
+
+    # Assert
+    summary = metrics.summary()
+    assert {stage: stats['count'] for stage, stats in summary['stages'].items()} == {
+        constants.STAGE_HASH: 2,
+        constants.STAGE_WAIT: 1,
+        constants.STAGE_DOWNLOAD: 1,
+        constants.STAGE_PARSE: 1,
+        constants.STAGE_LOOKUP: 2
+    }
+    assert summary['bytes_received'] == len(RESPONSE_TEXT)
+    assert (summary['cache_hits'], summary['cache_misses']) == (1, 1)
+    assert (summary['in_flight'], summary['max_in_flight']) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_pass_checker_async_instrumentation(monkeypatch):
+    '''
+    PassCheckerAsync reports stages, bytes, retries and requests in flight.
+    '''
+
+    # Arrange
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+
+    session = Mock()
+    session.get.side_effect = [
+        MockResponse('Too Many Requests', 429),
+        MockResponse(RESPONSE_TEXT, 200)
+    ]
+    metrics = MetricsRecorder()
+    pc = PassCheckerAsync(session, rate_controller=AdaptiveRateController(), instrumentation=metrics)
+
+    # Act
+    actual_results = await pc.is_password_compromised('dummypassword')
+
+    # Assert
+    summary = metrics.summary()
+    assert actual_results == (True, 1)
+    assert summary['stages'][constants.STAGE_WAIT]['count'] == 2
+    assert summary['stages'][constants.STAGE_DOWNLOAD]['count'] == 1
+    assert summary['bytes_received'] == len(RESPONSE_TEXT)
+    assert metrics.retries == {429: 1}
+    assert (summary['in_flight'], summary['max_in_flight']) == (0, 1)
+
+
+@pytest.mark.asyncio
+async def test_session_manager_instrumentation():
+    '''
+    Sessions created by SessionManager report connect timings.
+    '''
+
+    # Arrange
+    async def handle(request):
+        return web.Response(text=RESPONSE_TEXT)
+
+    app = web.Application()
+    app.router.add_get('/range/{prefix}', handle)
+    metrics = MetricsRecorder()
+
+    # Act
+    async with TestServer(app) as server:
+        async with SessionManager(instrumentation=metrics) as manager:
+            pc = PassCheckerAsync(manager.get_session(), instrumentation=metrics,
+                                    url=str(server.make_url('/range/')))
+            actual_results = await pc.is_password_compromised('dummypassword')
+
+    # Assert
+    assert actual_results == (True, 1)
+    assert metrics.stage_counts[constants.STAGE_CONNECT] == 1
+
+
+class MockResponse:
+    def __init__(self, text, status):
+        self._text = text
+        self.status = status
+        self.headers = {}
+
+    async def read(self):
+        return self._text.encode('utf-8')
+
+    async def __aexit__(self, exc_type, exc, tb):
+        pass
+
+    async def __aenter__(self):
+        return self
@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for local_corpus and pass_checker_offline.
+"""
+
+from hashlib import sha1
+
+import passpwnedcheck.constants as constants
+import pytest
+from passpwnedcheck.local_corpus import LocalCorpus, build_corpus
+from passpwnedcheck.pass_checker_offline import PassCheckerOffline
+
+passwords = {
+    'password': 9545824,
+    'letmein': 285095,
+    'dummypassword': 1,
+    '日本語': 42
+}
+
+
+def _write_corpus(path, lines):
+    with open(path, 'w', newline='') as f:
+        f.write('\r\n'.join(lines))
+
+def _corpus_lines(sort):
+    lines = [sha1(password.encode('utf-8')).hexdigest().upper() + ':' + str(count) \
+                for password, count in passwords.items()]
+    return sorted(lines) if sort else lines
+
+
+@pytest.mark.parametrize('sort, chunk_size', [
+    (True, constants.CORPUS_SORT_CHUNK_SIZE),
+    (False, constants.CORPUS_SORT_CHUNK_SIZE),
+    (False, 1)
+])
+def test_build_corpus(tmp_path, sort, chunk_size):
+    '''
+    Text corpus can be converted into a sorted binary file,
+    even if it has to be sorted in chunks on disk.
+    '''
+
+    # Arrange
+    source = tmp_path / 'pwned.txt'
+    dest = tmp_path / 'pwned.bin'
+    _write_corpus(source, _corpus_lines(sort))
+
+    # Act
+    total = build_corpus(source, dest, chunk_size)
+
+    # Assert
+    data = dest.read_bytes()
+    body = data[len(constants.CORPUS_MAGIC):]
+    records = [body[i:i+constants.RECORD_SIZE] for i in range(0, len(body), constants.RECORD_SIZE)]
+
+    assert total == len(passwords)
+    assert data.startswith(constants.CORPUS_MAGIC)
+    assert records == sorted(records)
+    assert sorted(tmp_path.iterdir()) == sorted([source, dest])
+
+
+def test_build_corpus_wrong_input(tmp_path):
+    '''
+    If a line is not in the format HASH:COUNT, raise exception
+    and do not leave a partial file behind.
+    '''
+
+    lines = [
+        'not a hash:1',
+        '5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8',
+        '5BAA61E4C9B93F3F0682250B6CF8331B7EE6:1',
+        '5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8:many'
+    ]
+
+    for line in lines:
+        source = tmp_path / 'pwned.txt'
+        dest = tmp_path / 'pwned.bin'
+        _write_corpus(source, [line])
+
+        with pytest.raises(ValueError) as ve:
+            build_corpus(source, dest)
+        assert str(ve.value) == constants.CORPUS_LINE_ERROR_MSG + repr(line)
+        assert list(tmp_path.iterdir()) == [source]
+
+
+def test_local_corpus_wrong_format(tmp_path):
+    '''
+    If file was not created by build_corpus, raise exception.
+    '''
+
+    path = tmp_path / 'pwned.bin'
+    path.write_bytes(b'not a corpus')
+
+    with pytest.raises(ValueError) as ve:
+        LocalCorpus(path)
+    assert str(ve.value) == constants.CORPUS_FORMAT_ERROR_MSG + str(path)
+
+
+def test_is_password_compromised(tmp_path):
+    '''
+    Can check a single password against the local corpus.
+    '''
+
+    # Arrange
+    source = tmp_path / 'pwned.txt'
+    dest = tmp_path / 'pwned.bin'
+    _write_corpus(source, _corpus_lines(False))
+    build_corpus(source, dest)
+
+    with LocalCorpus(dest) as corpus:
+        pc = PassCheckerOffline(corpus)
+
+        # Act & Assert
+        assert len(corpus) == len(passwords)
+        for password, count in passwords.items():
+            assert pc.is_password_compromised(password) == (True, count)
+        assert pc.is_password_compromised('notinthecorpus') == (False, 0)
+        assert pc.is_hash_compromised(sha1(b'letmein').digest()) == (True, passwords['letmein'])
+        assert pc.is_hash_compromised(sha1(b'letmein').hexdigest()) == (True, passwords['letmein'])
+
+
+def test_is_passwords_compromised(tmp_path):
+    '''
+    Can check multiple passwords against the local corpus.
+    '''
+
+    # Arrange
+    source = tmp_path / 'pwned.txt'
+    dest = tmp_path / 'pwned.bin'
+    _write_corpus(source, _corpus_lines(True))
+    build_corpus(source, dest)
+
+    expected = dict(passwords, notinthecorpus=0)
+
+    with LocalCorpus(dest) as corpus:
+        pc = PassCheckerOffline(corpus)
+
+        # Act
+        actual_results = pc.is_passwords_compromised(list(expected))
+        hash_results = pc.is_hashes_compromised([sha1(b'letmein').hexdigest(), sha1(b'notinthecorpus').digest()])
+
+    # Assert
+    assert actual_results == expected
+    assert hash_results == {sha1(b'letmein').hexdigest(): passwords['letmein'],
+                            sha1(b'notinthecorpus').digest(): 0}
+
+
+def test_read_range(tmp_path):
+    '''
+    Records of a prefix can be read in the format of Pwned Passwords API.
+    '''
+
+    # Arrange
+    source = tmp_path / 'pwned.txt'
+    dest = tmp_path / 'pwned.bin'
+    lines = ['00000' + '0' * 35 + ':1', '5BAA6' + '0' * 35 + ':2', '5BAA6' + 'F' * 35 + ':3',
+                '5BAA7' + '0' * 35 + ':4', 'F' * 40 + ':5']
+    _write_corpus(source, lines)
+    build_corpus(source, dest)
+
+    with LocalCorpus(dest) as corpus:
+        # Act & Assert
+        assert corpus.read_range('5BAA6') == ('0' * 35 + ':2\r\n' + 'F' * 35 + ':3').encode('ascii')
+        assert corpus.read_range('00000') == ('0' * 35 + ':1').encode('ascii')
+        assert corpus.read_range('FFFFF') == ('F' * 35 + ':5').encode('ascii')
+        assert corpus.read_range('12345') == b''
@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for parallel.
+"""
+
+import pytest
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.parallel import (check_passwords_parallel,
+                                     iter_passwords_parallel)
+from passpwnedcheck.pass_checker_offline import PassCheckerOffline
+
+from tests.conftest import leaked_passwords, make_corpus
+
+leaked = leaked_passwords(300)
+passwords = ['password{}'.format(i) for i in range(300)]
+
+
+@pytest.fixture
+def corpus_path(tmp_path):
+    return str(make_corpus(tmp_path, leaked))
+
+
+def test_check_passwords_parallel(corpus_path):
+    '''
+    Results from worker processes match the single-process results.
+    '''
+
+    with LocalCorpus(corpus_path) as corpus:
+        expected = PassCheckerOffline(corpus).is_passwords_compromised(passwords)
+
+    results = check_passwords_parallel(passwords, corpus_path, processes=2, chunk_size=17)
+
+    assert results == expected
+
+
+def test_iter_passwords_parallel(corpus_path):
+    '''
+    Results are yielded in input order, from any iterable.
+    '''
+
+    results = list(iter_passwords_parallel(iter(passwords), corpus_path, processes=2, chunk_size=50))
+
+    assert [password for password, _ in results] == passwords
+    assert [count for _, count in results] == [leaked.get(password, 0) for password in passwords]
+
+
+def test_iter_passwords_parallel_error(corpus_path):
+    '''
+    If a worker raises an exception, it is propagated to the caller.
+    '''
+
+    with pytest.raises(TypeError):
+        list(iter_passwords_parallel(['password', None], corpus_path, processes=1))
@@ -5,13 +5,20 @@ Tests for pass_checker.
 """
 
 import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest.mock import Mock
 
 import passpwnedcheck.constants as constants
 import pytest
 import requests
 from _pytest.monkeypatch import MonkeyPatch
+from passpwnedcheck.cache import AsyncRedisRangeCache, RangeCache
+from passpwnedcheck.deadline import DeadlinePolicy
 from passpwnedcheck.pass_checker import PassChecker
 from passpwnedcheck.pass_checker import main as pass_checker_main
+from passpwnedcheck.session_manager import create_pooled_session
 from requests.models import Response
 
 pc = PassChecker()
@@ -39,10 +46,321 @@ def test_is_password_compromised():
         response._content  = response_text.encode('utf-8')
 
         with monkeypatch.context() as m:
-            m.setattr(requests, 'get', lambda URL: response)
+            m.setattr(pc._session, 'get', lambda URL, **kwargs: response)
             assert pc.is_password_compromised('dummypassword') == result
 
 
+def test_is_password_compromised_cache():
+    '''
+    If a cache is provided, the same prefix is only fetched once.
+    '''
+
+    response = Response()
+    response.status_code = 200
+    response._content = b'CBCD36D02E3B172B788D0CB372D168B30C3:1\r\n00F8AFEB99401868422C69E1A119902366A:1'
+    urls = []
+
+    def get(url, **kwargs):
+        urls.append(url)
+        return response
+
+    cache = RangeCache()
+    pc_cache = PassChecker(cache=cache)
+
+    with monkeypatch.context() as m:
+        m.setattr(pc_cache._session, 'get', get)
+        assert pc_cache.is_password_compromised('dummypassword') == (True, 1)
+        assert pc_cache.is_password_compromised('dummypassword') == (True, 1)
+
+    assert len(urls) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_async_cache():
+    '''
+    An asynchronous cache cannot be used, its coroutines would never be awaited.
+    '''
+
+    # Arrange
+    cache = AsyncRedisRangeCache(Mock())
+
+    # Act, Assert
+    with pytest.raises(TypeError) as te:
+        PassChecker(cache=cache)
+    assert str(te.value) == constants.ASYNC_CACHE_ERROR_MSG + 'AsyncRedisRangeCache'
+
+
+def test_session():
+    '''
+    The same session is reused between calls, with the configured timeout.
+    '''
+
+    response = Response()
+    response.status_code = 200
+    response._content = b'CBCD36D02E3B172B788D0CB372D168B30C3:1'
+
+    session = Mock()
+    session.get.return_value = response
+
+    with PassChecker(session=session, timeout=3) as pc_session:
+        pc_session.is_password_compromised('dummypassword')
+        pc_session.is_password_compromised('dummypassword')
+
+    assert session.get.call_count == 2
+    session.get.assert_called_with(constants.URL + '36632', timeout=3)
+
+    # Session passed in by the caller is not closed.
+    session.close.assert_not_called()
+
+
+def test_session_owned(mocker):
+    '''
+    Session created by PassChecker is closed on exit.
+    '''
+
+    close = mocker.patch('requests.Session.close')
+
+    with PassChecker():
+        pass
+
+    close.assert_called_once()
+
+
+def test_create_pooled_session():
+    '''
+    Pooled session keeps connections alive and retries failed requests.
+    '''
+
+    session = create_pooled_session(pool_size=20, retries=5)
+    adapter = session.get_adapter(constants.URL)
+
+    assert adapter._pool_maxsize == 20
+    assert adapter.max_retries.total == 5
+    assert 429 in adapter.max_retries.status_forcelist
+    assert create_pooled_session(retry_reads=False).get_adapter(constants.URL).max_retries.read is False
+
+
+def test_is_passwords_compromised():
+    '''
+    Can check multiple passwords, fetching each prefix only once.
+    '''
+
+    # password136 and password1818 share prefix BD30B.
+    passwords = ['dummypassword', 'password136', 'password1818', 'password136']
+
+    responses = {
+        '36632': b'CBCD36D02E3B172B788D0CB372D168B30C3:1',
+        'BD30B': b'4E206823991DE29A0C764E7F6CA6D98A890:3\r\n00F8AFEB99401868422C69E1A119902366A:1'
+    }
+
+    results = {
+        'dummypassword': 1,
+        'password136': 0,
+        'password1818': 3
+    }
+
+    def get(url, **kwargs):
+        response = Response()
+        response.status_code = 200
+        response._content = responses[url[-5:]]
+        return response
+
+    session = Mock()
+    session.get.side_effect = get
+
+    actual_results = PassChecker(session=session).is_passwords_compromised(passwords, max_workers=4)
+
+    assert actual_results == results
+    assert session.get.call_count == 2
+
+
+def test_is_passwords_compromised_max_workers(mocker):
+    '''
+    By default, there are as many threads as pooled connections.
+    '''
+
+    executor = mocker.patch('passpwnedcheck.pass_checker.ThreadPoolExecutor')
+    executor.return_value.map.return_value = []
+
+    with PassChecker(pool_size=7) as pc:
+        pc.is_passwords_compromised([])
+        pc.is_passwords_compromised([], max_workers=3)
+
+    assert [c.kwargs['max_workers'] for c in executor.call_args_list] == [7, 3]
+
+
+def test_is_hash_compromised():
+    '''
+    Can check precomputed hashes without the password.
+    '''
+
+    response = Response()
+    response.status_code = 200
+    response._content = b'CBCD36D02E3B172B788D0CB372D168B30C3:1'
+
+    session = Mock()
+    session.get.return_value = response
+    pc_session = PassChecker(session=session)
+
+    hash = '36632CBCD36D02E3B172B788D0CB372D168B30C3'
+
+    assert pc_session.is_hash_compromised(hash) == (True, 1)
+    assert pc_session.is_hash_compromised(bytes.fromhex(hash)) == (True, 1)
+    assert pc_session.is_hash_compromised('36632' + '0' * 35) == (False, 0)
+    assert pc_session.is_hashes_compromised([hash, hash.lower()]) == {hash: 1, hash.lower(): 1}
+    session.get.assert_called_with(constants.URL + '36632', timeout=constants.TIMEOUT)
+
+
+def test_is_passwords_compromised_error():
+    '''
+    If server returns error code for any prefix, raise exception.
+    '''
+
+    response = Response()
+    response.status_code = 500
+    response.reason = 'Internal Server Error'
+
+    session = Mock()
+    session.get.return_value = response
+
+    with pytest.raises(ConnectionError) as ce:
+        PassChecker(session=session).is_passwords_compromised(['dummypassword', 'password'])
+    assert str(ce.value) == constants.RESPONSE_CODE_ERROR_MSG + 'Internal Server Error'
+
+
+def test_is_password_compromised_deadline():
+    '''
+    Deadline bounds the request timeout, and decides what happens when it passes.
+    '''
+
+    session = Mock()
+    session.get.side_effect = requests.exceptions.ReadTimeout()
+
+    pc_open = PassChecker(session=session, timeout=10, deadline_policy=DeadlinePolicy(deadline=0.5, fail_open=True))
+    assert pc_open.is_password_compromised('dummypassword') == (False, 0)
+    assert session.get.call_args.kwargs['timeout'] == 0.5
+
+    pc_closed = PassChecker(session=session, deadline_policy=DeadlinePolicy(deadline=0.5))
+    with pytest.raises(TimeoutError) as te:
+        pc_closed.is_password_compromised('dummypassword')
+    assert str(te.value) == constants.DEADLINE_ERROR_MSG
+
+    # Without a policy, the original exception is raised.
+    with pytest.raises(requests.exceptions.ReadTimeout):
+        PassChecker(session=session).is_password_compromised('dummypassword')
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    '''
+    Range API answering as set by server.mode: slowly, with 503 errors,
+    or sending its body one byte at a time.
+    '''
+
+    body = b'CBCD36D02E3B172B788D0CB372D168B30C3:1'
+
+    def do_GET(self):
+        try:
+            getattr(self, 'respond_' + self.server.mode)()
+        except ConnectionError:
+            # The client gave up waiting.
+            pass
+
+    def respond_slow(self):
+        time.sleep(1)
+        self.respond(200, self.body)
+
+    def respond_unavailable(self):
+        self.respond(503, b'Service Unavailable')
+
+    def respond_trickle(self):
+        self.send_response(200)
+        self.send_header('Content-Length', str(len(self.body)))
+        self.end_headers()
+        for i in range(len(self.body)):
+            self.wfile.write(self.body[i:i+1])
+            self.wfile.flush()
+            time.sleep(0.05)
+
+    def respond(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), StubHandler)
+    server.daemon_threads = True
+    server.url = 'http://127.0.0.1:{}/range/'.format(server.server_port)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    yield server
+
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.mark.parametrize('mode', ['slow', 'trickle'])
+def test_is_password_compromised_deadline_pooled(stub_server, mode):
+    '''
+    Deadline bounds the whole call with pooled sessions, whose read timeouts
+    are raised by urllib3 as connection errors once retried,
+    even if the server keeps sending bytes slowly.
+    '''
+
+    stub_server.mode = mode
+    policy = DeadlinePolicy(deadline=0.2, fail_open=True)
+    sessions = [None, create_pooled_session(retries=1)]
+
+    for session in sessions:
+        with PassChecker(session=session, deadline_policy=policy, url=stub_server.url) as pc:
+            start = time.monotonic()
+            assert pc.is_password_compromised('dummypassword') == (False, 0)
+            assert time.monotonic() - start < 0.9
+
+    with PassChecker(deadline_policy=DeadlinePolicy(deadline=0.2), url=stub_server.url) as pc:
+        with pytest.raises(TimeoutError):
+            pc.is_password_compromised('dummypassword')
+
+
+def test_is_password_compromised_deadline_unavailable(stub_server):
+    '''
+    With a deadline, error responses are not retried past it: they are raised
+    right away, or handled by the policy once the deadline has passed.
+    '''
+
+    stub_server.mode = 'unavailable'
+    policy = DeadlinePolicy(deadline=0.3, fail_open=True)
+
+    with PassChecker(deadline_policy=policy, url=stub_server.url) as pc:
+        start = time.monotonic()
+        with pytest.raises(ConnectionError):
+            pc.is_password_compromised('dummypassword')
+        assert time.monotonic() - start < 0.3
+
+    # This session keeps retrying until after the deadline.
+    session = create_pooled_session(retries=2)
+    session.get_adapter(stub_server.url).max_retries.backoff_factor = 0.2
+    with PassChecker(session=session, deadline_policy=policy, url=stub_server.url) as pc:
+        assert pc.is_password_compromised('dummypassword') == (False, 0)
+
+
+def test_is_password_compromised_deadline_body(stub_server):
+    '''
+    Responses received within the deadline are read whole.
+    '''
+
+    stub_server.mode = 'trickle'
+
+    with PassChecker(deadline_policy=DeadlinePolicy(deadline=10), url=stub_server.url) as pc:
+        assert pc.is_password_compromised('dummypassword') == (True, 1)
+
+
 def test_is_password_compromised_error():
     '''
     If server returns error code, raise exception.
@@ -68,7 +386,7 @@ def test_is_password_compromised_error():
         response.reason = msg
 
         with monkeypatch.context() as m:
-            m.setattr(requests, 'get', lambda URL: response)
+            m.setattr(pc._session, 'get', lambda URL, **kwargs: response)
             with pytest.raises(ConnectionError) as ce:
                 pc.is_password_compromised('dummypassword')
             assert str(ce.value) == constants.RESPONSE_CODE_ERROR_MSG + msg
@@ -76,7 +394,7 @@ def test_is_password_compromised_error():
 
 def test_is_password_compromised_prefix_error():
     '''
-    If get_password_prefix_suffix raises an exception,
+    If get_password_digest raises an exception,
     that exception will propagate to is_password_compromised.
     '''
 
@@ -84,7 +402,7 @@ def test_is_password_compromised_prefix_error():
         raise TypeError('Password must be string')
 
     with monkeypatch.context() as m:
-        m.setattr('passpwnedcheck.pass_checker.get_password_prefix_suffix', raise_type_error)
+        m.setattr('passpwnedcheck.pass_checker.get_password_digest', raise_type_error)
         with pytest.raises(TypeError) as ve:
             pc.is_password_compromised('dummypassword')
         assert str(ve.value) == constants.PASSWORD_FORMAT_ERROR_MSG
@@ -92,15 +410,15 @@ def test_is_password_compromised_prefix_error():
 
 def test_is_password_compromised_network_error():
     '''
-    If requests.get raises an exception,
+    If session.get raises an exception,
     that exception will propagate to is_password_compromised.
     '''
     
-    def raise_network_error(_):
+    def raise_network_error(_, **kwargs):
         raise Exception('Some error message from requests module')
 
     with monkeypatch.context() as m:
-        m.setattr(requests, 'get', raise_network_error)
+        m.setattr(pc._session, 'get', raise_network_error)
         with pytest.raises(Exception) as e:
             pc.is_password_compromised('dummypassword')
         assert str(e.value) == 'Some error message from requests module'
@@ -4,11 +4,19 @@
 Tests for pass_checker_async.
 """
 
+import asyncio
 from unittest.mock import Mock
 
+import aiohttp
+
 import passpwnedcheck.constants as constants
 import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from passpwnedcheck.cache import RangeCache
+from passpwnedcheck.deadline import DeadlinePolicy
 from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from passpwnedcheck.rate_control import AdaptiveRateController
 
 
 @pytest.mark.asyncio
@@ -42,6 +50,101 @@ async def test_is_password_compromised():
         # Assert
         assert actual_results == result
 
+@pytest.mark.asyncio
+async def test_is_password_compromised_cache():
+    '''
+    If a cache is provided, the same prefix is only fetched once.
+    '''
+
+    # Arrange
+    response_text = 'CBCD36D02E3B172B788D0CB372D168B30C3:1\r\n00F8AFEB99401868422C69E1A119902366A:1'
+    session = Mock()
+    session.get.return_value = MockResponse(response_text, 200)
+    cache = RangeCache()
+    pc = PassCheckerAsync(session, cache=cache)
+
+    # Act
+    first_results = await pc.is_password_compromised('dummypassword')
+    second_results = await pc.is_password_compromised('dummypassword')
+
+    # Assert
+    assert first_results == second_results == (True, 1)
+    assert session.get.call_count == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_coalescing():
+    '''
+    Concurrent calls for the same prefix share one request.
+    '''
+
+    # Arrange
+    response_text = 'CBCD36D02E3B172B788D0CB372D168B30C3:1\r\n00F8AFEB99401868422C69E1A119902366A:1'
+    session = Mock()
+    session.get.return_value = SlowMockResponse(response_text, 200)
+    pc = PassCheckerAsync(session)
+
+    # Act
+    actual_results = await asyncio.gather(*(pc.is_password_compromised('dummypassword') for _ in range(10)))
+
+    # Assert
+    assert actual_results == [(True, 1)] * 10
+    assert session.get.call_count == 1
+    assert pc._in_flight == {}
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_streaming():
+    '''
+    A single check is answered as soon as the suffix is found or passed,
+    while concurrent calls for the same prefix still get the whole range.
+    '''
+
+    # Arrange
+    response_text = '00F8AFEB99401868422C69E1A119902366A:1\r\nCBCD36D02E3B172B788D0CB372D168B30C3:1\r\n' \
+                    'D0000000000000000000000000000000000:2\r\nE0000000000000000000000000000000000:3'
+    resp = MockResponse(response_text, 200)
+    stream = resp.content
+    stream.pause = asyncio.Event()
+    session = Mock()
+    session.get.return_value = resp
+    pc = PassCheckerAsync(session)
+
+    # Act
+    single_result = asyncio.ensure_future(pc.is_password_compromised('dummypassword'))
+    range_result = asyncio.ensure_future(pc.get_range('36632'))
+    await asyncio.wait_for(single_result, 1)
+    read_chunks = stream.read_chunks
+    stream.pause.set()
+    prefix_range = await range_result
+
+    # Assert
+    assert single_result.result() == (True, 1)
+    assert read_chunks < len(stream.chunks)
+    assert prefix_range.get('E0000000000000000000000000000000000') == 3
+    assert session.get.call_count == 1
+    assert pc._in_flight == {}
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_coalescing_error():
+    '''
+    If the shared request fails, every waiting call raises exception.
+    '''
+
+    # Arrange
+    session = Mock()
+    session.get.return_value = SlowMockResponse('Too Many Requests', 429)
+    pc = PassCheckerAsync(session)
+
+    # Act
+    actual_results = await asyncio.gather(*(pc.is_password_compromised('dummypassword') for _ in range(5)),
+                                            return_exceptions=True)
+
+    # Assert
+    assert session.get.call_count == 1
+    for error in actual_results:
+        assert isinstance(error, ConnectionError)
+        assert str(error) == constants.RESPONSE_CODE_ERROR_MSG + 'Too Many Requests'
+
 @pytest.mark.asyncio
 async def test_is_password_compromised_error():
     '''
@@ -109,6 +212,265 @@ async def test_is_passwords_compromised():
     # Assert
     assert actual_results == results
 
+@pytest.mark.asyncio
+async def test_is_passwords_compromised_shared_prefix():
+    '''
+    Passwords sharing the same prefix only need one request.
+    '''
+
+    # Arrange
+    # password136 and password1818 share prefix BD30B.
+    passwords = [
+        'password136',
+        'password1818',
+        'password136'
+    ]
+
+    response = '4E206823991DE29A0C764E7F6CA6D98A890:3\r\n559BD9A84C988F99A2B3B05F4980E6D06CD:7'
+
+    results = {
+        'password136': 7,
+        'password1818': 3
+    }
+
+    session = Mock()
+    session.get.return_value = MockResponse(response, 200)
+    pc = PassCheckerAsync(session)
+
+    # Act
+    actual_results = await pc.is_passwords_compromised(passwords)
+
+    # Assert
+    assert actual_results == results
+    assert session.get.call_count == 1
+
+@pytest.mark.asyncio
+async def test_iter_passwords_compromised():
+    '''
+    Can stream results for an async iterable of passwords.
+    '''
+
+    # Arrange
+    async def passwords():
+        for password in ['dummypassword', 'dummypassword1', 'dummypassword2']:
+            yield password
+
+    # Ranges are sorted by suffix.
+    response = 'BE23871CC587D104D7099C05C481919B61F:10\r\nCBCD36D02E3B172B788D0CB372D168B30C3:1'
+
+    results = {
+        'dummypassword': 1,
+        'dummypassword1': 10,
+        'dummypassword2': 0
+    }
+
+    session = Mock()
+    session.get.return_value = MockResponse(response, 200)
+    pc = PassCheckerAsync(session)
+
+    # Act
+    actual_results = [pair async for pair in pc.iter_passwords_compromised(passwords(), batch_size=2)]
+
+    # Assert
+    assert sorted(actual_results) == sorted(results.items())
+
+@pytest.mark.asyncio
+async def test_is_hash_compromised():
+    '''
+    Can check precomputed hashes without the password.
+    '''
+
+    # Arrange
+    hash = '36632CBCD36D02E3B172B788D0CB372D168B30C3'
+    response = 'CBCD36D02E3B172B788D0CB372D168B30C3:1\r\nBE23871CC587D104D7099C05C481919B61F:10'
+
+    session = Mock()
+    session.get.return_value = MockResponse(response, 200)
+    pc = PassCheckerAsync(session)
+
+    # Act
+    single_result = await pc.is_hash_compromised(bytes.fromhex(hash))
+    results = await pc.is_hashes_compromised([hash, '36632BE23871CC587D104D7099C05C481919B61F'])
+
+    # Assert
+    assert single_result == (True, 1)
+    assert results == {hash: 1, '36632BE23871CC587D104D7099C05C481919B61F': 10}
+    assert session.get.call_count == 2
+
+@pytest.mark.asyncio
+async def test_is_passwords_compromised_rate_controller():
+    '''
+    With a rate controller, concurrency is bounded by its limit
+    instead of the default batch size.
+    '''
+
+    # Arrange
+    in_flight = 0
+    max_in_flight = 0
+
+    class CountingMockResponse(MockResponse):
+        async def read(self):
+            nonlocal in_flight, max_in_flight
+            in_flight += 1
+            max_in_flight = max(max_in_flight, in_flight)
+            await asyncio.sleep(0.01)
+            in_flight -= 1
+            return await super().read()
+
+    session = Mock()
+    session.get.side_effect = lambda *args, **kwargs: CountingMockResponse('', 200)
+    controller = AdaptiveRateController(initial_concurrency=30, max_concurrency=30)
+    pc = PassCheckerAsync(session, rate_controller=controller)
+    hashes = ['{:05X}'.format(i) + '0' * 35 for i in range(100)]
+
+    # Act
+    await pc.is_hashes_compromised(hashes)
+
+    # Assert
+    assert max_in_flight == 30
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_throttled(monkeypatch):
+    '''
+    With a rate controller, throttled requests are retried after Retry-After.
+    '''
+
+    # Arrange
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+
+    session = Mock()
+    session.get.side_effect = [
+        MockResponse('Too Many Requests', 429, {'Retry-After': '2'}),
+        MockResponse('Service Unavailable', 503),
+        MockResponse('CBCD36D02E3B172B788D0CB372D168B30C3:1', 200)
+    ]
+    controller = AdaptiveRateController(initial_concurrency=8, cooldown=0, rng=lambda: 1)
+    pc = PassCheckerAsync(session, rate_controller=controller)
+
+    # Act
+    actual_results = await pc.is_password_compromised('dummypassword')
+
+    # Assert
+    assert actual_results == (True, 1)
+    assert session.get.call_count == 3
+    assert delays == [2, constants.RETRY_BACKOFF_FACTOR * 2]
+    assert controller.limit == 2
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_throttled_error(monkeypatch):
+    '''
+    If requests are still throttled after all retries, raise exception.
+    '''
+
+    # Arrange
+    async def sleep(delay):
+        pass
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+
+    session = Mock()
+    session.get.return_value = MockResponse('Too Many Requests', 429)
+    pc = PassCheckerAsync(session, rate_controller=AdaptiveRateController(retries=2))
+
+    # Act
+    with pytest.raises(ConnectionError) as ce:
+        await pc.is_password_compromised('dummypassword')
+
+    # Assert
+    assert str(ce.value) == constants.RESPONSE_CODE_ERROR_MSG + 'Too Many Requests'
+    assert session.get.call_count == 3
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_deadline():
+    '''
+    When the deadline passes, fail open or raise exception.
+    '''
+
+    for fail_open in [True, False]:
+        # Arrange
+        session = Mock()
+        session.get.return_value = HangingMockResponse()
+        pc = PassCheckerAsync(session, deadline_policy=DeadlinePolicy(deadline=0.01, fail_open=fail_open))
+
+        # Act & Assert
+        if fail_open:
+            assert await pc.is_password_compromised('dummypassword') == (False, 0)
+        else:
+            with pytest.raises(TimeoutError) as te:
+                await pc.is_password_compromised('dummypassword')
+            assert str(te.value) == constants.DEADLINE_ERROR_MSG
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_timeout():
+    '''
+    Per-request timeout is passed to the session.
+    '''
+
+    session = Mock()
+    session.get.return_value = MockResponse('CBCD36D02E3B172B788D0CB372D168B30C3:1', 200)
+    pc = PassCheckerAsync(session, deadline_policy=DeadlinePolicy(timeout=2))
+
+    await pc.is_password_compromised('dummypassword')
+
+    assert session.get.call_args.kwargs['timeout'].total == 2
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_request_timeout():
+    '''
+    Without a deadline, requests timing out are handled by the policy too.
+    '''
+
+    # Arrange
+    async def handle(request):
+        await asyncio.sleep(1)
+        return web.Response(text='CBCD36D02E3B172B788D0CB372D168B30C3:1')
+
+    app = web.Application()
+    app.router.add_get('/range/{prefix}', handle)
+
+    async with TestServer(app) as server, aiohttp.ClientSession() as session:
+        url = str(server.make_url('/range/'))
+        pc_open = PassCheckerAsync(session, deadline_policy=DeadlinePolicy(timeout=0.1, fail_open=True), url=url)
+        pc_closed = PassCheckerAsync(session, deadline_policy=DeadlinePolicy(timeout=0.1), url=url)
+
+        # Act & Assert
+        assert await pc_open.is_password_compromised('dummypassword') == (False, 0)
+        assert await pc_open.is_passwords_compromised(['dummypassword', 'password']) == \
+                {'dummypassword': 0, 'password': 0}
+
+        with pytest.raises(TimeoutError) as te:
+            await pc_closed.is_password_compromised('dummypassword')
+        assert str(te.value) == constants.DEADLINE_ERROR_MSG
+
+@pytest.mark.asyncio
+async def test_is_password_compromised_hedged():
+    '''
+    A slow request is hedged, and the first response wins.
+    '''
+
+    # Arrange
+    policy = DeadlinePolicy(hedge_percentile=99, min_samples=3)
+    for _ in range(3):
+        policy.record(0.01)
+
+    hanging = HangingMockResponse()
+    session = Mock()
+    session.get.side_effect = [hanging, MockResponse('CBCD36D02E3B172B788D0CB372D168B30C3:1', 200)]
+    pc = PassCheckerAsync(session, deadline_policy=policy)
+
+    # Act
+    actual_results = await pc.is_password_compromised('dummypassword')
+
+    # Assert
+    assert actual_results == (True, 1)
+    assert session.get.call_count == 2
+    assert hanging.cancelled
+
 @pytest.mark.asyncio
 async def test_is_passwords_compromised_error():
     '''
@@ -151,15 +513,57 @@ async def test_is_passwords_compromised_error():
         assert str(ce.value) == constants.RESPONSE_CODE_ERROR_MSG + msg
 
 class MockResponse:
-    def __init__(self, text, status):
+    def __init__(self, text, status, headers=None):
         self._text = text
         self.status = status
+        self.headers = headers or {}
+        self.content = MockStream(text.encode('utf-8'))
 
     async def text(self):
         return self._text
 
+    async def read(self):
+        return self._text.encode('utf-8')
+
     async def __aexit__(self, exc_type, exc, tb):
         pass
 
     async def __aenter__(self):
         return self
+
+class MockStream:
+    '''
+    Body of a response received in small chunks.
+    '''
+
+    def __init__(self, body, chunk_size=16):
+        self.chunks = [body[i:i+chunk_size] for i in range(0, len(body), chunk_size)]
+        self.read_chunks = 0
+        # Event holding back the second half of the body, if set by a test.
+        self.pause = None
+
+    async def iter_any(self):
+        for i, chunk in enumerate(self.chunks):
+            if self.pause is not None and i == len(self.chunks) // 2:
+                await self.pause.wait()
+            self.read_chunks += 1
+            yield chunk
+
+class SlowMockResponse(MockResponse):
+    async def read(self):
+        # Give other calls the chance to start while this response is read.
+        for _ in range(5):
+            await asyncio.sleep(0)
+        return await super().read()
+
+class HangingMockResponse(MockResponse):
+    def __init__(self):
+        super().__init__('', 200)
+        self.cancelled = False
+
+    async def read(self):
+        try:
+            await asyncio.Event().wait()
+        except asyncio.CancelledError:
+            self.cancelled = True
+            raise
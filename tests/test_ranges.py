@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for ranges.
+"""
+
+import passpwnedcheck.constants as constants
+import pytest
+from passpwnedcheck.ranges import CompactRange, RawRange, SuffixScanner
+from passpwnedcheck.utils import response_to_dict
+
+body = b'024C755EAE375140CC7F5736766A93018FD:3\r\n00F8AFEB99401868422C69E1A119902366A:1\r\n01C91CC3B2BB8575CB715776DE723EF2A25:8'
+
+
+def test_raw_range_get():
+    '''
+    Can look up suffixes in a raw range like in a dictionary.
+    '''
+
+    raw_range = RawRange(body)
+
+    assert raw_range.get('01C91CC3B2BB8575CB715776DE723EF2A25') == 8
+    assert raw_range.get('0246B0E85B76A83FCFDEFFE404046231CD9') is None
+    assert raw_range.get('0246B0E85B76A83FCFDEFFE404046231CD9', 0) == 0
+
+
+def test_compact_range():
+    '''
+    Compact range behaves like the dictionary returned by response_to_dict.
+    '''
+
+    response_dict = response_to_dict(body.decode('ascii'))
+    compact_ranges = [
+        CompactRange.from_response(body),
+        CompactRange.from_mapping(response_dict)
+    ]
+
+    for compact_range in compact_ranges:
+        assert compact_range == response_dict
+        assert len(compact_range) == 3
+        assert list(compact_range) == sorted(response_dict)
+        assert '00F8AFEB99401868422C69E1A119902366A' in compact_range
+        assert compact_range['024C755EAE375140CC7F5736766A93018FD'] == 3
+        assert compact_range.get('0246B0E85B76A83FCFDEFFE404046231CD9') is None
+        assert compact_range.nbytes() == 3 * (constants.COMPACT_SUFFIX_SIZE + compact_range._counts.itemsize)
+
+
+def test_compact_range_empty():
+    '''
+    Empty response can be converted into an empty range.
+    '''
+
+    compact_range = CompactRange.from_response(b'')
+
+    assert len(compact_range) == 0
+    assert compact_range.get('00F8AFEB99401868422C69E1A119902366A') is None
+
+
+def test_compact_range_wrong_key():
+    '''
+    Keys which are not valid suffixes are never found.
+    '''
+
+    compact_range = CompactRange.from_response(body)
+
+    for key in ['', '00F8A', 'not a suffix', 1, None]:
+        with pytest.raises(KeyError):
+            compact_range[key]
+
+
+def test_compact_range_wrong_input():
+    '''
+    If a suffix is not 35 hex characters, raise exception.
+    '''
+
+    with pytest.raises(ValueError) as ve:
+        CompactRange.from_mapping({'00F8A': 1})
+    assert str(ve.value) == constants.SUFFIX_FORMAT_ERROR_MSG + '00F8A'
+
+
+sorted_body = b'00F8AFEB99401868422C69E1A119902366A:1\r\n00FE7CEA0FC49CD44FFFE221B4E288E792D:1\r\n' \
+                b'01C91CC3B2BB8575CB715776DE723EF2A25:8\r\n0246B0E85B76A83FCFDEFFE404046231CD9:2'
+
+
+@pytest.mark.parametrize('suffix, chunk_size, read, count', [
+    ('00FE7CEA0FC49CD44FFFE221B4E288E792D', 1000, 1, 1),
+    ('00FE7CEA0FC49CD44FFFE221B4E288E792D', 10, 8, 1),
+    ('00FE7CEA0FC49CD44FFFE221B4E288E792E', 10, 12, None),
+    ('0246B0E85B76A83FCFDEFFE404046231CD9', 10, 16, 2),
+    ('FFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFFF', 10, 16, None)
+])
+def test_suffix_scanner(suffix, chunk_size, read, count):
+    '''
+    Scanning a range received in chunks stops once the suffix is found or passed.
+    '''
+
+    # Arrange
+    chunks = [sorted_body[i:i+chunk_size] for i in range(0, len(sorted_body), chunk_size)]
+    scanner = SuffixScanner(suffix)
+
+    # Act
+    actual_read = 0
+    for chunk in chunks:
+        actual_read += 1
+        if scanner.feed(chunk):
+            break
+
+    # Assert
+    assert actual_read == read
+    assert scanner.finish() == count
@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for rate_control.
+"""
+
+import asyncio
+import contextlib
+
+import pytest
+from passpwnedcheck.rate_control import AdaptiveRateController, parse_retry_after
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0
+
+    def __call__(self):
+        return self.now
+
+
+def test_parse_retry_after():
+    '''
+    Retry-After can be a number of seconds or an HTTP date.
+    '''
+
+    now = 1445412480  # Wed, 21 Oct 2015 07:28:00 GMT
+
+    values = ['120', '1.5', '-3', 'Wed, 21 Oct 2015 07:28:30 GMT', 'Wed, 21 Oct 2015 07:00:00 GMT', 'soon', None]
+    seconds = [120, 1.5, 0, 30, 0, None, None]
+
+    for value, expected in zip(values, seconds):
+        assert parse_retry_after(value, now=now) == expected
+
+
+@pytest.mark.asyncio
+async def test_additive_increase():
+    '''
+    Limit grows by about one per round trip of successful responses,
+    but only while every allowed request is in flight.
+    '''
+
+    controller = AdaptiveRateController(initial_concurrency=4, max_concurrency=6)
+
+    async def succeed(times):
+        for _ in range(times):
+            async with contextlib.AsyncExitStack() as stack:
+                for _ in range(controller.limit):
+                    await stack.enter_async_context(controller)
+                controller.on_success(0.1)
+
+    for _ in range(100):
+        controller.on_success(0.1)
+    assert controller.limit == 4
+
+    await succeed(5)
+    assert controller.limit == 5
+
+    await succeed(100)
+    assert controller.limit == 6
+    assert controller.max_concurrency == 6
+
+
+def test_multiplicative_decrease():
+    '''
+    Throttling cuts the limit, at most once per cooldown.
+    '''
+
+    clock = FakeClock()
+    controller = AdaptiveRateController(initial_concurrency=16, min_concurrency=2, cooldown=1, clock=clock)
+
+    controller.on_throttle()
+    controller.on_throttle()
+    assert controller.limit == 8
+
+    clock.now = 1
+    controller.on_throttle()
+    assert controller.limit == 4
+
+    for i in range(2, 10):
+        clock.now = i
+        controller.on_throttle()
+    assert controller.limit == 2
+
+
+def test_latency_target():
+    '''
+    Responses slower than latency_target cut the limit.
+    '''
+
+    controller = AdaptiveRateController(initial_concurrency=10, latency_target=0.5)
+
+    controller.on_success(0.6)
+    assert controller.limit == 5
+
+
+def test_backoff_delay():
+    '''
+    Retry-After wins, otherwise use jittered exponential backoff.
+    '''
+
+    controller = AdaptiveRateController(backoff_base=0.5, backoff_max=3, rng=lambda: 0.5)
+
+    assert controller.backoff_delay(0, retry_after=7) == 7
+    assert [controller.backoff_delay(attempt) for attempt in range(5)] == [0.25, 0.5, 1, 1.5, 1.5]
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit():
+    '''
+    No more than limit requests are in flight at the same time.
+    '''
+
+    controller = AdaptiveRateController(initial_concurrency=3)
+    max_in_flight = 0
+
+    async def request():
+        nonlocal max_in_flight
+        async with controller:
+            max_in_flight = max(max_in_flight, controller.in_flight)
+            await asyncio.sleep(0)
+
+    await asyncio.gather(*(request() for _ in range(20)))
+
+    assert max_in_flight == 3
+    assert controller.in_flight == 0
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for scheduler.
+"""
+
+import asyncio
+
+import pytest
+from passpwnedcheck.scheduler import RateLimiter, iter_bounded, map_bounded
+
+
+@pytest.mark.asyncio
+async def test_map_bounded():
+    '''
+    Can call a function on every item and collect the results.
+    '''
+
+    async def double(item):
+        await asyncio.sleep(0)
+        return item * 2
+
+    results = await map_bounded(double, range(20), 3)
+
+    assert results == {i: i * 2 for i in range(20)}
+
+
+@pytest.mark.asyncio
+async def test_map_bounded_sliding_window():
+    '''
+    Exactly concurrency calls are in flight, and a slow call
+    does not stop new calls from starting.
+    '''
+
+    in_flight = 0
+    max_in_flight = 0
+    finished_during_slow_call = []
+    slow_call_done = asyncio.Event()
+
+    async def call(item):
+        nonlocal in_flight, max_in_flight
+        in_flight += 1
+        max_in_flight = max(max_in_flight, in_flight)
+
+        if item == 0:
+            # Wait until every other item has gone through the window.
+            while len(finished_during_slow_call) < 9:
+                await asyncio.sleep(0)
+            slow_call_done.set()
+        else:
+            await asyncio.sleep(0)
+            if not slow_call_done.is_set():
+                finished_during_slow_call.append(item)
+
+        in_flight -= 1
+        return item
+
+    await map_bounded(call, range(10), 3)
+
+    assert max_in_flight == 3
+    assert sorted(finished_during_slow_call) == list(range(1, 10))
+
+
+@pytest.mark.asyncio
+async def test_map_bounded_error():
+    '''
+    If a call raises an exception, remaining calls are cancelled
+    and the exception is propagated.
+    '''
+
+    started = []
+
+    async def call(item):
+        started.append(item)
+        await asyncio.sleep(0)
+        if item == 1:
+            raise ConnectionError('Some error message')
+        return item
+
+    with pytest.raises(ConnectionError) as ce:
+        await map_bounded(call, range(100), 2)
+
+    assert str(ce.value) == 'Some error message'
+    assert len(started) < 100
+
+
+@pytest.mark.asyncio
+async def test_iter_bounded_async_iterable():
+    '''
+    Can consume an async iterable and yield results as they complete.
+    '''
+
+    async def generate():
+        for i in range(20):
+            await asyncio.sleep(0)
+            yield i
+
+    async def double(item):
+        await asyncio.sleep(0)
+        return item * 2
+
+    results = [pair async for pair in iter_bounded(double, generate(), 4)]
+
+    assert sorted(results) == [(i, i * 2) for i in range(20)]
+
+
+@pytest.mark.asyncio
+async def test_iter_bounded_backpressure():
+    '''
+    If the caller stops consuming results, no more items are taken.
+    '''
+
+    taken = []
+
+    def generate():
+        for i in range(1000):
+            taken.append(i)
+            yield i
+
+    async def identity(item):
+        return item
+
+    stream = iter_bounded(identity, generate(), 4)
+    await stream.__anext__()
+    for _ in range(10):
+        await asyncio.sleep(0)
+    await stream.aclose()
+
+    # At most 4 buffered results, 4 items in flight and the one consumed.
+    assert len(taken) <= 9
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter(monkeypatch):
+    '''
+    Calls are spaced out according to the rate.
+    '''
+
+    now = 100
+    delays = []
+
+    async def sleep(delay):
+        delays.append(delay)
+
+    monkeypatch.setattr(asyncio, 'sleep', sleep)
+    limiter = RateLimiter(4, clock=lambda: now)
+
+    for _ in range(4):
+        await limiter.wait()
+
+    assert delays == [0.25, 0.5, 0.75]
@@ -0,0 +1,152 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for server.
+"""
+
+import asyncio
+
+import aiohttp
+import passpwnedcheck.constants as constants
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+from passpwnedcheck.cache import DiskRangeCache, RangeCache
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.pass_checker_async import PassCheckerAsync
+from passpwnedcheck.server import RangeServer
+
+from tests.conftest import make_corpus
+
+PASSWORD_HASH = '5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8'
+UPSTREAM_BODY = b'1E4C9B93F3F0682250B6CF8331B7EE68FD8:10\r\n1E4C9B93F3F0682250B6CF8331B7EE68FD9:2'
+
+
+class StubUpstream:
+    def __init__(self, status=200):
+        self.status = status
+        self.prefixes = []
+
+    async def handle(self, request):
+        self.prefixes.append(request.match_info['prefix'])
+        # Let concurrent requests for the same prefix arrive meanwhile.
+        await asyncio.sleep(0.01)
+        return web.Response(status=self.status, body=UPSTREAM_BODY)
+
+    def app(self):
+        app = web.Application()
+        app.router.add_get('/range/{prefix}', self.handle)
+        return app
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    with LocalCorpus(make_corpus(tmp_path, {'password': 9545824, 'letmein': 285095})) as corpus:
+        yield corpus
+
+
+@pytest.mark.asyncio
+async def test_serve_corpus(corpus):
+    '''
+    Checkers pointed at the server get ranges from the local corpus.
+    '''
+
+    # Arrange
+    server = RangeServer(corpus=corpus)
+
+    async with TestServer(server.create_app()) as test_server:
+        async with aiohttp.ClientSession() as session:
+            pc = PassCheckerAsync(session, url=str(test_server.make_url('/range/')))
+
+            # Act
+            results = await pc.is_passwords_compromised(['password', 'letmein', 'dummypassword'])
+
+            async with session.get(test_server.make_url('/range/5baa6')) as response:
+                body = await response.read()
+
+    # Assert
+    assert results == {'password': 9545824, 'letmein': 285095, 'dummypassword': 0}
+    assert body == PASSWORD_HASH[5:].encode('ascii') + b':9545824'
+
+
+@pytest.mark.asyncio
+async def test_serve_upstream(corpus):
+    '''
+    Prefixes missing from the corpus are fetched from upstream once,
+    even when they are requested concurrently.
+    '''
+
+    # Arrange
+    upstream = StubUpstream()
+
+    async with TestServer(upstream.app()) as upstream_server, aiohttp.ClientSession() as session:
+        server = RangeServer(corpus=corpus, session=session, url=str(upstream_server.make_url('/range/')))
+
+        async with TestServer(server.create_app()) as test_server:
+            async def get(prefix):
+                async with session.get(test_server.make_url('/range/' + prefix)) as response:
+                    return await response.read()
+
+            # Act
+            bodies = await asyncio.gather(*[get('ABCDE') for _ in range(5)])
+            bodies.append(await get('ABCDE'))
+            corpus_body = await get('5BAA6')
+
+    # Assert
+    assert bodies == [UPSTREAM_BODY] * 6
+    assert corpus_body == PASSWORD_HASH[5:].encode('ascii') + b':9545824'
+    assert upstream.prefixes == ['ABCDE']
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('disk', [False, True])
+async def test_serve_cache_backend(tmp_path, disk):
+    '''
+    Ranges can be cached in any cache backend, and are served the same from cache.
+    '''
+
+    # Arrange
+    upstream = StubUpstream()
+    cache = DiskRangeCache(str(tmp_path / 'ranges.db')) if disk else RangeCache()
+
+    async with TestServer(upstream.app()) as upstream_server, aiohttp.ClientSession() as session:
+        server = RangeServer(session=session, cache=cache, url=str(upstream_server.make_url('/range/')))
+
+        async with TestServer(server.create_app()) as test_server:
+            async def get(prefix):
+                async with session.get(test_server.make_url('/range/' + prefix)) as response:
+                    return await response.read()
+
+            # Act
+            bodies = [await get('ABCDE'), await get('ABCDE')]
+
+    # Assert
+    assert bodies == [UPSTREAM_BODY] * 2
+    assert upstream.prefixes == ['ABCDE']
+    assert cache.hits == 1
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize('prefix, upstream_status, status', [
+    ('XYZ12', 200, constants.STATUS_CODE_BAD_REQUEST),
+    ('5BAA61', 200, constants.STATUS_CODE_BAD_REQUEST),
+    ('ABCDE', 500, constants.STATUS_CODE_BAD_GATEWAY)
+])
+async def test_serve_error(prefix, upstream_status, status):
+    '''
+    Invalid prefixes and upstream failures are reported with an error status.
+    '''
+
+    # Arrange
+    upstream = StubUpstream(upstream_status)
+
+    async with TestServer(upstream.app()) as upstream_server, aiohttp.ClientSession() as session:
+        server = RangeServer(session=session, url=str(upstream_server.make_url('/range/')))
+
+        async with TestServer(server.create_app()) as test_server:
+            # Act
+            async with session.get(test_server.make_url('/range/' + prefix)) as response:
+                actual_status = response.status
+
+    # Assert
+    assert actual_status == status
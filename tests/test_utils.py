@@ -4,7 +4,11 @@ Test for util methods
 
 import passpwnedcheck.constants as constants
 import pytest
-from passpwnedcheck.utils import get_password_prefix_suffix, response_to_dict
+from passpwnedcheck.utils import (bisect_records, dict_to_response,
+                                  find_suffix_count, get_digest_prefix_suffix,
+                                  get_hash_digest, get_hash_prefix_suffix,
+                                  get_password_digest, get_password_prefix_suffix,
+                                  group_by_prefix, response_to_dict)
 
 
 def test_get_password_prefix_suffix():
@@ -49,6 +53,92 @@ def test_get_password_prefix_suffix_wrong_input():
         assert str(te.value) == constants.PASSWORD_FORMAT_ERROR_MSG
 
 
+def test_get_hash_prefix_suffix():
+    '''
+    Precomputed hash in hex or raw bytes can be divided into prefix and suffix.
+    '''
+
+    hashes = [
+        '5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8',
+        '5baa61e4c9b93f3f0682250b6cf8331b7ee68fd8',
+        bytes.fromhex('5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8')
+    ]
+
+    for hash in hashes:
+        assert get_hash_prefix_suffix(hash) == ('5BAA6', '1E4C9B93F3F0682250B6CF8331B7EE68FD8')
+
+
+def test_get_hash_prefix_suffix_wrong_input():
+    '''
+    If input is not a SHA-1 hash, raise exception.
+    '''
+
+    hashes = [
+        '5BAA6',
+        'Z' * 40,
+        '5BAA6 E4C9B93F3F0682250B6CF8331B7EE68FD8 ',
+        b'5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8',
+        1,
+        None
+    ]
+
+    for hash in hashes:
+        with pytest.raises(ValueError) as ve:
+            get_hash_prefix_suffix(hash)
+        assert str(ve.value) == constants.HASH_FORMAT_ERROR_MSG + repr(hash)
+
+
+def test_get_digest():
+    '''
+    Passwords and precomputed hashes can be converted into raw 20-byte hashes.
+    '''
+
+    digest = bytes.fromhex('5BAA61E4C9B93F3F0682250B6CF8331B7EE68FD8')
+
+    assert get_password_digest('password') == digest
+    assert get_hash_digest('5baa61e4c9b93f3f0682250b6cf8331b7ee68fd8') == digest
+    assert get_hash_digest(bytearray(digest)) == digest
+    assert get_digest_prefix_suffix(digest) == ('5BAA6', '1E4C9B93F3F0682250B6CF8331B7EE68FD8')
+
+    with pytest.raises(TypeError):
+        get_password_digest(b'password')
+    with pytest.raises(ValueError) as ve:
+        get_hash_digest('5BAA6')
+    assert str(ve.value) == constants.HASH_FORMAT_ERROR_MSG + repr('5BAA6')
+
+
+def test_group_by_prefix():
+    '''
+    Passwords can be grouped by prefix.
+    '''
+
+    passes = ['password136', 'password', 'password1818']
+
+    groups = {
+        'BD30B': [
+            ('password136', '559BD9A84C988F99A2B3B05F4980E6D06CD'),
+            ('password1818', '4E206823991DE29A0C764E7F6CA6D98A890')
+        ],
+        '5BAA6': [
+            ('password', '1E4C9B93F3F0682250B6CF8331B7EE68FD8')
+        ]
+    }
+
+    assert group_by_prefix(passes) == groups
+
+    hashes = [
+        'BD30B559BD9A84C988F99A2B3B05F4980E6D06CD',
+        'BD30B4E206823991DE29A0C764E7F6CA6D98A890'
+    ]
+
+    assert group_by_prefix(hashes, get_hash_prefix_suffix) == {
+        'BD30B': [
+            (hashes[0], '559BD9A84C988F99A2B3B05F4980E6D06CD'),
+            (hashes[1], '4E206823991DE29A0C764E7F6CA6D98A890')
+        ]
+    }
+
+
 def test_response_to_dict():
     '''
     Response text can be properly converted into dictionary.
@@ -92,3 +182,66 @@ def test_response_to_dict_wrong_input():
         with pytest.raises(TypeError) as te:
             response_to_dict(response_text)
         assert str(te.value) == constants.RESPONSE_FORMAT_ERROR_MSG
+
+
+def test_dict_to_response():
+    '''
+    Dictionary can be converted back into response text.
+    '''
+
+    response_texts = [
+        '00F8AFEB99401868422C69E1A119902366A:1\r\n01C91CC3B2BB8575CB715776DE723EF2A25:8',
+        ''
+    ]
+
+    for response_text in response_texts:
+        assert dict_to_response(response_to_dict(response_text)) == response_text
+
+
+def test_find_suffix_count():
+    '''
+    Count of a suffix can be found directly in response bytes.
+    '''
+
+    body = b'00F8AFEB99401868422C69E1A119902366A:1\r\n01C91CC3B2BB8575CB715776DE723EF2A25:8\r\n024C755EAE375140CC7F5736766A93018FD:30'
+
+    suffixes = [
+        '00F8AFEB99401868422C69E1A119902366A',
+        '01C91CC3B2BB8575CB715776DE723EF2A25',
+        '024C755EAE375140CC7F5736766A93018FD',
+        '0246B0E85B76A83FCFDEFFE404046231CD9'
+    ]
+
+    counts = [1, 8, 30, None]
+
+    for suffix, count in zip(suffixes, counts):
+        assert find_suffix_count(body, suffix) == count
+
+    assert find_suffix_count(b'', suffixes[0]) is None
+
+
+def test_find_suffix_count_line_start():
+    '''
+    Only matches at the start of a line are counted.
+    '''
+
+    body = b'ABCDE:1\nBCDE:2\nCDE:3'
+
+    assert find_suffix_count(body, 'BCDE') == 2
+    assert find_suffix_count(body, 'CDE') == 3
+    assert find_suffix_count(body, 'DE') is None
+
+
+def test_bisect_records():
+    '''
+    Can find the position of a key among fixed-width records.
+    '''
+
+    # Records of 3 bytes, sorted by their first 2 bytes, after a 1-byte header.
+    buffer = b'H' + b'aa1' + b'ac2' + b'bb3'
+
+    keys = [b'aa', b'ab', b'ac', b'bb', b'zz', b'00']
+    indexes = [0, 1, 1, 2, 3, 0]
+
+    for key, index in zip(keys, indexes):
+        assert bisect_records(buffer, key, 3, 3, offset=1) == index
@@ -0,0 +1,90 @@
+# -*- coding: utf-8 -*-
+
+"""
+Tests for vectorized.
+"""
+
+import passpwnedcheck.constants as constants
+import pytest
+from passpwnedcheck.local_corpus import LocalCorpus
+from passpwnedcheck.pass_checker_offline import PassCheckerOffline
+
+np = pytest.importorskip('numpy')
+
+from passpwnedcheck.vectorized import (hash_passwords, lookup_digests,
+                                       lookup_passwords)
+
+from tests.conftest import hash_password, leaked_passwords, make_corpus
+
+leaked = leaked_passwords(500)
+passwords = ['password{}'.format(i) for i in range(500)] + ['日本語', '']
+
+
+@pytest.fixture
+def corpus(tmp_path):
+    # Include a hash ending with a null byte, which NumPy byte strings treat specially.
+    dest = make_corpus(tmp_path, leaked, ['00' * 19 + '00:7', 'FF' * 19 + '00:8'])
+
+    with LocalCorpus(dest) as corpus:
+        yield corpus
+
+
+def test_lookup_passwords(corpus):
+    '''
+    Vectorized lookup returns the same counts as the scalar lookup.
+    '''
+
+    pc = PassCheckerOffline(corpus)
+
+    counts = lookup_passwords(corpus, passwords)
+
+    assert counts.tolist() == [pc.is_password_compromised(password)[1] for password in passwords]
+    assert counts.sum() == sum(leaked.values())
+    assert lookup_passwords(corpus, (password for password in passwords)).tolist() == counts.tolist()
+
+
+def test_lookup_digests(corpus):
+    '''
+    Hashes can be passed as bytes, byte strings or uint8 arrays.
+    '''
+
+    digests = [bytes(20), b'\xff' * 19 + b'\x00', b'\xff' * 20, bytes.fromhex(hash_password('password0'))]
+    expected = [7, 8, 0, 1]
+
+    inputs = [
+        digests,
+        np.array(digests, dtype='S20'),
+        np.frombuffer(b''.join(digests), dtype=np.uint8).reshape(-1, 20)
+    ]
+
+    for value in inputs:
+        assert lookup_digests(corpus, value).tolist() == expected
+
+
+def test_lookup_digests_empty(corpus):
+    '''
+    Looking up no hash returns an empty array.
+    '''
+
+    assert lookup_digests(corpus, np.array([], dtype='S20')).tolist() == []
+
+
+def test_lookup_digests_wrong_input(corpus):
+    '''
+    If hashes are not 20 bytes each, raise exception.
+    '''
+
+    for value in [np.zeros((3, 19), dtype=np.uint8), np.array([1, 2, 3]), [b'x' * 21]]:
+        with pytest.raises(ValueError) as ve:
+            lookup_digests(corpus, value)
+        assert str(ve.value) == constants.DIGEST_ARRAY_ERROR_MSG
+
+
+def test_hash_passwords_wrong_input():
+    '''
+    If a password is not text, raise exception.
+    '''
+
+    with pytest.raises(TypeError) as te:
+        hash_passwords(['password', 1])
+    assert str(te.value) == constants.PASSWORD_FORMAT_ERROR_MSG